@@ -17,6 +17,7 @@
 from keystone import assignment
 from keystone import clean
 from keystone.common import kvs
+from keystone.common import utils
 from keystone import exception
 from keystone import identity
 
@@ -33,7 +34,8 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.NotFound:
             raise exception.ProjectNotFound(project_id=tenant_id)
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, marker=None, limit=None,
+                      hints=None):
         project_keys = filter(lambda x: x.startswith("tenant-"),
                               self.db.keys())
         project_refs = [self.db.get(key) for key in project_keys]
@@ -42,7 +44,7 @@ class Assignment(kvs.Base, assignment.Driver):
             self.get_domain(domain_id)
             project_refs = filter(lambda x: domain_id in x['domain_id'],
                                   project_refs)
-        return project_refs
+        return utils.paginate(project_refs, marker, limit, hints)
 
     def get_project_by_name(self, tenant_name, domain_id):
         try:
@@ -95,9 +97,10 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.NotFound:
             raise exception.RoleNotFound(role_id=role_id)
 
-    def list_roles(self):
+    def list_roles(self, marker=None, limit=None, hints=None):
         role_ids = self.db.get('role_list', [])
-        return [self.get_role(x) for x in role_ids]
+        return utils.paginate([self.get_role(x) for x in role_ids],
+                              marker, limit, hints)
 
     def get_projects_for_user(self, user_id):
         user_ref = self._get_user(user_id)
@@ -148,7 +151,10 @@ class Assignment(kvs.Base, assignment.Driver):
             user_ref['tenants'] = list(tenants)
             self.identity_api.update_user(user_id, user_ref)
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, user_id=None, group_id=None,
+                              role_id=None, project_id=None, domain_id=None,
+                              inherited_to_projects=None, marker=None,
+                              limit=None):
         """List the role assignments.
 
         The kvs backend stores role assignments as key-values:
@@ -185,8 +191,18 @@ class Assignment(kvs.Base, assignment.Driver):
                 role_assignment = template.copy()
                 role_assignment['role_id'] = r
                 assignment_list.append(role_assignment)
+            for r in self._roles_from_role_dicts(entry.get('roles', {}),
+                                                 True):
+                role_assignment = template.copy()
+                role_assignment['role_id'] = r
+                role_assignment['inherited_to_projects'] = True
+                assignment_list.append(role_assignment)
 
-        return assignment_list
+        return self._filter_role_assignments(
+            assignment_list, user_id=user_id, group_id=group_id,
+            role_id=role_id, project_id=project_id, domain_id=domain_id,
+            inherited_to_projects=inherited_to_projects, marker=marker,
+            limit=limit)
 
     # CRUD
     def create_project(self, tenant_id, tenant):
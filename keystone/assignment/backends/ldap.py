@@ -24,6 +24,7 @@ from keystone import clean
 from keystone.common import ldap as common_ldap
 from keystone.common import logging
 from keystone.common import models
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.identity.backends import ldap as ldap_identity
@@ -72,10 +73,13 @@ class Assignment(assignment.Driver):
     def get_project(self, tenant_id):
         return self._set_default_domain(self.project.get(tenant_id))
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, marker=None, limit=None,
+                      hints=None):
         # We don't support multiple domains within this driver, so ignore
         # any domain passed.
-        return self._set_default_domain(self.project.get_all())
+        projects = self.project.get_all(self.project.hints_filter(hints))
+        return self._set_default_domain(
+            utils.paginate(projects, marker, limit, hints))
 
     def get_project_by_name(self, tenant_name, domain_id):
         self._validate_default_domain_id(domain_id)
@@ -124,8 +128,9 @@ class Assignment(assignment.Driver):
     def get_role(self, role_id):
         return self.role.get(role_id)
 
-    def list_roles(self):
-        return self.role.get_all()
+    def list_roles(self, marker=None, limit=None, hints=None):
+        roles = self.role.get_all(self.role.hints_filter(hints))
+        return utils.paginate(roles, marker, limit, hints)
 
     def get_projects_for_user(self, user_id):
         self.identity_api.get_user(user_id)
@@ -14,11 +14,25 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import sqlalchemy
+
 from keystone import assignment
 from keystone import clean
 from keystone.common import sql
 from keystone.common.sql import migration
+from keystone import config
 from keystone import exception
+from keystone.identity.backends import sql as identity_sql
+
+
+CONF = config.CONF
+
+
+class AssignmentType(object):
+    USER_PROJECT = 'UserProject'
+    GROUP_PROJECT = 'GroupProject'
+    USER_DOMAIN = 'UserDomain'
+    GROUP_DOMAIN = 'GroupDomain'
 
 
 class Assignment(sql.Base, assignment.Driver):
@@ -54,11 +68,10 @@ class Assignment(sql.Base, assignment.Driver):
     def get_project_user_ids(self, tenant_id):
         session = self.get_session()
         self.get_project(tenant_id)
-        query = session.query(UserProjectGrant)
-        query = query.filter(UserProjectGrant.project_id ==
-                             tenant_id)
-        project_refs = query.all()
-        return [project_ref.user_id for project_ref in project_refs]
+        query = session.query(RoleAssignment.actor_id).distinct()
+        query = query.filter_by(type=AssignmentType.USER_PROJECT,
+                                target_id=tenant_id)
+        return [assignment_ref.actor_id for assignment_ref in query]
 
     def get_project_users(self, tenant_id):
         self.get_session()
@@ -70,160 +83,162 @@ class Assignment(sql.Base, assignment.Driver):
             user_refs.append(user_ref)
         return user_refs
 
+    def _assignment_key(self, user_id=None, tenant_id=None,
+                        domain_id=None, group_id=None):
+        """Return the (type, actor_id, target_id) of a grant."""
+        if user_id:
+            if tenant_id:
+                return AssignmentType.USER_PROJECT, user_id, tenant_id
+            return AssignmentType.USER_DOMAIN, user_id, domain_id
+        if tenant_id:
+            return AssignmentType.GROUP_PROJECT, group_id, tenant_id
+        return AssignmentType.GROUP_DOMAIN, group_id, domain_id
+
+    def _assignments_query(self, session, user_id=None, tenant_id=None,
+                           domain_id=None, group_id=None):
+        assignment_type, actor_id, target_id = self._assignment_key(
+            user_id, tenant_id, domain_id, group_id)
+        query = session.query(RoleAssignment)
+        return query.filter_by(type=assignment_type, actor_id=actor_id,
+                               target_id=target_id)
+
     def _get_metadata(self, user_id=None, tenant_id=None,
                       domain_id=None, group_id=None):
         session = self.get_session()
-
-        if user_id:
-            if tenant_id:
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(UserDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(user_id=user_id)
-        elif group_id:
-            if tenant_id:
-                q = session.query(GroupProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(GroupDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(group_id=group_id)
-        try:
-            return q.one().data
-        except sql.NotFound:
+        query = self._assignments_query(session, user_id, tenant_id,
+                                        domain_id, group_id)
+        roles = [self._role_to_dict(ref.role_id, ref.inherited)
+                 for ref in query]
+        if not roles:
             raise exception.MetadataNotFound()
+        return {'roles': roles}
 
-    def create_grant(self, role_id, user_id=None, group_id=None,
-                     domain_id=None, project_id=None,
-                     inherited_to_projects=False):
+    def get_effective_roles(self, user_id, project_id):
+        if not isinstance(self.identity_api.driver, sql.Base):
+            # group memberships are not kept in this database
+            raise exception.NotImplemented()
+        session = self.get_session()
+        group_ids = session.query(
+            identity_sql.UserGroupMembership.group_id).filter_by(
+                user_id=user_id).subquery()
+
+        def assignments(assignment_type, actor_id, target_id, inherited):
+            query = session.query(RoleAssignment.role_id)
+            query = query.filter_by(type=assignment_type, inherited=inherited)
+            if isinstance(actor_id, basestring):
+                query = query.filter(RoleAssignment.actor_id == actor_id)
+            else:
+                query = query.filter(RoleAssignment.actor_id.in_(actor_id))
+            return query.filter(RoleAssignment.target_id == target_id)
+
+        queries = [
+            assignments(AssignmentType.USER_PROJECT, user_id, project_id,
+                        False),
+            assignments(AssignmentType.GROUP_PROJECT, group_ids, project_id,
+                        False)]
+        if CONF.os_inherit.enabled:
+            domain_id = session.query(Project.domain_id).filter(
+                Project.id == project_id).subquery().as_scalar()
+            queries.extend([
+                assignments(AssignmentType.USER_DOMAIN, user_id, domain_id,
+                            True),
+                assignments(AssignmentType.GROUP_DOMAIN, group_ids,
+                            domain_id, True)])
+
+        query = queries[0].union(*queries[1:])
+        return [assignment_ref.role_id for assignment_ref in query]
+
+    def _check_grant_refs(self, session, role_id=None, user_id=None,
+                          group_id=None, domain_id=None, project_id=None):
+        """Raise NotFound if any of the actor, target or role is missing."""
         if user_id:
             self.identity_api.get_user(user_id)
         if group_id:
             self.identity_api.get_group(group_id)
-
-        session = self.get_session()
-        self._get_role(session, role_id)
-
+        role_ref = None
+        if role_id:
+            role_ref = self._get_role(session, role_id)
         if domain_id:
             self._get_domain(session, domain_id)
         if project_id:
             self._get_project(session, project_id)
+        return role_ref
+
+    def create_grant(self, role_id, user_id=None, group_id=None,
+                     domain_id=None, project_id=None,
+                     inherited_to_projects=False):
+        session = self.get_session()
+        self._check_grant_refs(session, role_id, user_id, group_id,
+                               domain_id, project_id)
 
         if project_id and inherited_to_projects:
             msg = _('Inherited roles can only be assigned to domains')
             raise exception.Conflict(type='role grant', details=msg)
 
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
-        metadata_ref['roles'] = self._add_role_to_role_dicts(
-            role_id, inherited_to_projects, metadata_ref.get('roles', []))
-
-        if is_new:
-            self._create_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
-        else:
-            self._update_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
+        assignment_type, actor_id, target_id = self._assignment_key(
+            user_id, project_id, domain_id, group_id)
+        with session.begin():
+            query = self._assignments_query(session, user_id, project_id,
+                                            domain_id, group_id)
+            query = query.filter_by(role_id=role_id,
+                                    inherited=inherited_to_projects)
+            if query.first() is None:
+                session.add(RoleAssignment(type=assignment_type,
+                                           actor_id=actor_id,
+                                           target_id=target_id,
+                                           role_id=role_id,
+                                           inherited=inherited_to_projects))
 
     def list_grants(self, user_id=None, group_id=None,
                     domain_id=None, project_id=None,
                     inherited_to_projects=False):
-        if user_id:
-            self.identity_api.get_user(user_id)
-        if group_id:
-            self.identity_api.get_group(group_id)
         session = self.get_session()
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
-
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-
-        return [self.get_role(x) for x in
-                self._roles_from_role_dicts(metadata_ref.get('roles', []),
-                                            inherited_to_projects)]
+        self._check_grant_refs(session, None, user_id, group_id,
+                               domain_id, project_id)
+
+        assignment_type, actor_id, target_id = self._assignment_key(
+            user_id, project_id, domain_id, group_id)
+        query = session.query(Role).join(
+            RoleAssignment, RoleAssignment.role_id == Role.id)
+        query = query.filter(RoleAssignment.type == assignment_type)
+        query = query.filter(RoleAssignment.actor_id == actor_id)
+        query = query.filter(RoleAssignment.target_id == target_id)
+        query = query.filter(
+            RoleAssignment.inherited == inherited_to_projects)
+        return [role_ref.to_dict() for role_ref in query]
 
     def get_grant(self, role_id, user_id=None, group_id=None,
                   domain_id=None, project_id=None,
                   inherited_to_projects=False):
-        if user_id:
-            self.identity_api.get_user(user_id)
-        if group_id:
-            self.identity_api.get_group(group_id)
-
         session = self.get_session()
-        role_ref = self._get_role(session, role_id)
-
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
-
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-        role_ids = set(self._roles_from_role_dicts(
-            metadata_ref.get('roles', []), inherited_to_projects))
-        if role_id not in role_ids:
+        role_ref = self._check_grant_refs(session, role_id, user_id,
+                                          group_id, domain_id, project_id)
+
+        query = self._assignments_query(session, user_id, project_id,
+                                        domain_id, group_id)
+        query = query.filter_by(role_id=role_id,
+                                inherited=inherited_to_projects)
+        if query.first() is None:
             raise exception.RoleNotFound(role_id=role_id)
         return role_ref.to_dict()
 
     def delete_grant(self, role_id, user_id=None, group_id=None,
                      domain_id=None, project_id=None,
                      inherited_to_projects=False):
-        if user_id:
-            self.identity_api.get_user(user_id)
-        if group_id:
-            self.identity_api.get_group(group_id)
-
         session = self.get_session()
-        self._get_role(session, role_id)
-
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
-
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
-        try:
-            metadata_ref['roles'] = self._remove_role_from_role_dicts(
-                role_id, inherited_to_projects, metadata_ref.get('roles', []))
-        except KeyError:
-            raise exception.RoleNotFound(role_id=role_id)
+        self._check_grant_refs(session, role_id, user_id, group_id,
+                               domain_id, project_id)
 
-        if is_new:
-            # TODO(henry-nash) It seems odd that you would create a new
-            # entry in response to trying to delete a role that was not
-            # assigned.  Although benign, this should probably be removed.
-            self._create_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
-        else:
-            self._update_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
-
-    def list_projects(self, domain_id=None):
+        with session.begin():
+            query = self._assignments_query(session, user_id, project_id,
+                                            domain_id, group_id)
+            query = query.filter_by(role_id=role_id,
+                                    inherited=inherited_to_projects)
+            if not query.delete(False):
+                raise exception.RoleNotFound(role_id=role_id)
+
+    def list_projects(self, domain_id=None, marker=None, limit=None,
+                      hints=None):
         session = self.get_session()
         if domain_id:
             self._get_domain(session, domain_id)
@@ -231,7 +246,9 @@ class Assignment(sql.Base, assignment.Driver):
         query = session.query(Project)
         if domain_id:
             query = query.filter_by(domain_id=domain_id)
-        project_refs = query.all()
+        query = sql.filter_query(query, Project, hints)
+        project_refs = sql.paginate(query, Project, marker, limit,
+                                    hints).all()
         return [project_ref.to_dict() for project_ref in project_refs]
 
     def get_projects_for_user(self, user_id):
@@ -245,112 +262,98 @@ class Assignment(sql.Base, assignment.Driver):
 
         self.identity_api.get_user(user_id)
         session = self.get_session()
-        query = session.query(UserProjectGrant)
-        query = query.filter_by(user_id=user_id)
-        membership_refs = query.all()
-        return [x.project_id for x in membership_refs]
+        query = session.query(RoleAssignment.target_id).distinct()
+        query = query.filter_by(type=AssignmentType.USER_PROJECT,
+                                actor_id=user_id)
+        return [assignment_ref.target_id for assignment_ref in query]
 
     def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
-        self.identity_api.get_user(user_id)
         session = self.get_session()
-        self._get_project(session, tenant_id)
-        self._get_role(session, role_id)
-        try:
-            metadata_ref = self._get_metadata(user_id, tenant_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
+        self._check_grant_refs(session, role_id, user_id=user_id,
+                               project_id=tenant_id)
         try:
-            metadata_ref['roles'] = self._add_role_to_role_dicts(
-                role_id, False, metadata_ref.get('roles', []),
-                allow_existing=False)
-        except KeyError:
+            with session.begin():
+                session.add(RoleAssignment(
+                    type=AssignmentType.USER_PROJECT,
+                    actor_id=user_id,
+                    target_id=tenant_id,
+                    role_id=role_id,
+                    inherited=False))
+                session.flush()
+        except sql.IntegrityError:
             msg = ('User %s already has role %s in tenant %s'
                    % (user_id, role_id, tenant_id))
             raise exception.Conflict(type='role grant', details=msg)
 
-        if is_new:
-            self._create_metadata(user_id, tenant_id, metadata_ref)
-        else:
-            self._update_metadata(user_id, tenant_id, metadata_ref)
-
     def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
-        try:
-            metadata_ref = self._get_metadata(user_id, tenant_id)
-            try:
-                metadata_ref['roles'] = self._remove_role_from_role_dicts(
-                    role_id, False, metadata_ref.get('roles', []))
-            except KeyError:
-                raise exception.RoleNotFound(message=_(
-                    'Cannot remove role that has not been granted, %s') %
-                    role_id)
-
-            if len(metadata_ref['roles']):
-                self._update_metadata(user_id, tenant_id, metadata_ref)
-            else:
-                session = self.get_session()
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(user_id=user_id)
-                q = q.filter_by(project_id=tenant_id)
-                q.delete()
-        except exception.MetadataNotFound:
-            msg = 'Cannot remove role that has not been granted, %s' % role_id
-            raise exception.RoleNotFound(message=msg)
-
-    def list_role_assignments(self):
-
-        # TODO(henry-nash): The current implementation is really simulating
-        # us having a common role assignment table, rather than having the
-        # four different grant tables we have today.  When we move to role
-        # assignment as a first class entity, we should create the single
-        # assignment table, simplifying the logic of this (and many other)
-        # functions.
-
         session = self.get_session()
-        assignment_list = []
-        refs = session.query(UserDomainGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r})
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), True):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r,
-                                                'inherited_to_projects': True})
-        refs = session.query(UserProjectGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'project_id': x.project_id,
-                                                'role_id': r})
-        refs = session.query(GroupDomainGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r})
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), True):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r,
-                                                'inherited_to_projects': True})
-        refs = session.query(GroupProjectGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'project_id': x.project_id,
-                                                'role_id': r})
-        return assignment_list
+        with session.begin():
+            query = self._assignments_query(session, user_id, tenant_id)
+            query = query.filter_by(role_id=role_id, inherited=False)
+            if not query.delete(False):
+                msg = ('Cannot remove role that has not been granted, %s'
+                       % role_id)
+                raise exception.RoleNotFound(message=msg)
+
+    def list_role_assignments(self, user_id=None, group_id=None,
+                              role_id=None, project_id=None, domain_id=None,
+                              inherited_to_projects=None, marker=None,
+                              limit=None):
+        session = self.get_session()
+        query = session.query(RoleAssignment)
+        actors = [(user_id, [AssignmentType.USER_PROJECT,
+                             AssignmentType.USER_DOMAIN]),
+                  (group_id, [AssignmentType.GROUP_PROJECT,
+                              AssignmentType.GROUP_DOMAIN])]
+        for actor_id, types in actors:
+            if actor_id is not None:
+                query = query.filter(RoleAssignment.actor_id == actor_id)
+                query = query.filter(RoleAssignment.type.in_(types))
+        targets = [(project_id, [AssignmentType.USER_PROJECT,
+                                 AssignmentType.GROUP_PROJECT]),
+                   (domain_id, [AssignmentType.USER_DOMAIN,
+                                AssignmentType.GROUP_DOMAIN])]
+        for target_id, types in targets:
+            if target_id is not None:
+                query = query.filter(RoleAssignment.target_id == target_id)
+                query = query.filter(RoleAssignment.type.in_(types))
+        if role_id is not None:
+            query = query.filter(RoleAssignment.role_id == role_id)
+        if inherited_to_projects is not None:
+            query = query.filter(
+                RoleAssignment.inherited == inherited_to_projects)
+
+        # the primary key orders assignments like _role_assignment_key
+        columns = [RoleAssignment.type, RoleAssignment.actor_id,
+                   RoleAssignment.target_id, RoleAssignment.role_id,
+                   RoleAssignment.inherited]
+        if marker is not None:
+            after = []
+            for i, column in enumerate(columns):
+                clauses = [c == v for c, v in zip(columns[:i], marker[:i])]
+                clauses.append(column > marker[i])
+                after.append(sqlalchemy.and_(*clauses))
+            query = query.filter(sqlalchemy.or_(*after))
+        query = query.order_by(*columns)
+        if limit is not None:
+            query = query.limit(limit)
+        return [self._role_assignment_to_dict(ref) for ref in query]
+
+    def _role_assignment_to_dict(self, ref):
+        if ref.type in (AssignmentType.USER_PROJECT,
+                        AssignmentType.USER_DOMAIN):
+            assignment = {'user_id': ref.actor_id}
+        else:
+            assignment = {'group_id': ref.actor_id}
+        if ref.type in (AssignmentType.USER_PROJECT,
+                        AssignmentType.GROUP_PROJECT):
+            assignment['project_id'] = ref.target_id
+        else:
+            assignment['domain_id'] = ref.target_id
+        assignment['role_id'] = ref.role_id
+        if ref.inherited:
+            assignment['inherited_to_projects'] = True
+        return assignment
 
     # CRUD
     @sql.handle_conflicts(type='project')
@@ -390,81 +393,15 @@ class Assignment(sql.Base, assignment.Driver):
         with session.begin():
             tenant_ref = self._get_project(session, tenant_id)
 
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
-            q.delete(False)
-
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
-            q.delete(False)
-
-            q = session.query(GroupProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
+            q = session.query(RoleAssignment)
+            q = q.filter_by(target_id=tenant_id)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.USER_PROJECT, AssignmentType.GROUP_PROJECT]))
             q.delete(False)
 
             session.delete(tenant_ref)
             session.flush()
 
-    @sql.handle_conflicts(type='metadata')
-    def _create_metadata(self, user_id, tenant_id, metadata,
-                         domain_id=None, group_id=None):
-        session = self.get_session()
-        with session.begin():
-            if user_id:
-                if tenant_id:
-                    session.add(UserProjectGrant
-                                (user_id=user_id,
-                                 project_id=tenant_id,
-                                 data=metadata))
-                elif domain_id:
-                    session.add(UserDomainGrant
-                                (user_id=user_id,
-                                 domain_id=domain_id,
-                                 data=metadata))
-            elif group_id:
-                if tenant_id:
-                    session.add(GroupProjectGrant
-                                (group_id=group_id,
-                                 project_id=tenant_id,
-                                 data=metadata))
-                elif domain_id:
-                    session.add(GroupDomainGrant
-                                (group_id=group_id,
-                                 domain_id=domain_id,
-                                 data=metadata))
-            session.flush()
-        return metadata
-
-    @sql.handle_conflicts(type='metadata')
-    def _update_metadata(self, user_id, tenant_id, metadata,
-                         domain_id=None, group_id=None):
-        session = self.get_session()
-        with session.begin():
-            if user_id:
-                if tenant_id:
-                    q = session.query(UserProjectGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(UserDomainGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(domain_id=domain_id)
-            elif group_id:
-                if tenant_id:
-                    q = session.query(GroupProjectGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(GroupDomainGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(domain_id=domain_id)
-            metadata_ref = q.first()
-            data = metadata_ref.data.copy()
-            data.update(metadata)
-            metadata_ref.data = data
-            session.flush()
-        return metadata_ref
-
     # domain crud
 
     @sql.handle_conflicts(type='domain')
@@ -534,11 +471,11 @@ class Assignment(sql.Base, assignment.Driver):
 
         session = self.get_session()
         user = self.identity_api.get_user(user_id)
-        metadata_refs = session\
-            .query(UserProjectGrant)\
-            .filter_by(user_id=user_id)
-        project_ids = set([x.project_id for x in metadata_refs
-                           if x.data.get('roles')])
+        query = session.query(RoleAssignment.target_id).distinct()
+        query = query.filter_by(type=AssignmentType.USER_PROJECT,
+                                actor_id=user_id)
+        project_ids = set(assignment_ref.target_id
+                          for assignment_ref in query)
         if user.get('project_id'):
             project_ids.add(user['project_id'])
 
@@ -559,9 +496,10 @@ class Assignment(sql.Base, assignment.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_roles(self):
+    def list_roles(self, marker=None, limit=None, hints=None):
         session = self.get_session()
-        refs = session.query(Role).all()
+        query = sql.filter_query(session.query(Role), Role, hints)
+        refs = sql.paginate(query, Role, marker, limit, hints).all()
         return [ref.to_dict() for ref in refs]
 
     def _get_role(self, session, role_id):
@@ -595,30 +533,9 @@ class Assignment(sql.Base, assignment.Driver):
 
         with session.begin():
             ref = self._get_role(session, role_id)
-            for metadata_ref in session.query(UserProjectGrant):
-                try:
-                    self.delete_grant(role_id, user_id=metadata_ref.user_id,
-                                      project_id=metadata_ref.project_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(UserDomainGrant):
-                try:
-                    self.delete_grant(role_id, user_id=metadata_ref.user_id,
-                                      domain_id=metadata_ref.domain_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(GroupProjectGrant):
-                try:
-                    self.delete_grant(role_id, group_id=metadata_ref.group_id,
-                                      project_id=metadata_ref.project_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(GroupDomainGrant):
-                try:
-                    self.delete_grant(role_id, group_id=metadata_ref.group_id,
-                                      domain_id=metadata_ref.domain_id)
-                except exception.RoleNotFound:
-                    pass
+            q = session.query(RoleAssignment)
+            q = q.filter_by(role_id=role_id)
+            q.delete(False)
 
             session.delete(ref)
             session.flush()
@@ -627,12 +544,10 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
 
         with session.begin():
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(user_id=user_id)
-            q.delete(False)
-
-            q = session.query(UserDomainGrant)
-            q = q.filter_by(user_id=user_id)
+            q = session.query(RoleAssignment)
+            q = q.filter_by(actor_id=user_id)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.USER_PROJECT, AssignmentType.USER_DOMAIN]))
             q.delete(False)
 
             session.flush()
@@ -641,13 +556,10 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
 
         with session.begin():
-
-            q = session.query(GroupProjectGrant)
-            q = q.filter_by(group_id=group_id)
-            q.delete(False)
-
-            q = session.query(GroupDomainGrant)
-            q = q.filter_by(group_id=group_id)
+            q = session.query(RoleAssignment)
+            q = q.filter_by(actor_id=group_id)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.GROUP_PROJECT, AssignmentType.GROUP_DOMAIN]))
             q.delete(False)
 
             session.flush()
@@ -685,64 +597,45 @@ class Role(sql.ModelBase, sql.DictBase):
     extra = sql.Column(sql.JsonBlob())
 
 
-class BaseGrant(sql.DictBase):
-    """Base Grant class.
-
-    There are four grant tables in the current implementation, one for
-    each type of grant:
-
-    - User for Project
-    - User for Domain
-    - Group for Project
-    - Group for Domain
+class RoleAssignment(sql.ModelBase, sql.DictBase):
+    """A role granted to a user or group on a project or domain.
 
-    Each is a table with the two attributes above as a combined primary key,
-    with the data field holding all roles for that combination.  The data
-    field is a list of dicts.  For regular role assignments each dict in
-    the list of of the form:
+    There is one row per role granted, with the type of the grant:
 
-    {'id': role_id}
+    - UserProject: a role of a user on a project
+    - GroupProject: a role of a group on a project
+    - UserDomain: a role of a user on a domain
+    - GroupDomain: a role of a group on a domain
 
-    If the OS-INHERIT extension is enabled and the role on a domain is an
-    inherited role, the dict will be of the form:
-
-    {'id': role_id, 'inherited_to': 'projects'}
+    If the OS-INHERIT extension is enabled, roles granted on a domain may be
+    inherited by the projects it owns instead, in which case inherited is
+    True.
 
     """
+    __tablename__ = 'assignment'
+    attributes = ['type', 'actor_id', 'target_id', 'role_id', 'inherited']
+    type = sql.Column(
+        sql.Enum(AssignmentType.GROUP_DOMAIN, AssignmentType.GROUP_PROJECT,
+                 AssignmentType.USER_DOMAIN, AssignmentType.USER_PROJECT,
+                 name='assignment_type'),
+        nullable=False)
+    actor_id = sql.Column(sql.String(64), nullable=False)
+    target_id = sql.Column(sql.String(64), nullable=False)
+    role_id = sql.Column(sql.String(64), sql.ForeignKey('role.id'),
+                         nullable=False)
+    inherited = sql.Column(sql.Boolean, default=False, nullable=False)
+    __table_args__ = (
+        sql.PrimaryKeyConstraint('type', 'actor_id', 'target_id', 'role_id',
+                                 'inherited'),
+        sql.Index('ix_assignment_actor_id', 'actor_id'),
+        sql.Index('ix_assignment_target_id', 'target_id'),
+        sql.Index('ix_assignment_role_id', 'role_id'),
+        {})
+
     def to_dict(self):
         """Override parent to_dict() method with a simpler implementation.
 
-        Grant tables don't have non-indexed 'extra' attributes, so the
-        parent implementation is not applicable.
+        The assignment table doesn't have non-indexed 'extra' attributes, so
+        the parent implementation is not applicable.
         """
         return dict(self.iteritems())
-
-
-class UserProjectGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'user_project_metadata'
-    user_id = sql.Column(sql.String(64),
-                         primary_key=True)
-    project_id = sql.Column(sql.String(64),
-                            primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class UserDomainGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'user_domain_metadata'
-    user_id = sql.Column(sql.String(64), primary_key=True)
-    domain_id = sql.Column(sql.String(64), primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class GroupProjectGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'group_project_metadata'
-    group_id = sql.Column(sql.String(64), primary_key=True)
-    project_id = sql.Column(sql.String(64), primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class GroupDomainGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'group_domain_metadata'
-    group_id = sql.Column(sql.String(64), primary_key=True)
-    domain_id = sql.Column(sql.String(64), primary_key=True)
-    data = sql.Column(sql.JsonBlob())
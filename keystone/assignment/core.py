@@ -16,6 +16,7 @@
 
 """Main entry point into the assignment service."""
 
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import logging
 from keystone.common import manager
@@ -57,6 +58,32 @@ class Manager(manager.Manager):
         self.driver.identity_api = identity_api
         self.identity_api = identity_api
         self.identity_api.assignment_api = self
+        self.role_cache = cache.LRUCache(CONF.assignment.cache_size,
+                                         ttl=CONF.assignment.cache_time)
+        # incremented whenever the role cache is cleared, so that role sets
+        # resolved concurrently with an assignment change are not cached
+        self._role_cache_generation = 0
+
+    def _get_cached_roles(self, key, get_roles):
+        role_ids = self.role_cache.get(key)
+        if role_ids is not None:
+            return list(role_ids)
+        generation = self._role_cache_generation
+        role_ids = set(get_roles())
+        if generation == self._role_cache_generation:
+            self.role_cache.set(key, frozenset(role_ids))
+        return list(role_ids)
+
+    def invalidate_role_cache(self):
+        """Forget the role sets resolved for every user.
+
+        Called whenever assignments or group memberships change. The cache
+        is not indexed by role, group or domain, so there is no cheap way to
+        find only the affected entries.
+
+        """
+        self._role_cache_generation += 1
+        self.role_cache.clear()
 
     def get_roles_for_user_and_project(self, user_id, tenant_id):
         """Get the roles associated with a user within given project.
@@ -66,6 +93,10 @@ class Manager(manager.Manager):
         the OS-INHERIT extension is enabled, then this will also
         include roles inherited from the domain.
 
+        Role sets are cached by each process (see ``[assignment]
+        cache_size`` and ``[assignment] cache_time``) until assignments or
+        group memberships change through this manager.
+
         :returns: a list of role ids.
         :raises: keystone.exception.UserNotFound,
                  keystone.exception.ProjectNotFound
@@ -121,16 +152,26 @@ class Manager(manager.Manager):
 
             return role_list
 
-        self.identity_api.get_user(user_id)
-        project_ref = self.get_project(tenant_id)
-        user_role_list = _get_user_project_roles(user_id, project_ref)
-        group_role_list = _get_group_project_roles(user_id, project_ref)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        def _get_roles():
+            self.identity_api.get_user(user_id)
+            project_ref = self.get_project(tenant_id)
+            try:
+                return self.driver.get_effective_roles(user_id, tenant_id)
+            except exception.NotImplemented:
+                pass
+            user_role_list = _get_user_project_roles(user_id, project_ref)
+            group_role_list = _get_group_project_roles(user_id, project_ref)
+            return user_role_list + group_role_list
+
+        return self._get_cached_roles(('project', user_id, tenant_id),
+                                      _get_roles)
 
     def get_roles_for_user_and_domain(self, user_id, domain_id):
         """Get the roles associated with a user within given domain.
 
+        Role sets are cached like those of
+        :meth:`get_roles_for_user_and_project`.
+
         :returns: a list of role ids.
         :raises: keystone.exception.UserNotFound,
                  keystone.exception.DomainNotFound
@@ -167,12 +208,15 @@ class Manager(manager.Manager):
             return self._roles_from_role_dicts(
                 metadata_ref.get('roles', {}), False)
 
-        self.identity_api.get_user(user_id)
-        self.get_domain(domain_id)
-        user_role_list = _get_user_domain_roles(user_id, domain_id)
-        group_role_list = _get_group_domain_roles(user_id, domain_id)
-        # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        def _get_roles():
+            self.identity_api.get_user(user_id)
+            self.get_domain(domain_id)
+            user_role_list = _get_user_domain_roles(user_id, domain_id)
+            group_role_list = _get_group_domain_roles(user_id, domain_id)
+            return user_role_list + group_role_list
+
+        return self._get_cached_roles(('domain', user_id, domain_id),
+                                      _get_roles)
 
     def add_user_to_project(self, tenant_id, user_id):
         """Add user to a tenant by creating a default role relationship.
@@ -181,9 +225,11 @@ class Manager(manager.Manager):
                  keystone.exception.UserNotFound
 
         """
-        self.driver.add_role_to_user_and_project(user_id,
-                                                 tenant_id,
-                                                 config.CONF.member_role_id)
+        try:
+            self.driver.add_role_to_user_and_project(
+                user_id, tenant_id, config.CONF.member_role_id)
+        finally:
+            self.invalidate_role_cache()
 
     def remove_user_from_project(self, tenant_id, user_id):
         """Remove user from a tenant
@@ -198,6 +244,76 @@ class Manager(manager.Manager):
         for role_id in roles:
             self.remove_role_from_user_and_project(user_id, tenant_id, role_id)
 
+    def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
+        try:
+            return self.driver.add_role_to_user_and_project(
+                user_id, tenant_id, role_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
+        try:
+            return self.driver.remove_role_from_user_and_project(
+                user_id, tenant_id, role_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def create_grant(self, role_id, user_id=None, group_id=None,
+                     domain_id=None, project_id=None,
+                     inherited_to_projects=False):
+        try:
+            return self.driver.create_grant(role_id, user_id, group_id,
+                                            domain_id, project_id,
+                                            inherited_to_projects)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_grant(self, role_id, user_id=None, group_id=None,
+                     domain_id=None, project_id=None,
+                     inherited_to_projects=False):
+        try:
+            return self.driver.delete_grant(role_id, user_id, group_id,
+                                            domain_id, project_id,
+                                            inherited_to_projects)
+        finally:
+            self.invalidate_role_cache()
+
+    def update_project(self, tenant_id, tenant):
+        try:
+            return self.driver.update_project(tenant_id, tenant)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_project(self, tenant_id):
+        try:
+            return self.driver.delete_project(tenant_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_domain(self, domain_id):
+        try:
+            return self.driver.delete_domain(domain_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_role(self, role_id):
+        try:
+            return self.driver.delete_role(role_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_user(self, user_id):
+        try:
+            return self.driver.delete_user(user_id)
+        finally:
+            self.invalidate_role_cache()
+
+    def delete_group(self, group_id):
+        try:
+            return self.driver.delete_group(group_id)
+        finally:
+            self.invalidate_role_cache()
+
 
 class Driver(object):
 
@@ -281,6 +397,19 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_effective_roles(self, user_id, project_id):
+        """Get the roles of a user within given project.
+
+        This includes the roles granted to the user's groups and, if the
+        OS-INHERIT extension is enabled, those inherited from the owning
+        domain. Backends which cannot resolve these in one lookup do not
+        implement this, and the roles are resolved grant by grant instead.
+
+        :returns: a list of role ids.
+
+        """
+        raise exception.NotImplemented()
+
     # assignment/grant crud
 
     def create_grant(self, role_id, user_id=None, group_id=None,
@@ -347,10 +476,79 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, user_id=None, group_id=None,
+                              role_id=None, project_id=None, domain_id=None,
+                              inherited_to_projects=None, marker=None,
+                              limit=None):
+        """Lists role assignments.
 
+        Each filter which is not None restricts the list to the assignments
+        of that user or group, of that role, on that project or domain, or
+        which are (or are not) inherited to projects.
+
+        Assignments are sorted by their :meth:`_role_assignment_key`. If a
+        marker key is given, only the assignments after it are listed, up
+        to limit assignments.
+
+        :returns: a list of role assignment dicts, for instance
+                  {'user_id': user_id, 'project_id': project_id,
+                  'role_id': role_id}, plus 'inherited_to_projects': True
+                  for inherited domain assignments.
+
+        """
         raise exception.NotImplemented()
 
+    def _role_assignment_key(self, assignment):
+        """Return the key role assignments are sorted by.
+
+        The key is a (type, actor_id, target_id, role_id, inherited) tuple,
+        type being one of GroupDomain, GroupProject, UserDomain or
+        UserProject.
+
+        """
+        if 'user_id' in assignment:
+            actor_type, actor_id = 'User', assignment['user_id']
+        else:
+            actor_type, actor_id = 'Group', assignment['group_id']
+        if 'project_id' in assignment:
+            target_type, target_id = 'Project', assignment['project_id']
+        else:
+            target_type, target_id = 'Domain', assignment['domain_id']
+        return (actor_type + target_type, actor_id, target_id,
+                assignment['role_id'],
+                bool(assignment.get('inherited_to_projects')))
+
+    def _filter_role_assignments(self, assignments, user_id=None,
+                                 group_id=None, role_id=None,
+                                 project_id=None, domain_id=None,
+                                 inherited_to_projects=None, marker=None,
+                                 limit=None):
+        """Filter and paginate a complete list of role assignments.
+
+        For backends which cannot filter role assignments as they list
+        them, see :meth:`list_role_assignments` for the arguments.
+
+        """
+        filters = {'user_id': user_id, 'group_id': group_id,
+                   'role_id': role_id, 'project_id': project_id,
+                   'domain_id': domain_id}
+        filters = dict((k, v) for k, v in filters.iteritems() if v is not None)
+        refs = []
+        for ref in assignments:
+            if any(ref.get(k) != v for k, v in filters.iteritems()):
+                continue
+            key = self._role_assignment_key(ref)
+            if (inherited_to_projects is not None and
+                    key[4] != inherited_to_projects):
+                continue
+            if marker is not None and key <= tuple(marker):
+                continue
+            refs.append(ref)
+        refs.sort(key=self._role_assignment_key)
+        if limit is not None:
+            refs = refs[:limit]
+        return refs
+
     # domain crud
     def create_domain(self, domain_id, domain):
         """Creates a new domain.
@@ -412,9 +610,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_projects(self, domain_id=None):
+    def list_projects(self, domain_id=None, marker=None, limit=None,
+                      hints=None):
         """List all projects in the system.
 
+        Projects are listed by ID. If a marker ID is given, only the
+        projects after it are listed, up to limit projects. The filters of
+        hints the driver applies are removed from it, see
+        keystone.common.driver_hints.Hints.
+
         :returns: a list of project_refs or an empty list.
 
         """
@@ -465,9 +669,14 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_roles(self):
+    def list_roles(self, marker=None, limit=None, hints=None):
         """List all roles in the system.
 
+        Roles are listed by ID. If a marker ID is given, only the roles
+        after it are listed, up to limit roles. The filters of hints the
+        driver applies are removed from it, see
+        keystone.common.driver_hints.Hints.
+
         :returns: a list of role_refs or an empty list.
 
         """
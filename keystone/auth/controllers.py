@@ -369,6 +369,12 @@ class Auth(controller.V3Controller):
         token_data = self.token_provider_api.validate_token(token_id)
         return render_token_data_response(token_id, token_data)
 
+    @controller.protected
+    def validate_tokens(self, context, tokens=None):
+        token_data = self.token_controllers_ref.validate_token_batch(tokens)
+        # nothing is created, so don't respond to this POST with a 201
+        return wsgi.render_response(body=token_data, status=(200, 'OK'))
+
     @controller.protected
     def revocation_list(self, context, auth=None):
         return self.token_controllers_ref.revocation_list(context, auth)
@@ -19,6 +19,7 @@ from __future__ import absolute_import
 import grp
 import os
 import pwd
+import time
 
 from oslo.config import cfg
 import pbr.version
@@ -140,10 +141,38 @@ class TokenFlush(BaseApp):
 
     name = 'token_flush'
 
+    @classmethod
+    def add_argument_parser(cls, subparsers):
+        parser = super(TokenFlush, cls).add_argument_parser(subparsers)
+        parser.add_argument('--batch-size', type=int, default=0,
+                            help=('Remove at most this many expired records '
+                                  'per transaction, repeating until none '
+                                  'are left. If not provided, all of them '
+                                  'are removed in a single transaction.'))
+        parser.add_argument('--pause', type=float, default=0,
+                            help=('Seconds to wait between two batches, '
+                                  'when using --batch-size.'))
+        return parser
+
     @classmethod
     def main(cls):
         token_manager = token.Manager()
-        token_manager.driver.flush_expired_tokens()
+        batch_size = CONF.command.batch_size
+        if batch_size <= 0:
+            token_manager.flush_expired_tokens()
+            return
+
+        total = 0
+        while True:
+            count = token_manager.flush_expired_tokens(limit=batch_size)
+            if not count:
+                break
+            total += count
+            print('Removed %d expired records' % total)
+            if count < batch_size:
+                # a partial batch means nothing expired is left
+                break
+            time.sleep(CONF.command.pause)
 
 
 class ImportLegacy(BaseApp):
@@ -0,0 +1,118 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""In-process caching helpers."""
+
+import threading
+import time
+
+
+# indexes into the links of LRUCache's circular list
+_PREV, _NEXT, _KEY, _VALUE, _EXPIRES = 0, 1, 2, 3, 4
+
+
+class LRUCache(object):
+    """A bounded mapping which evicts the least recently used entries.
+
+    Entries optionally expire ``ttl`` seconds after they are set. A cache
+    with a ``max_size`` of zero or less is disabled: nothing is stored and
+    every lookup is a miss.
+
+    Lookups are counted in the ``hits`` and ``misses`` attributes.
+
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._links = {}
+        # The root sentinel's next link is the most recently used entry and
+        # its previous link is the least recently used one.
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+
+    def __len__(self):
+        return len(self._links)
+
+    def _unlink(self, link):
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+
+    def _link_front(self, link):
+        root = self._root
+        link[_PREV] = root
+        link[_NEXT] = root[_NEXT]
+        root[_NEXT][_PREV] = link
+        root[_NEXT] = link
+
+    def _expired(self, link):
+        return link[_EXPIRES] is not None and link[_EXPIRES] <= time.time()
+
+    def get(self, key, default=None):
+        """Return the value for ``key``, or ``default`` on a miss."""
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None and self._expired(link):
+                self._unlink(link)
+                del self._links[key]
+                link = None
+            if link is None:
+                self.misses += 1
+                return default
+            self._unlink(link)
+            self._link_front(link)
+            self.hits += 1
+            return link[_VALUE]
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting the oldest entry if full."""
+        if self.max_size <= 0:
+            return
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                self._unlink(link)
+            elif len(self._links) >= self.max_size:
+                oldest = self._root[_PREV]
+                self._unlink(oldest)
+                del self._links[oldest[_KEY]]
+            link = [None, None, key, value, expires]
+            self._link_front(link)
+            self._links[key] = link
+
+    def delete(self, key):
+        """Remove ``key`` from the cache if it is present."""
+        with self._lock:
+            link = self._links.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+
+    def clear(self):
+        """Remove every entry; the hit and miss counters are preserved."""
+        with self._lock:
+            self._links.clear()
+            self._root[:] = [self._root, self._root, None, None, None]
+
+    def stats(self):
+        """Return the current size and hit/miss counters of the cache."""
+        return {'size': len(self._links),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses}
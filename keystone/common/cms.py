@@ -1,11 +1,351 @@
+import base64
+import ctypes
+import ctypes.util
 import hashlib
+import os
+import sys
+import threading
+import zlib
 
 from keystone.common import environment
 from keystone.common import logging
+from keystone import config
+from keystone.openstack.common import gettextutils
 
 
+CONF = config.CONF
 LOG = logging.getLogger(__name__)
 PKI_ANS1_PREFIX = 'MII'
+PKIZ_PREFIX = 'PKIZ_'
+
+# libcrypto flags matching the options cms_sign_text passes to openssl
+_CMS_NOCERTS = 0x2
+_CMS_NOATTR = 0x100
+_CMS_NOSMIMECAP = 0x200
+_CMS_SIGN_FLAGS = _CMS_NOCERTS | _CMS_NOATTR | _CMS_NOSMIMECAP
+_BIO_CTRL_INFO = 3
+
+_LIBCRYPTO_FUNCTIONS = [
+    ('BIO_s_mem', ctypes.c_void_p, []),
+    ('BIO_new', ctypes.c_void_p, [ctypes.c_void_p]),
+    ('BIO_new_mem_buf', ctypes.c_void_p, [ctypes.c_char_p, ctypes.c_int]),
+    ('BIO_ctrl', ctypes.c_long,
+     [ctypes.c_void_p, ctypes.c_int, ctypes.c_long, ctypes.c_void_p]),
+    ('BIO_free', ctypes.c_int, [ctypes.c_void_p]),
+    ('PEM_read_bio_X509', ctypes.c_void_p, [ctypes.c_void_p] * 4),
+    ('PEM_read_bio_PrivateKey', ctypes.c_void_p, [ctypes.c_void_p] * 4),
+    ('PEM_write_bio_CMS', ctypes.c_int, [ctypes.c_void_p, ctypes.c_void_p]),
+    ('CMS_sign', ctypes.c_void_p,
+     [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+      ctypes.c_uint]),
+    ('CMS_ContentInfo_free', None, [ctypes.c_void_p]),
+    ('X509_free', None, [ctypes.c_void_p]),
+    ('EVP_PKEY_free', None, [ctypes.c_void_p]),
+    ('ERR_clear_error', None, []),
+]
+
+_libcrypto = None
+_signers = {}
+_signers_lock = threading.Lock()
+
+# directory holding the keystone package, for the signing workers
+_TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+_signing_pool = None
+_signing_slots = None
+_signing_pool_lock = threading.Lock()
+
+
+def _get_libcrypto():
+    """Load libcrypto through ctypes, or return None if it is unusable."""
+    global _libcrypto
+    if _libcrypto is None:
+        _libcrypto = False
+        name = ctypes.util.find_library('crypto')
+        if name is None:
+            LOG.info(_('libcrypto was not found, CMS signing will use the '
+                       'openssl command.'))
+            return None
+        try:
+            lib = ctypes.CDLL(name)
+            for func_name, restype, argtypes in _LIBCRYPTO_FUNCTIONS:
+                func = getattr(lib, func_name)
+                func.restype = restype
+                func.argtypes = argtypes
+            _libcrypto = lib
+        except (OSError, TypeError, AttributeError) as e:
+            LOG.info(_('Unable to load libcrypto, CMS signing will use the '
+                       'openssl command: %s') % e)
+    return _libcrypto or None
+
+
+class InProcessSigner(object):
+    """Signs text like cms_sign_text does, without forking openssl.
+
+    The signing certificate and key are loaded into libcrypto once, when the
+    signer is created.
+
+    """
+
+    def __init__(self, libcrypto, signing_cert_file_name,
+                 signing_key_file_name):
+        self._lib = libcrypto
+        self._cert = self._read_pem(self._lib.PEM_read_bio_X509,
+                                    signing_cert_file_name)
+        try:
+            self._key = self._read_pem(self._lib.PEM_read_bio_PrivateKey,
+                                       signing_key_file_name)
+        except ValueError:
+            self._lib.X509_free(self._cert)
+            raise
+
+    def _read_pem(self, read_func, file_name):
+        with open(file_name, 'rb') as pem_file:
+            data = pem_file.read()
+        bio = self._lib.BIO_new_mem_buf(data, len(data))
+        try:
+            ref = read_func(bio, None, None, None)
+        finally:
+            self._lib.BIO_free(bio)
+        if not ref:
+            self._lib.ERR_clear_error()
+            raise ValueError(_('Unable to load %s') % file_name)
+        return ref
+
+    def __del__(self):
+        if getattr(self, '_key', None):
+            self._lib.EVP_PKEY_free(self._key)
+        if getattr(self, '_cert', None):
+            self._lib.X509_free(self._cert)
+
+    def sign_text(self, text):
+        """Returns the PEM encoded CMS signature of text."""
+        lib = self._lib
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        in_bio = lib.BIO_new_mem_buf(text, len(text))
+        out_bio = lib.BIO_new(lib.BIO_s_mem())
+        try:
+            cms = lib.CMS_sign(self._cert, self._key, None, in_bio,
+                               _CMS_SIGN_FLAGS)
+            if not cms:
+                lib.ERR_clear_error()
+                raise ValueError(_('Unable to sign text'))
+            try:
+                if lib.PEM_write_bio_CMS(out_bio, cms) != 1:
+                    lib.ERR_clear_error()
+                    raise ValueError(_('Unable to encode signed text'))
+            finally:
+                lib.CMS_ContentInfo_free(cms)
+            data = ctypes.c_char_p()
+            length = lib.BIO_ctrl(out_bio, _BIO_CTRL_INFO, 0,
+                                  ctypes.byref(data))
+            return ctypes.string_at(data, length)
+        finally:
+            lib.BIO_free(in_bio)
+            lib.BIO_free(out_bio)
+
+
+def _get_signer(signing_cert_file_name, signing_key_file_name):
+    """Return an InProcessSigner for the given files, or None.
+
+    Signers are reloaded when either file changes. A new signer is only used
+    if it produces exactly the same output as the openssl command, so any
+    difference in the libcrypto being loaded falls back to the command.
+
+    """
+    libcrypto = _get_libcrypto()
+    if libcrypto is None:
+        return None
+    try:
+        mtimes = (os.path.getmtime(signing_cert_file_name),
+                  os.path.getmtime(signing_key_file_name))
+    except OSError:
+        # let the openssl command report the missing files
+        return None
+
+    key = (signing_cert_file_name, signing_key_file_name)
+    with _signers_lock:
+        cached = _signers.get(key)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1]
+
+    # The probe runs the openssl command, which yields to other greenthreads
+    # under eventlet, so it must not hold the lock: with standard threads,
+    # the next caller would block the whole process on it.
+    signer = None
+    try:
+        signer = InProcessSigner(libcrypto, signing_cert_file_name,
+                                 signing_key_file_name)
+        probe = 'keystone CMS signing probe'
+        if signer.sign_text(probe) != _openssl_sign_text(
+                probe, signing_cert_file_name, signing_key_file_name):
+            LOG.warning(_('In-process CMS signing does not match the '
+                          'openssl command, using the command instead.'))
+            signer = None
+    except (ValueError, environment.subprocess.CalledProcessError) as e:
+        LOG.warning(_('Unable to sign in-process, using the openssl '
+                      'command instead: %s') % e)
+        signer = None
+    with _signers_lock:
+        _signers[key] = (mtimes, signer)
+    return signer
+
+
+class SigningWorkerError(Exception):
+    """A signing worker failed to sign a document."""
+
+
+def _write_message(stream, data):
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    stream.write('%d\n' % len(data))
+    stream.write(data)
+
+
+def _read_message(stream):
+    header = stream.readline()
+    if not header:
+        raise EOFError()
+    length = int(header)
+    data = stream.read(length)
+    if len(data) != length:
+        raise EOFError()
+    return data
+
+
+class SigningWorker(object):
+    """A long-lived process which signs the documents sent over its stdin.
+
+    Each request is the signing certificate file name, the signing key file
+    name and the text to sign; the response is a status and either the
+    signed text or an error message. Every message is its length on a line
+    of its own, followed by the data.
+
+    """
+
+    def __init__(self):
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(
+            [_TOPDIR] + filter(None, [env.get('PYTHONPATH')]))
+        try:
+            self.process = environment.subprocess.Popen(
+                [sys.executable, '-m', 'keystone.common.cms'],
+                stdin=environment.subprocess.PIPE,
+                stdout=environment.subprocess.PIPE,
+                close_fds=True,
+                env=env)
+        except OSError as e:
+            raise SigningWorkerError(e)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def sign_text(self, text, signing_cert_file_name, signing_key_file_name):
+        try:
+            for data in (signing_cert_file_name, signing_key_file_name, text):
+                _write_message(self.process.stdin, data)
+            self.process.stdin.flush()
+            status = _read_message(self.process.stdout)
+            output = _read_message(self.process.stdout)
+        except (IOError, OSError, EOFError, ValueError) as e:
+            self.close()
+            raise SigningWorkerError(e)
+        if status != 'ok':
+            raise SigningWorkerError(output)
+        return output
+
+    def close(self):
+        """Stop the worker once it has answered any pending request."""
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.wait()
+
+
+def _semaphore(value):
+    """Return a semaphore of the configured environment.
+
+    The signing semaphores are held while talking to a worker or the
+    openssl command, which yields to other greenthreads under eventlet; a
+    real semaphore would then block the whole process when threads are not
+    monkey-patched.
+
+    """
+    return (environment.Semaphore or threading.Semaphore)(value)
+
+
+class SigningPool(object):
+    """Shares documents to sign between at most ``size`` SigningWorkers.
+
+    Workers are started as they are needed and then kept for later
+    documents. A request waits while all of them are busy.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._workers = _semaphore(size)
+
+    def sign_text(self, text, signing_cert_file_name, signing_key_file_name):
+        with self._workers:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                worker = SigningWorker()
+            try:
+                return worker.sign_text(text, signing_cert_file_name,
+                                        signing_key_file_name)
+            finally:
+                if worker.is_alive():
+                    with self._lock:
+                        closed = self._closed
+                        if not closed:
+                            self._idle.append(worker)
+                    if closed:
+                        # the pool was replaced while the worker was busy
+                        worker.close()
+
+    def close(self):
+        """Stop the idle workers, and the busy ones once they are done."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+def _get_signing_pool():
+    """Return the SigningPool for ``[signing] worker_pool_size``, if any."""
+    global _signing_pool
+    size = CONF.signing.worker_pool_size
+    old_pool = None
+    with _signing_pool_lock:
+        if _signing_pool is not None and _signing_pool.size != size:
+            old_pool, _signing_pool = _signing_pool, None
+        if _signing_pool is None and size > 0:
+            _signing_pool = SigningPool(size)
+        pool = _signing_pool
+    if old_pool is not None:
+        # waiting for the workers to stop yields under eventlet
+        old_pool.close()
+    return pool
+
+
+def _get_signing_slots():
+    """Return a semaphore for ``[signing] max_concurrent_signatures``."""
+    global _signing_slots
+    limit = CONF.signing.max_concurrent_signatures
+    with _signing_pool_lock:
+        if limit <= 0:
+            _signing_slots = None
+        elif _signing_slots is None or _signing_slots[0] != limit:
+            _signing_slots = (limit, _semaphore(limit))
+        return _signing_slots and _signing_slots[1]
 
 
 def cms_verify(formatted, signing_cert_file_name, ca_file_name):
@@ -49,7 +389,11 @@ def token_to_cms(signed_text):
 
 
 def verify_token(token, signing_cert_file_name, ca_file_name):
-    return cms_verify(token_to_cms(token),
+    if is_pkiz(token):
+        formatted = pkiz_uncompress(token)
+    else:
+        formatted = token_to_cms(token)
+    return cms_verify(formatted,
                       signing_cert_file_name,
                       ca_file_name)
 
@@ -101,7 +445,45 @@ def cms_sign_text(text, signing_cert_file_name, signing_key_file_name):
     """Uses OpenSSL to sign a document
     Produces a Base64 encoding of a DER formatted CMS Document
     http://en.wikipedia.org/wiki/Cryptographic_Message_Syntax
+
+    The document is signed by the pool of signing workers if
+    ``[signing] worker_pool_size`` is set. Otherwise, or if a worker fails,
+    it is signed in-process through libcrypto when possible, and by running
+    the openssl command as a last resort.
     """
+    slots = _get_signing_slots()
+    if slots is None:
+        return _sign_text(text, signing_cert_file_name, signing_key_file_name)
+    with slots:
+        return _sign_text(text, signing_cert_file_name, signing_key_file_name)
+
+
+def _sign_text(text, signing_cert_file_name, signing_key_file_name):
+    pool = _get_signing_pool()
+    if pool is not None:
+        try:
+            return pool.sign_text(text, signing_cert_file_name,
+                                  signing_key_file_name)
+        except SigningWorkerError as e:
+            LOG.warning(_('Signing worker failed, signing in-process: %s') %
+                        e)
+    return _sign_text_locally(text, signing_cert_file_name,
+                              signing_key_file_name)
+
+
+def _sign_text_locally(text, signing_cert_file_name, signing_key_file_name):
+    signer = _get_signer(signing_cert_file_name, signing_key_file_name)
+    if signer is not None:
+        try:
+            return signer.sign_text(text)
+        except ValueError as e:
+            LOG.warning(_('In-process signing failed, retrying with the '
+                          'openssl command: %s') % e)
+    return _openssl_sign_text(text, signing_cert_file_name,
+                              signing_key_file_name)
+
+
+def _openssl_sign_text(text, signing_cert_file_name, signing_key_file_name):
     process = environment.subprocess.Popen(["openssl", "cms", "-sign",
                                             "-signer", signing_cert_file_name,
                                             "-inkey", signing_key_file_name,
@@ -142,17 +524,78 @@ def cms_to_token(cms_text):
     return signed_text
 
 
+def is_pkiz(token):
+    """Determine if a token is a compressed PKI token."""
+    return token[:len(PKIZ_PREFIX)] == PKIZ_PREFIX
+
+
+def pkiz_sign(text, signing_cert_file_name, signing_key_file_name):
+    """Signs text like cms_sign_token, producing a compressed token.
+
+    The DER encoded CMS document is compressed with zlib and encoded with
+    URL safe base64, after the PKIZ_PREFIX.
+    """
+    signed_text = cms_sign_text(text, signing_cert_file_name,
+                                signing_key_file_name)
+    der = base64.b64decode(cms_to_token(signed_text).replace('-', '/'))
+    return PKIZ_PREFIX + base64.urlsafe_b64encode(zlib.compress(der))
+
+
+def pkiz_uncompress(token):
+    """Returns the CMS document of a compressed token, as cms_verify takes.
+
+    Raises ValueError if the token cannot be decoded.
+    """
+    try:
+        der = zlib.decompress(base64.urlsafe_b64decode(
+            str(token[len(PKIZ_PREFIX):])))
+    except (TypeError, UnicodeError, zlib.error) as e:
+        raise ValueError(e)
+    return token_to_cms(base64.b64encode(der))
+
+
 def cms_hash_token(token_id):
     """Hash PKI tokens.
 
-    return: for ans1_token, returns the hash of the passed in token
-            otherwise, returns what it was passed in.
+    return: for ans1_token and compressed PKI tokens, returns the hash of
+            the passed in token otherwise, returns what it was passed in.
     """
     if token_id is None:
         return None
-    if is_ans1_token(token_id):
+    if is_ans1_token(token_id) or is_pkiz(token_id):
         hasher = hashlib.md5()
         hasher.update(token_id)
         return hasher.hexdigest()
     else:
         return token_id
+
+
+def _worker_main():
+    """Serve SigningWorker requests until stdin is closed."""
+    requests, responses = sys.stdin, sys.stdout
+    # keep anything else written to stdout out of the responses
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            signing_cert_file_name = _read_message(requests)
+            signing_key_file_name = _read_message(requests)
+            text = _read_message(requests)
+        except EOFError:
+            return
+        try:
+            output = _sign_text_locally(text, signing_cert_file_name,
+                                        signing_key_file_name)
+            status = 'ok'
+        except Exception as e:
+            output = str(e)
+            status = 'error'
+        _write_message(responses, status)
+        _write_message(responses, output)
+        responses.flush()
+
+
+if __name__ == '__main__':
+    gettextutils.install('keystone')
+    environment.use_stdlib()
+    logging.root.addHandler(logging.StreamHandler())
+    _worker_main()
@@ -175,6 +175,12 @@ def register_cli_int(*args, **kw):
     return conf.register_cli_opt(cfg.IntOpt(*args, **kw), group=group)
 
 
+def register_float(*args, **kw):
+    conf = kw.pop('conf', CONF)
+    group = kw.pop('group', None)
+    return conf.register_opt(cfg.FloatOpt(*args, **kw), group=group)
+
+
 def configure():
     CONF.register_cli_opts(COMMON_CLI_OPTS)
     CONF.register_cli_opts(LOGGING_CLI_OPTS)
@@ -204,6 +210,9 @@ def configure():
     register_int('max_param_size', default=64)
     # we allow tokens to be a bit larger to accommodate PKI
     register_int('max_token_size', default=8192)
+    # page sizes of the v3 collections, 0 lists whole collections
+    register_int('default_page_size', default=0)
+    register_int('max_page_size', default=0)
     register_str(
         'member_role_id', default='9fe2ff9ee4384b1894a90878d3e92bab')
     register_str('member_role_name', default='_member_')
@@ -221,6 +230,29 @@ def configure():
     register_list('bind', group='token', default=[])
     register_str('enforce_token_bind', group='token', default='permissive')
 
+    # token validation cache
+    register_int('cache_size', group='token', default=0)
+    register_int('cache_time', group='token', default=60)
+
+    # revocation list
+    register_int('revocation_resend_window', group='token', default=60)
+
+    # time-bucketed sql token driver
+    register_int('bucket_interval', group='token', default=86400)
+
+    # two-tier token driver
+    register_str('persistent_driver', group='token',
+                 default='keystone.token.backends.sql.Token')
+    register_str('tier_cache', group='token', default='memory')
+    register_int('tier_cache_size', group='token', default=10000)
+    register_int('tier_cache_time', group='token', default=300)
+
+    # memcache
+    register_str('servers', group='memcache', default='localhost:11211')
+    register_int('replicas', group='memcache', default=1)
+    register_int('dead_retry', group='memcache', default=30)
+    register_int('pool_size', group='memcache', default=10)
+
     # ssl
     register_bool('enable', group='ssl', default=False)
     register_str('certfile', group='ssl',
@@ -260,6 +292,8 @@ def configure():
     register_str('ca_password', group='signing', default=None)
     register_str('cert_subject', group='signing',
                  default='/C=US/ST=Unset/L=Unset/O=Unset/CN=www.example.com')
+    register_int('worker_pool_size', group='signing', default=0)
+    register_int('max_concurrent_signatures', group='signing', default=0)
 
     # sql
     register_str('connection', group='sql', secret=True,
@@ -272,6 +306,8 @@ def configure():
         'driver',
         group='assignment',
         default=None)
+    register_int('cache_size', group='assignment', default=0)
+    register_int('cache_time', group='assignment', default=60)
     register_str(
         'driver',
         group='catalog',
@@ -387,6 +423,15 @@ def configure():
     register_bool('use_tls', group='ldap', default=False)
     register_str('tls_req_cert', group='ldap', default='demand')
 
+    register_bool('use_pool', group='ldap', default=False)
+    register_int('pool_size', group='ldap', default=10)
+    register_int('pool_retry_max', group='ldap', default=3)
+    register_float('pool_retry_delay', group='ldap', default=0.1)
+    register_int('pool_connection_lifetime', group='ldap', default=600)
+    register_bool('use_auth_pool', group='ldap', default=False)
+    register_int('auth_pool_size', group='ldap', default=100)
+    register_int('auth_pool_connection_lifetime', group='ldap', default=60)
+
     # pam
     register_str('userid', group='pam', default=None)
     register_str('password', group='pam', default=None)
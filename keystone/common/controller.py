@@ -1,8 +1,10 @@
 import collections
 import functools
+import urllib
 import uuid
 
 from keystone.common import dependency
+from keystone.common import driver_hints
 from keystone.common import logging
 from keystone.common import wsgi
 from keystone import config
@@ -155,19 +157,15 @@ def filterprotected(*filters):
 class V2Controller(wsgi.Application):
     """Base controller class for Identity API v2."""
 
-    def _delete_tokens_for_trust(self, user_id, trust_id):
-        self.token_api.delete_tokens(user_id, trust_id=trust_id)
-
     def _delete_tokens_for_user(self, user_id, project_id=None):
         #First delete tokens that could get other tokens.
         self.token_api.delete_tokens(user_id, tenant_id=project_id)
 
         #delete tokens generated from trusts
-        for trust in self.trust_api.list_trusts_for_trustee(user_id):
-            self._delete_tokens_for_trust(user_id, trust['id'])
-        for trust in self.trust_api.list_trusts_for_trustor(user_id):
-            self._delete_tokens_for_trust(trust['trustee_user_id'],
-                                          trust['id'])
+        trusts = (self.trust_api.list_trusts_for_trustee(user_id) +
+                  self.trust_api.list_trusts_for_trustor(user_id))
+        if trusts:
+            self.token_api.delete_tokens_for_trusts(trusts)
 
     def _require_attribute(self, ref, attr):
         """Ensures the reference contains the specified attribute."""
@@ -239,7 +237,7 @@ class V3Controller(V2Controller):
         for f in filters:
             refs = cls.filter_by_attribute(context, refs, f)
 
-        refs = cls.paginate(context, refs)
+        refs, next_marker = cls.paginate(context, refs)
 
         for ref in refs:
             cls.wrap_member(context, ref)
@@ -249,17 +247,113 @@ class V3Controller(V2Controller):
             'next': None,
             'self': cls.base_url(path=context['path']),
             'previous': None}
+        if next_marker is not None:
+            container['links']['next'] = cls._page_url(context, next_marker)
+        if 'marker' in context['query_string']:
+            # markers only page forwards, so go back to the first page
+            container['links']['previous'] = cls._page_url(context)
         return container
 
     @classmethod
     def paginate(cls, context, refs):
-        """Paginates a list of references by page & per_page query strings."""
-        # FIXME(dolph): client needs to support pagination first
-        return refs
+        """Paginates a list of references by marker & limit query strings.
+
+        References are sorted by their page key, their ID unless overridden,
+        and the page holds the references following the marker, up to the
+        page limit.
+
+        :returns: a (refs, next_marker) tuple, next_marker being None on the
+                  last page
+
+        """
+        marker = cls._page_marker(context)
+        limit = cls._page_limit(context)
+        refs = sorted(refs, key=cls._page_key)
+        if marker is not None:
+            refs = [ref for ref in refs if cls._page_key(ref) > marker]
+        if limit is None or len(refs) <= limit:
+            return refs, None
+        refs = refs[:limit]
+        if not refs:
+            return refs, None
+        return refs, cls._format_marker(cls._page_key(refs[-1]))
+
+    @classmethod
+    def page_args(cls, context):
+        """Returns the marker & limit arguments to list a page of refs with.
 
-        page = context['query_string'].get('page', 1)
-        per_page = context['query_string'].get('per_page', 30)
-        return refs[per_page * (page - 1):per_page * page]
+        One more reference than the page holds is requested, to tell whether
+        there is a next page. Drivers which leave filters to apply list the
+        complete collection instead, see keystone.common.driver_hints.Hints,
+        and wrap_collection paginates it once filtered.
+
+        """
+        marker = cls._page_marker(context)
+        limit = cls._page_limit(context)
+        if limit is not None:
+            limit += 1
+        return {'marker': marker, 'limit': limit}
+
+    @classmethod
+    def build_driver_hints(cls, context, filters):
+        """Returns the hints asking a driver to apply the query filters.
+
+        The filters the driver does not apply are left in the hints, to be
+        passed to wrap_collection.
+
+        """
+        hints = driver_hints.Hints()
+        for f in filters:
+            if f in context['query_string']:
+                hints.add_filter(f, context['query_string'][f])
+        return hints
+
+    @classmethod
+    def _page_key(cls, ref):
+        return ref['id']
+
+    @classmethod
+    def _page_marker(cls, context):
+        return context['query_string'].get('marker')
+
+    @classmethod
+    def _format_marker(cls, key):
+        return key
+
+    @classmethod
+    def _page_limit(cls, context):
+        """Returns the number of references of a page, None for all of them.
+
+        This is the limit query string if given, or [DEFAULT]
+        default_page_size, bounded by [DEFAULT] max_page_size.
+
+        """
+        limit = CONF.default_page_size or None
+        if 'limit' in context['query_string']:
+            try:
+                limit = int(context['query_string']['limit'])
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                msg = _('Invalid limit: %s') % context['query_string']['limit']
+                raise exception.ValidationError(message=msg)
+        if CONF.max_page_size and (limit is None or
+                                   limit > CONF.max_page_size):
+            limit = CONF.max_page_size
+        return limit
+
+    @classmethod
+    def _page_url(cls, context, marker=None):
+        """Returns the URL of the page of the collection after marker."""
+        query = dict((k, unicode(v).encode('utf-8'))
+                     for k, v in context['query_string'].iteritems()
+                     if k != 'marker')
+        if marker is not None:
+            query['marker'] = marker
+        url = cls.base_url(path=context['path'])
+        if query:
+            url += '?' + urllib.urlencode(sorted(query.iteritems()))
+        return url
 
     @classmethod
     def filter_by_attribute(cls, context, refs, attr):
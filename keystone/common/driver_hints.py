@@ -0,0 +1,43 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+class Hints(object):
+    """Filters a driver list call is asked to apply.
+
+    Each filter is a dict with a ``name``, the attribute of the listed
+    entities it applies to, and the ``value`` that attribute must equal. The
+    value of a boolean attribute is given as a string, ``'0'`` for False and
+    anything else for True, as in the query strings of the API.
+
+    A driver removes each filter it applies from the list, and the caller
+    applies the remaining ones to the listed entities. Since the caller then
+    has to filter the complete listing, a driver leaving any filter must not
+    cut a page out of it.
+
+    """
+
+    def __init__(self):
+        self.filters = []
+
+    def add_filter(self, name, value):
+        self.filters.append({'name': name, 'value': value})
+
+    def remove_filter(self, filter_):
+        self.filters.remove(filter_)
+
+    def filter_names(self):
+        return [f['name'] for f in self.filters]
@@ -8,11 +8,12 @@ CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
-__all__ = ['Server', 'httplib', 'subprocess']
+__all__ = ['Server', 'Semaphore', 'httplib', 'subprocess']
 
 _configured = False
 
 Server = None
+Semaphore = None
 httplib = None
 subprocess = None
 
@@ -44,7 +45,7 @@ def configure_once(name):
 
 @configure_once('eventlet')
 def use_eventlet(monkeypatch_thread=None):
-    global httplib, subprocess, Server
+    global httplib, subprocess, Server, Semaphore
 
     # This must be set before the initial import of eventlet because if
     # dnspython is present in your environment then eventlet monkeypatches
@@ -53,6 +54,7 @@ def use_eventlet(monkeypatch_thread=None):
 
     import eventlet
     from eventlet.green import httplib as _httplib
+    from eventlet import semaphore as _semaphore
     from eventlet.green import subprocess as _subprocess
     from keystone.common.environment import eventlet_server
 
@@ -63,16 +65,21 @@ def use_eventlet(monkeypatch_thread=None):
                                   thread=monkeypatch_thread)
 
     Server = eventlet_server.Server
+    # Green semaphores, whether threads are monkey-patched or not, since
+    # they are held across green I/O.
+    Semaphore = _semaphore.Semaphore
     httplib = _httplib
     subprocess = _subprocess
 
 
 @configure_once('stdlib')
 def use_stdlib():
-    global httplib, subprocess
+    global httplib, subprocess, Semaphore
 
     import httplib as _httplib
     import subprocess as _subprocess
+    import threading as _threading
 
+    Semaphore = _threading.Semaphore
     httplib = _httplib
     subprocess = _subprocess
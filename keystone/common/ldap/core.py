@@ -14,7 +14,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import os.path
+import threading
+import time
 
 import ldap
 from ldap import filter as ldap_filter
@@ -101,6 +104,127 @@ def ldap_scope(scope):
                 'options': ', '.join(LDAP_SCOPES.keys())})
 
 
+class ConnectionPool(object):
+    """A bounded pool of connections to one LDAP server.
+
+    Each operation runs on a connection checked out of the pool, which is
+    opened by ``connect`` when no idle one is left. Connections idle for
+    more than ``lifetime`` seconds are closed instead of being reused.
+
+    An operation failing with SERVER_DOWN drops all the idle connections,
+    as they are probably dead as well. Reads and binds are then retried on
+    a new connection; writes only are when the connection could not be
+    opened, as they may otherwise have reached the server before it dropped.
+
+    """
+
+    RETRIABLE_METHODS = ['search_s', 'simple_bind_s']
+
+    def __init__(self, connect, size, lifetime=None, retry_max=0,
+                 retry_delay=0):
+        self.connect = connect
+        self.lifetime = lifetime
+        self.retry_max = retry_max
+        self.retry_delay = retry_delay
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._idle = collections.deque()
+
+    def _checkout(self):
+        expired = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                idle_conn, last_used = self._idle.pop()
+                if not self.lifetime or (time.time() - last_used <
+                                         self.lifetime):
+                    conn = idle_conn
+                    break
+                expired.append(idle_conn)
+        for expired_conn in expired:
+            self._close(expired_conn)
+        return conn if conn is not None else self.connect()
+
+    def _checkin(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.time()))
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def clear(self):
+        """Closes all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.deque()
+        for conn, last_used in idle:
+            self._close(conn)
+
+    def run(self, method, *args, **kwargs):
+        """Calls ``method`` of a pooled connection."""
+        attempt = 0
+        while True:
+            sent = False
+            self._slots.acquire()
+            try:
+                conn = self._checkout()
+                sent = True
+                try:
+                    result = getattr(conn, method)(*args, **kwargs)
+                except ldap.SERVER_DOWN:
+                    self._close(conn)
+                    raise
+                except Exception:
+                    # the server answered, so the connection is still good
+                    self._checkin(conn)
+                    raise
+                self._checkin(conn)
+                return result
+            except ldap.SERVER_DOWN:
+                self.clear()
+                if sent and method not in self.RETRIABLE_METHODS:
+                    raise
+                if attempt >= self.retry_max:
+                    raise
+                attempt += 1
+                LOG.warning(_('LDAP server down, retrying %(method)s '
+                              '(%(attempt)s/%(retry_max)s)') % {
+                                  'method': method,
+                                  'attempt': attempt,
+                                  'retry_max': self.retry_max})
+            finally:
+                self._slots.release()
+            time.sleep(self.retry_delay)
+
+
+class PooledLdapConnection(object):
+    """Runs each LDAP operation on a connection of ``pool``."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __getattr__(self, name):
+        def _run(*args, **kwargs):
+            return self.pool.run(name, *args, **kwargs)
+        return _run
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(key, connect, size, lifetime=None, retry_max=0, retry_delay=0):
+    """Returns the connection pool for ``key``, creating it if needed."""
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(connect, size, lifetime=lifetime,
+                                         retry_max=retry_max,
+                                         retry_delay=retry_delay)
+        return _POOLS[key]
+
+
 class BaseLdap(object):
     DEFAULT_SUFFIX = "dc=example,dc=com"
     DEFAULT_OU = None
@@ -110,6 +234,8 @@ class BaseLdap(object):
     DEFAULT_FILTER = None
     DEFAULT_EXTRA_ATTR_MAPPING = []
     DUMB_MEMBER_DN = 'cn=dumb,dc=nonexistent'
+    # attributes which may be matched by the filters of driver hints
+    FILTERABLE_ATTRIBUTES = ['description', 'email', 'name']
     NotFound = None
     notfound_arg = None
     options_name = None
@@ -129,6 +255,15 @@ class BaseLdap(object):
         self.tls_cacertfile = conf.ldap.tls_cacertfile
         self.tls_cacertdir = conf.ldap.tls_cacertdir
         self.tls_req_cert = parse_tls_cert(conf.ldap.tls_req_cert)
+        self.use_pool = conf.ldap.use_pool
+        self.pool_size = conf.ldap.pool_size
+        self.pool_retry_max = conf.ldap.pool_retry_max
+        self.pool_retry_delay = conf.ldap.pool_retry_delay
+        self.pool_connection_lifetime = conf.ldap.pool_connection_lifetime
+        self.use_auth_pool = conf.ldap.use_auth_pool
+        self.auth_pool_size = conf.ldap.auth_pool_size
+        self.auth_pool_connection_lifetime = (
+            conf.ldap.auth_pool_connection_lifetime)
 
         if self.options_name is not None:
             self.suffix = conf.ldap.suffix
@@ -201,6 +336,46 @@ class BaseLdap(object):
         return mapping
 
     def get_connection(self, user=None, password=None):
+        if user is None:
+            user = self.LDAP_USER
+
+        if password is None:
+            password = self.LDAP_PASSWORD
+
+        if not self.use_pool:
+            return self._connect(user, password)
+
+        pool = get_pool(
+            (self.LDAP_URL, user),
+            lambda: self._connect(user, password),
+            self.pool_size,
+            lifetime=self.pool_connection_lifetime,
+            retry_max=self.pool_retry_max,
+            retry_delay=self.pool_retry_delay)
+        return PooledLdapConnection(pool)
+
+    def simple_bind(self, user, password):
+        """Checks the password of ``user`` by binding as that user.
+
+        The bind never uses a connection of get_connection, which would be
+        left bound as ``user``.
+
+        """
+        if not self.use_auth_pool:
+            conn = self._connect(user, password)
+            conn.unbind_s()
+            return
+
+        pool = get_pool(
+            (self.LDAP_URL, 'auth'),
+            lambda: self._connect(None, None),
+            self.auth_pool_size,
+            lifetime=self.auth_pool_connection_lifetime,
+            retry_max=self.pool_retry_max,
+            retry_delay=self.pool_retry_delay)
+        pool.run('simple_bind_s', user, password)
+
+    def _connect(self, user, password):
         if self.LDAP_URL.startswith('fake://'):
             conn = fakeldap.FakeLdap(self.LDAP_URL)
         else:
@@ -212,12 +387,6 @@ class BaseLdap(object):
                                tls_cacertdir=self.tls_cacertdir,
                                tls_req_cert=self.tls_req_cert)
 
-        if user is None:
-            user = self.LDAP_USER
-
-        if password is None:
-            password = self.LDAP_PASSWORD
-
         # not all LDAP servers require authentication, so we don't bind
         # if we don't have any user/pass
         if user and password:
@@ -367,6 +536,31 @@ class BaseLdap(object):
         return [self._ldap_res_to_model(x)
                 for x in self._ldap_get_all(filter)]
 
+    def hints_filter(self, hints):
+        """Return the search filter applying the filters of hints.
+
+        Only the filters on the mapped string attributes are applied, and
+        removed from hints. Returns None if no filter could be applied.
+
+        """
+        if hints is None:
+            return None
+        query = ''
+        for filter_ in list(hints.filters):
+            name = filter_['name']
+            if (name not in self.FILTERABLE_ATTRIBUTES or
+                    name not in self.attribute_mapping or
+                    name in self.attribute_ignore):
+                continue
+            query += '(%s=%s)' % (
+                self.attribute_mapping[name],
+                ldap_filter.escape_filter_chars(filter_['value']))
+            hints.remove_filter(filter_)
+        if not query:
+            return None
+        # the configured filter still applies
+        return (self.filter or '') + query
+
     def update(self, id, values, old_obj=None):
         if not self.allow_update:
             action = _('LDAP %s update') % self.options_name
@@ -497,6 +691,10 @@ class LdapWrapper(object):
         LOG.debug(_("LDAP bind: dn=%s"), user)
         return self.conn.simple_bind_s(user, password)
 
+    def unbind_s(self):
+        LOG.debug(_("LDAP unbind"))
+        return self.conn.unbind_s()
+
     def add_s(self, dn, attrs):
         ldap_attrs = [(kind, [py2ldap(x) for x in safe_iter(values)])
                       for kind, values in attrs]
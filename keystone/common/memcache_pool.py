@@ -0,0 +1,232 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Pooled memcache client spreading keys over a consistent hash ring."""
+
+from __future__ import absolute_import
+
+import bisect
+import hashlib
+import struct
+import threading
+import time
+
+import memcache
+
+from keystone.common import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class _MemcacheClient(memcache.Client):
+    """A memcache client which can be handed from one thread to another.
+
+    memcache.Client keeps its connections in thread local storage, so that
+    each greenthread would open its own. Restoring the plain object attribute
+    access lets the pooled connections follow the client between threads.
+
+    """
+    __delattr__ = object.__delattr__
+    __getattribute__ = object.__getattribute__
+    __new__ = object.__new__
+    __setattr__ = object.__setattr__
+
+
+class HashRing(object):
+    """Ketama-style consistent hash ring of servers.
+
+    Each server is placed at ``points`` positions of a ring of 32-bit hashes
+    and owns the keys hashing up to each of them, so adding or removing a
+    server only moves the keys it owns.
+
+    """
+
+    def __init__(self, servers, points=160):
+        self.servers = sorted(set(servers))
+        self._ring = {}
+        for server in self.servers:
+            for i in range(points // 4):
+                digest = hashlib.md5('%s-%d' % (server, i)).digest()
+                for position in struct.unpack('<4I', digest):
+                    self._ring[position] = server
+        self._positions = sorted(self._ring)
+
+    def get_servers(self, key):
+        """Return every server, starting with the one owning key."""
+        servers = []
+        if not self._positions:
+            return servers
+        position = struct.unpack('<I', hashlib.md5(key).digest()[:4])[0]
+        start = bisect.bisect(self._positions, position)
+        for i in range(len(self._positions)):
+            index = (start + i) % len(self._positions)
+            server = self._ring[self._positions[index]]
+            if server not in servers:
+                servers.append(server)
+                if len(servers) == len(self.servers):
+                    break
+        return servers
+
+
+class ConsistentHashClient(object):
+    """Memcache client spreading keys over several servers.
+
+    Keys are assigned to servers with a HashRing and written to the first
+    ``replicas`` servers of the ring, so that they can still be read if one
+    of those fails. A server which fails is skipped for ``dead_retry``
+    seconds, doubling on each consecutive failure up to ``max_dead_retry``;
+    its keys are served by the next servers of the ring meanwhile.
+
+    Connections are pooled by server, keeping up to ``pool_size`` idle ones,
+    and the client may be shared between threads.
+
+    Only the subset of the memcache.Client interface used by keystone is
+    provided.
+
+    """
+
+    def __init__(self, servers, replicas=1, dead_retry=30,
+                 max_dead_retry=300, pool_size=10, socket_timeout=3):
+        self.ring = HashRing(servers)
+        self.replicas = max(1, replicas)
+        self.dead_retry = dead_retry
+        self.max_dead_retry = max_dead_retry
+        self.pool_size = pool_size
+        self.socket_timeout = socket_timeout
+        self._lock = threading.Lock()
+        self._idle = dict((server, []) for server in self.ring.servers)
+        # server -> (consecutive failures, time until which it is skipped)
+        self._failures = {}
+
+    # Servers
+    def _live_servers(self, key):
+        """Return the servers holding the replicas of key."""
+        now = time.time()
+        servers = []
+        for server in self.ring.get_servers(key):
+            failure = self._failures.get(server)
+            if failure is not None and failure[1] > now:
+                continue
+            servers.append(server)
+            if len(servers) == self.replicas:
+                break
+        return servers
+
+    def _new_client(self, server):
+        return _MemcacheClient([server], debug=0, dead_retry=self.dead_retry,
+                               socket_timeout=self.socket_timeout)
+
+    def _call(self, server, method, *args, **kwargs):
+        """Call method on a pooled connection to server.
+
+        :returns: a (succeeded, result) tuple
+
+        """
+        with self._lock:
+            idle = self._idle[server]
+            client = idle.pop() if idle else None
+        if client is None:
+            client = self._new_client(server)
+
+        # This client decides when a failed server is retried, not the
+        # memcache library.
+        host = client.servers[0]
+        host.deaduntil = 0
+        result = getattr(client, method)(*args, **kwargs)
+        failed = bool(host.deaduntil)
+
+        with self._lock:
+            if failed:
+                count = self._failures.get(server, (0, 0))[0] + 1
+                delay = min(self.dead_retry * 2 ** (count - 1),
+                            self.max_dead_retry)
+                self._failures[server] = (count, time.time() + delay)
+            else:
+                self._failures.pop(server, None)
+            if not failed and len(self._idle[server]) < self.pool_size:
+                self._idle[server].append(client)
+                client = None
+        if failed:
+            LOG.warning(_('Memcache server %(server)s failed, skipping it '
+                          'for %(delay)d seconds'),
+                        {'server': server, 'delay': delay})
+        if client is not None:
+            client.disconnect_all()
+        return not failed, result
+
+    def _write(self, key, method, *args, **kwargs):
+        """Apply a write to every replica of key.
+
+        :returns: the result from the first replica which could be reached
+
+        """
+        results = []
+        for server in self._live_servers(key):
+            succeeded, result = self._call(server, method, key, *args,
+                                           **kwargs)
+            if succeeded:
+                results.append(result)
+        return results[0] if results else None
+
+    # memcache.Client interface
+    def get(self, key):
+        for server in self._live_servers(key):
+            succeeded, value = self._call(server, 'get', key)
+            if value is not None:
+                return value
+
+    def get_multi(self, keys):
+        values = {}
+        remaining = list(keys)
+        for replica in range(self.replicas):
+            by_server = {}
+            for key in remaining:
+                servers = self._live_servers(key)
+                if replica < len(servers):
+                    by_server.setdefault(servers[replica], []).append(key)
+            for server, server_keys in by_server.iteritems():
+                succeeded, server_values = self._call(server, 'get_multi',
+                                                      server_keys)
+                values.update(server_values or {})
+            remaining = [key for key in remaining if key not in values]
+            if not remaining:
+                break
+        return values
+
+    def set(self, key, val, time=0):
+        return bool(self._write(key, 'set', val, time=time))
+
+    def add(self, key, val, time=0):
+        servers = self._live_servers(key)
+        if not servers:
+            return False
+        succeeded, added = self._call(servers[0], 'add', key, val, time=time)
+        if not added:
+            return False
+        # the replicas may hold a stale copy, which add would not replace
+        for server in servers[1:]:
+            self._call(server, 'set', key, val, time=time)
+        return True
+
+    def append(self, key, val, time=0):
+        return bool(self._write(key, 'append', val, time=time))
+
+    def incr(self, key, delta=1):
+        return self._write(key, 'incr', delta)
+
+    def delete(self, key, time=0):
+        return bool(self._write(key, 'delete', time=time))
@@ -55,6 +55,9 @@ NotFound = sql.orm.exc.NoResultFound
 Boolean = sql.Boolean
 Text = sql.Text
 UniqueConstraint = sql.UniqueConstraint
+Index = sql.Index
+Enum = sql.Enum
+PrimaryKeyConstraint = sql.PrimaryKeyConstraint
 
 
 def initialize_decorator(init):
@@ -313,3 +316,43 @@ def handle_conflicts(type='object'):
                 raise exception.Conflict(type=type, details=str(e.orig))
         return wrapper
     return decorator
+
+
+def filter_query(query, model, hints=None):
+    """Apply the filters of hints on columns of model to a query on it.
+
+    The filters applied are removed from hints, see
+    keystone.common.driver_hints.Hints.
+
+    """
+    if hints is None:
+        return query
+    for filter_ in list(hints.filters):
+        name = filter_['name']
+        if name not in model.attributes or name not in model.__table__.c:
+            continue
+        column = getattr(model, name)
+        value = filter_['value']
+        if isinstance(model.__table__.c[name].type, sql.Boolean):
+            value = value != '0'
+        query = query.filter(column == value)
+        hints.remove_filter(filter_)
+    return query
+
+
+def paginate(query, model, marker=None, limit=None, hints=None):
+    """Restrict a query on model to a page of its rows.
+
+    Rows are ordered by ID, the page starting after the marker ID and holding
+    up to limit rows, as with keystone.common.utils.paginate. No page is cut
+    while hints hold filters the query does not apply.
+
+    """
+    if hints is not None and hints.filters:
+        return query
+    if marker is not None:
+        query = query.filter(model.id > marker)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
@@ -0,0 +1,71 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import sqlalchemy as sql
+
+
+# number of revoked tokens read and seeded at once
+BATCH_SIZE = 1000
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    token_table = sql.Table('token', meta, autoload=True)
+
+    event_table = sql.Table(
+        'token_revocation_event',
+        meta,
+        sql.Column('id', sql.Integer, primary_key=True, autoincrement=True),
+        sql.Column('token_id', sql.String(64), nullable=False),
+        sql.Column('expires', sql.DateTime, default=None),
+        sql.Column('revoked_at', sql.DateTime, default=None),
+        sql.Index('ix_token_revocation_event_revoked_at', 'revoked_at'),
+        sqlite_autoincrement=True)
+    event_table.create(migrate_engine, checkfirst=True)
+
+    # Seed the table with the tokens revoked so far so that clients asking
+    # for the changes since revision 0 see the complete list. Expired tokens
+    # are left out, as they are no longer listed.
+    revoked = sql.and_(sql.not_(token_table.c.valid),
+                       token_table.c.expires > datetime.datetime.utcnow())
+    last_id = None
+    while True:
+        criteria = revoked
+        if last_id is not None:
+            criteria = sql.and_(revoked, token_table.c.id > last_id)
+        query = sql.select([token_table.c.id, token_table.c.expires],
+                           criteria)
+        query = query.order_by(token_table.c.id).limit(BATCH_SIZE)
+        token_refs = migrate_engine.execute(query).fetchall()
+        if not token_refs:
+            break
+        last_id = token_refs[-1].id
+        migrate_engine.execute(
+            event_table.insert(),
+            [{'token_id': token_ref.id, 'expires': token_ref.expires}
+             for token_ref in token_refs])
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    event_table = sql.Table('token_revocation_event', meta, autoload=True)
+    event_table.drop()
@@ -0,0 +1,51 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlalchemy as sql
+
+
+def _indexes(token_table):
+    return [
+        sql.Index('ix_token_user_id_valid_expires', token_table.c.user_id,
+                  token_table.c.valid, token_table.c.expires),
+        sql.Index('ix_token_trust_id_valid_expires', token_table.c.trust_id,
+                  token_table.c.valid, token_table.c.expires),
+        sql.Index('ix_token_valid_expires', token_table.c.valid,
+                  token_table.c.expires),
+    ]
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token_table = sql.Table('token', meta, autoload=True)
+
+    for idx in _indexes(token_table):
+        idx.create(migrate_engine)
+
+    # ix_token_valid_expires covers every lookup ix_token_valid served.
+    sql.Index('ix_token_valid', token_table.c.valid).drop(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token_table = sql.Table('token', meta, autoload=True)
+
+    sql.Index('ix_token_valid', token_table.c.valid).create(migrate_engine)
+
+    for idx in _indexes(token_table):
+        idx.drop(migrate_engine)
@@ -0,0 +1,85 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import json
+
+import sqlalchemy as sql
+
+
+# number of tokens read and updated at once by the backfill
+BATCH_SIZE = 1000
+
+
+def _index(token_table):
+    return sql.Index('ix_token_user_id_tenant_id_valid_expires',
+                     token_table.c.user_id, token_table.c.tenant_id,
+                     token_table.c.valid, token_table.c.expires)
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token_table = sql.Table('token', meta, autoload=True)
+
+    token_table.create_column(sql.Column('tenant_id', sql.String(64),
+                                         nullable=True))
+
+    # Expired and revoked tokens are never looked up by project, so only the
+    # live tokens need to be backfilled. They are read in batches ordered by
+    # id, and each batch is updated with a single executemany.
+    live = sql.and_(token_table.c.valid,
+                    token_table.c.expires > datetime.datetime.utcnow())
+    update = (token_table.update().
+              where(token_table.c.id == sql.bindparam('token_id')).
+              values(tenant_id=sql.bindparam('tenant_id')))
+    last_id = None
+    while True:
+        criteria = live
+        if last_id is not None:
+            criteria = sql.and_(live, token_table.c.id > last_id)
+        query = sql.select([token_table.c.id, token_table.c.extra], criteria)
+        query = query.order_by(token_table.c.id).limit(BATCH_SIZE)
+        token_refs = migrate_engine.execute(query).fetchall()
+        if not token_refs:
+            break
+        last_id = token_refs[-1].id
+
+        values = []
+        for token_ref in token_refs:
+            tenant = json.loads(token_ref.extra or '{}').get('tenant')
+            if tenant and tenant.get('id'):
+                values.append({'token_id': token_ref.id,
+                               'tenant_id': tenant['id']})
+        if values:
+            migrate_engine.execute(update, values)
+
+    _index(token_table).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token_table = sql.Table('token', meta, autoload=True)
+
+    _index(token_table).drop(migrate_engine)
+
+    # Reflect the table again without the dropped index, SQLite recreates
+    # the table and its indexes to drop a column.
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token_table = sql.Table('token', meta, autoload=True)
+    token_table.drop_column('tenant_id')
@@ -0,0 +1,124 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import sqlalchemy as sql
+
+
+# assignment type -> (grant table, actor column, target column, target table)
+GRANT_TABLES = {
+    'UserProject': ('user_project_metadata', 'user_id', 'project_id',
+                    'project'),
+    'GroupProject': ('group_project_metadata', 'group_id', 'project_id',
+                     'project'),
+    'UserDomain': ('user_domain_metadata', 'user_id', 'domain_id', 'domain'),
+    'GroupDomain': ('group_domain_metadata', 'group_id', 'domain_id',
+                    'domain'),
+}
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    role_table = sql.Table('role', meta, autoload=True)
+
+    assignment_table = sql.Table(
+        'assignment',
+        meta,
+        sql.Column('type',
+                   sql.Enum(*sorted(GRANT_TABLES), name='assignment_type'),
+                   nullable=False),
+        sql.Column('actor_id', sql.String(64), nullable=False),
+        sql.Column('target_id', sql.String(64), nullable=False),
+        sql.Column('role_id', sql.String(64), sql.ForeignKey('role.id'),
+                   nullable=False),
+        sql.Column('inherited', sql.Boolean, nullable=False),
+        sql.PrimaryKeyConstraint('type', 'actor_id', 'target_id', 'role_id',
+                                 'inherited'),
+        sql.Index('ix_assignment_actor_id', 'actor_id'),
+        sql.Index('ix_assignment_target_id', 'target_id'),
+        sql.Index('ix_assignment_role_id', 'role_id'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    assignment_table.create(migrate_engine, checkfirst=True)
+
+    # grants of roles which have since been deleted are dropped, they would
+    # break the role foreign key
+    role_ids = set(role_ref.id for role_ref in migrate_engine.execute(
+        sql.select([role_table.c.id])))
+    for assignment_type, grant in sorted(GRANT_TABLES.iteritems()):
+        table_name, actor_column, target_column, target_table = grant
+        grant_table = sql.Table(table_name, meta, autoload=True)
+        assignments = []
+        for grant_ref in migrate_engine.execute(grant_table.select()):
+            data = json.loads(grant_ref.data or '{}')
+            role_keys = set((role['id'], bool(role.get('inherited_to')))
+                            for role in data.get('roles', []))
+            for role_id, inherited in role_keys:
+                if role_id not in role_ids:
+                    continue
+                assignments.append({'type': assignment_type,
+                                    'actor_id': grant_ref[actor_column],
+                                    'target_id': grant_ref[target_column],
+                                    'role_id': role_id,
+                                    'inherited': inherited})
+        if assignments:
+            migrate_engine.execute(assignment_table.insert(), assignments)
+        grant_table.drop(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    sql.Table('project', meta, autoload=True)
+    sql.Table('domain', meta, autoload=True)
+    assignment_table = sql.Table('assignment', meta, autoload=True)
+
+    for assignment_type, grant in sorted(GRANT_TABLES.iteritems()):
+        table_name, actor_column, target_column, target_table = grant
+        grant_table = sql.Table(
+            table_name,
+            meta,
+            sql.Column(actor_column, sql.String(64), primary_key=True),
+            sql.Column(target_column, sql.String(64),
+                       sql.ForeignKey('%s.id' % target_table),
+                       primary_key=True),
+            sql.Column('data', sql.Text()),
+            mysql_engine='InnoDB',
+            mysql_charset='utf8')
+        grant_table.create(migrate_engine, checkfirst=True)
+
+        grants = {}
+        query = assignment_table.select().where(
+            assignment_table.c.type == assignment_type)
+        for assignment_ref in migrate_engine.execute(query):
+            role = {'id': assignment_ref.role_id}
+            if assignment_ref.inherited:
+                role['inherited_to'] = 'projects'
+            key = (assignment_ref.actor_id, assignment_ref.target_id)
+            grants.setdefault(key, []).append(role)
+        rows = [{actor_column: actor_id,
+                 target_column: target_id,
+                 'data': json.dumps({'roles': roles})}
+                for (actor_id, target_id), roles in grants.iteritems()]
+        if rows:
+            migrate_engine.execute(grant_table.insert(), rows)
+
+    assignment_table.drop(migrate_engine)
+    # PostgreSQL keeps the enum as a standalone type once its table is gone,
+    # which would make a later upgrade fail; other dialects ignore this
+    sql.Enum(name='assignment_type').drop(migrate_engine, checkfirst=True)
@@ -186,6 +186,30 @@ def unixtime(dt_obj):
     return time.mktime(dt_obj.utctimetuple())
 
 
+def paginate(refs, marker=None, limit=None, hints=None):
+    """Return a page of a list of refs.
+
+    The refs are sorted by ID, the page starting after the marker ID and
+    holding up to limit refs. Drivers paging through their entities
+    themselves must return the same pages.
+
+    No page is cut while hints hold filters which were not applied to the
+    refs, the caller paginates them once filtered.
+
+    :param refs: list of dicts with an 'id' key
+    :returns: list of refs
+
+    """
+    refs = sorted(refs, key=lambda ref: ref['id'])
+    if hints is not None and hints.filters:
+        return refs
+    if marker is not None:
+        refs = [ref for ref in refs if ref['id'] > marker]
+    if limit is not None:
+        refs = refs[:limit]
+    return refs
+
+
 def auth_str_equal(provided, known):
     """Constant-time string comparison.
 
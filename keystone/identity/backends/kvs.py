@@ -57,9 +57,10 @@ class Identity(kvs.Base, identity.Driver):
         return identity.filter_user(
             self._get_user_by_name(user_name, domain_id))
 
-    def list_users(self):
+    def list_users(self, marker=None, limit=None, hints=None):
         user_ids = self.db.get('user_list', [])
-        return [self.get_user(x) for x in user_ids]
+        return utils.paginate([self.get_user(x) for x in user_ids],
+                              marker, limit, hints)
 
     # CRUD
     def create_user(self, user_id, user):
@@ -184,9 +185,10 @@ class Identity(kvs.Base, identity.Driver):
         self.db.set('group_list', list(group_list))
         return group
 
-    def list_groups(self):
+    def list_groups(self, marker=None, limit=None, hints=None):
         group_ids = self.db.get('group_list', [])
-        return [self.get_group(x) for x in group_ids]
+        return utils.paginate([self.get_group(x) for x in group_ids],
+                              marker, limit, hints)
 
     def get_group(self, group_id):
         try:
@@ -68,10 +68,7 @@ class Identity(identity.Driver):
         if not user_id or not password:
             raise AssertionError('Invalid user / password')
         try:
-            conn = self.user.get_connection(self.user._id_to_dn(user_id),
-                                            password)
-            if not conn:
-                raise AssertionError('Invalid user / password')
+            self.user.simple_bind(self.user._id_to_dn(user_id), password)
         except Exception:
             raise AssertionError('Invalid user / password')
         return self.assignment._set_default_domain(
@@ -84,8 +81,10 @@ class Identity(identity.Driver):
         ref = identity.filter_user(self._get_user(user_id))
         return self.assignment._set_default_domain(ref)
 
-    def list_users(self):
-        return self.assignment._set_default_domain(self.user.get_all())
+    def list_users(self, marker=None, limit=None, hints=None):
+        users = self.user.get_all(self.user.hints_filter(hints))
+        return self.assignment._set_default_domain(
+            utils.paginate(users, marker, limit, hints))
 
     def get_user_by_name(self, user_name, domain_id):
         self.assignment._validate_default_domain_id(domain_id)
@@ -178,8 +177,10 @@ class Identity(identity.Driver):
         return (self.assignment._set_default_domain
                 (self.group.list_user_groups(user_dn)))
 
-    def list_groups(self):
-        return self.assignment._set_default_domain(self.group.get_all())
+    def list_groups(self, marker=None, limit=None, hints=None):
+        groups = self.group.get_all(self.group.hints_filter(hints))
+        return self.assignment._set_default_domain(
+            utils.paginate(groups, marker, limit, hints))
 
     def list_users_in_group(self, group_id):
         self.get_group(group_id)
@@ -14,6 +14,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import sqlalchemy
+
 from keystone.common import sql
 from keystone.common.sql import migration
 from keystone.common import utils
@@ -107,9 +109,10 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return identity.filter_user(user_ref.to_dict())
 
-    def list_users(self):
+    def list_users(self, marker=None, limit=None, hints=None):
         session = self.get_session()
-        user_refs = session.query(User)
+        query = sql.filter_query(session.query(User), User, hints)
+        user_refs = sql.paginate(query, User, marker, limit, hints)
         return [identity.filter_user(x.to_dict()) for x in user_refs]
 
     def _get_user(self, session, user_id):
@@ -171,13 +174,15 @@ class Identity(sql.Base, identity.Driver):
 
     def check_user_in_group(self, user_id, group_id):
         session = self.get_session()
+        membership = sqlalchemy.exists().where(sqlalchemy.and_(
+            UserGroupMembership.user_id == user_id,
+            UserGroupMembership.group_id == group_id))
+        if session.query(membership).scalar():
+            return
+        # tell a missing user or group from a missing membership
         self.get_group(group_id)
         self.get_user(user_id)
-        query = session.query(UserGroupMembership)
-        query = query.filter_by(user_id=user_id)
-        query = query.filter_by(group_id=group_id)
-        if not query.first():
-            raise exception.NotFound('User not found in group')
+        raise exception.NotFound('User not found in group')
 
     def remove_user_from_group(self, user_id, group_id):
         session = self.get_session()
@@ -195,19 +200,32 @@ class Identity(sql.Base, identity.Driver):
 
     def list_groups_for_user(self, user_id):
         session = self.get_session()
-        self.get_user(user_id)
-        query = session.query(UserGroupMembership)
-        query = query.filter_by(user_id=user_id)
-        membership_refs = query.all()
-        return [self.get_group(x.group_id) for x in membership_refs]
+        # the user is outer joined to its groups, so that a user without
+        # groups still has a row
+        query = session.query(User.id, Group)
+        query = query.outerjoin(UserGroupMembership,
+                                UserGroupMembership.user_id == User.id)
+        query = query.outerjoin(Group,
+                                Group.id == UserGroupMembership.group_id)
+        rows = query.filter(User.id == user_id).all()
+        if not rows:
+            raise exception.UserNotFound(user_id=user_id)
+        return [group_ref.to_dict() for _id, group_ref in rows
+                if group_ref is not None]
 
     def list_users_in_group(self, group_id):
         session = self.get_session()
-        self.get_group(group_id)
-        query = session.query(UserGroupMembership)
-        query = query.filter_by(group_id=group_id)
-        membership_refs = query.all()
-        return [self.get_user(x.user_id) for x in membership_refs]
+        # the group is outer joined to its users, so that a group without
+        # users still has a row
+        query = session.query(Group.id, User)
+        query = query.outerjoin(UserGroupMembership,
+                                UserGroupMembership.group_id == Group.id)
+        query = query.outerjoin(User, User.id == UserGroupMembership.user_id)
+        rows = query.filter(Group.id == group_id).all()
+        if not rows:
+            raise exception.GroupNotFound(group_id=group_id)
+        return [identity.filter_user(user_ref.to_dict())
+                for _id, user_ref in rows if user_ref is not None]
 
     def delete_user(self, user_id):
         session = self.get_session()
@@ -234,9 +252,10 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_groups(self):
+    def list_groups(self, marker=None, limit=None, hints=None):
         session = self.get_session()
-        refs = session.query(Group).all()
+        query = sql.filter_query(session.query(Group), Group, hints)
+        refs = sql.paginate(query, Group, marker, limit, hints).all()
         return [ref.to_dict() for ref in refs]
 
     def _get_group(self, session, group_id):
@@ -25,6 +25,7 @@ from keystone.common import controller
 from keystone.common import logging
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import jsonutils
 
 
 CONF = config.CONF
@@ -551,8 +552,10 @@ class ProjectV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'enabled', 'name')
     def list_projects(self, context, filters):
-        refs = self.identity_api.list_projects()
-        return ProjectV3.wrap_collection(context, refs, filters)
+        hints = ProjectV3.build_driver_hints(context, filters)
+        refs = self.identity_api.list_projects(hints=hints,
+                                               **ProjectV3.page_args(context))
+        return ProjectV3.wrap_collection(context, refs, hints.filter_names())
 
     @controller.filterprotected('enabled', 'name')
     def list_user_projects(self, context, filters, user_id):
@@ -599,8 +602,10 @@ class UserV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users(self, context, filters):
-        refs = self.identity_api.list_users()
-        return UserV3.wrap_collection(context, refs, filters)
+        hints = UserV3.build_driver_hints(context, filters)
+        refs = self.identity_api.list_users(hints=hints,
+                                            **UserV3.page_args(context))
+        return UserV3.wrap_collection(context, refs, hints.filter_names())
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users_in_group(self, context, filters, group_id):
@@ -670,8 +675,10 @@ class GroupV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'name')
     def list_groups(self, context, filters):
-        refs = self.identity_api.list_groups()
-        return GroupV3.wrap_collection(context, refs, filters)
+        hints = GroupV3.build_driver_hints(context, filters)
+        refs = self.identity_api.list_groups(hints=hints,
+                                             **GroupV3.page_args(context))
+        return GroupV3.wrap_collection(context, refs, hints.filter_names())
 
     @controller.filterprotected('name')
     def list_groups_for_user(self, context, filters, user_id):
@@ -719,8 +726,10 @@ class RoleV3(controller.V3Controller):
 
     @controller.filterprotected('name')
     def list_roles(self, context, filters):
-        refs = self.identity_api.list_roles()
-        return RoleV3.wrap_collection(context, refs, filters)
+        hints = RoleV3.build_driver_hints(context, filters)
+        refs = self.identity_api.list_roles(hints=hints,
+                                            **RoleV3.page_args(context))
+        return RoleV3.wrap_collection(context, refs, hints.filter_names())
 
     @controller.protected
     def get_role(self, context, role_id):
@@ -899,7 +908,8 @@ class RoleAssignmentV3(controller.V3Controller):
 
         return formatted_entity
 
-    def _expand_indirect_assignments(self, refs):
+    def _expand_indirect_assignments(self, refs, user_id=None,
+                                     project_id=None):
         """Processes entity list into all-direct assignments.
 
         For any group role assignments in the list, create a role assignment
@@ -913,6 +923,10 @@ class RoleAssignmentV3(controller.V3Controller):
         For any new entity created by virtue of group membership, add in an
         additional link to that membership.
 
+        If user_id is given, the groups in the list are expected to be those
+        of that user, and only that member is expanded. If project_id is
+        given, inherited roles are only expanded on that project.
+
         """
         def _get_group_members(ref):
             """Get a list of group members.
@@ -922,6 +936,8 @@ class RoleAssignmentV3(controller.V3Controller):
             overall processing to continue.
 
             """
+            if user_id is not None:
+                return [{'id': user_id}]
             try:
                 members = self.identity_api.list_users_in_group(
                     ref['group']['id'])
@@ -1024,9 +1040,12 @@ class RoleAssignmentV3(controller.V3Controller):
                 # It's an inherited domain role - so get the list of projects
                 # owned by this domain. A domain scope is guaranteed since we
                 # checked this when we built the refs list
-                project_ids = (
-                    [x['id'] for x in self.assignment_api.list_projects(
-                        r['scope']['domain']['id'])])
+                if project_id is not None:
+                    project_ids = [project_id]
+                else:
+                    project_ids = (
+                        [x['id'] for x in self.assignment_api.list_projects(
+                            r['scope']['domain']['id'])])
                 base_entry = copy.deepcopy(r)
                 domain_id = base_entry['scope']['domain']['id']
                 base_entry['scope'].pop('domain')
@@ -1089,34 +1108,154 @@ class RoleAssignmentV3(controller.V3Controller):
             val = True
         return val
 
-    def _filter_inherited(self, entry):
-        if ('inherited_to_projects' in entry and
-                not CONF.os_inherit.enabled):
-                    return False
+    def _assignment_filters(self, query):
+        """Map the query filters to list_role_assignments arguments.
+
+        Inherited assignments are only listed if the OS-INHERIT extension is
+        enabled. Returns None if no assignment can match the filters.
+
+        """
+        filters = {'user.id': 'user_id',
+                   'group.id': 'group_id',
+                   'role.id': 'role_id',
+                   'scope.project.id': 'project_id',
+                   'scope.domain.id': 'domain_id'}
+        kwargs = dict((arg, query[f]) for f, arg in filters.iteritems()
+                      if f in query)
+        if 'scope.OS-INHERIT:inherited_to' in query:
+            if (query['scope.OS-INHERIT:inherited_to'] != 'projects' or
+                    not CONF.os_inherit.enabled):
+                return None
+            kwargs['inherited_to_projects'] = True
+        elif not CONF.os_inherit.enabled:
+            kwargs['inherited_to_projects'] = False
+        return kwargs
+
+    def _list_effective_assignments(self, query):
+        """List the assignments which may be effective for the filters.
+
+        Only the assignments of the filtered user and that user's groups,
+        and on the filtered project or the domain owning it, are listed
+        and then expanded.
+
+        """
+        kwargs = self._assignment_filters(query)
+        if kwargs is None or 'group_id' in kwargs:
+            # group assignments are all expanded into user ones
+            return []
+        user_id = kwargs.pop('user_id', None)
+        project_id = kwargs.pop('project_id', None)
+        domain_id = kwargs.pop('domain_id', None)
+
+        actors = [{}]
+        if user_id is not None:
+            actors = [{'user_id': user_id}]
+            try:
+                groups = self.identity_api.list_groups_for_user(user_id)
+            except exception.UserNotFound:
+                groups = []
+            actors.extend({'group_id': group['id']} for group in groups)
+
+        targets = [{}]
+        if project_id is not None:
+            targets = [{'project_id': project_id}]
+            if CONF.os_inherit.enabled:
+                try:
+                    project_ref = self.assignment_api.get_project(project_id)
+                except exception.ProjectNotFound:
+                    pass
+                else:
+                    targets.append({'domain_id': project_ref['domain_id'],
+                                    'inherited_to_projects': True})
+        elif domain_id is not None:
+            # inherited assignments are expanded to the domain's projects
+            targets = [{'domain_id': domain_id,
+                        'inherited_to_projects': False}]
+
+        refs = []
+        for actor in actors:
+            for target in targets:
+                call_kwargs = dict(kwargs, **actor)
+                if any(call_kwargs.get(k, v) != v
+                       for k, v in target.iteritems()):
+                    continue
+                call_kwargs.update(target)
+                refs.extend(
+                    self.identity_api.list_role_assignments(**call_kwargs))
+
+        formatted_refs = [self._format_entity(x) for x in refs]
+        return self._expand_indirect_assignments(
+            formatted_refs, user_id=user_id, project_id=project_id)
+
+    @classmethod
+    def _page_key(cls, entity):
+        """Return the key formatted role assignments are paginated by.
+
+        It starts with the key the assignment drivers sort assignments by,
+        followed by the links which tell apart the effective assignments
+        expanded from different groups or domains.
+
+        """
+        scope = entity['scope']
+        if 'user' in entity:
+            actor_type, actor_id = 'User', entity['user']['id']
         else:
-            return True
+            actor_type, actor_id = 'Group', entity['group']['id']
+        if 'project' in scope:
+            target_type, target_id = 'Project', scope['project']['id']
+        else:
+            target_type, target_id = 'Domain', scope['domain']['id']
+        return [actor_type + target_type, actor_id, target_id,
+                entity['role']['id'], 'OS-INHERIT:inherited_to' in scope,
+                entity['links']['assignment'],
+                entity['links'].get('membership', '')]
+
+    @classmethod
+    def _page_marker(cls, context):
+        if 'marker' not in context['query_string']:
+            return None
+        try:
+            marker = jsonutils.loads(context['query_string']['marker'])
+        except ValueError:
+            marker = None
+        # the marker is compared with the drivers' keys, see _page_key
+        if (not isinstance(marker, list) or len(marker) != 7 or
+                not all(isinstance(x, basestring)
+                        for x in marker[:4] + marker[5:]) or
+                not isinstance(marker[4], bool)):
+            msg = _('Invalid marker: %s') % context['query_string']['marker']
+            raise exception.ValidationError(message=msg)
+        return marker
+
+    @classmethod
+    def _format_marker(cls, key):
+        return jsonutils.dumps(key)
 
     @controller.filterprotected('group.id', 'role.id',
                                 'scope.domain.id', 'scope.project.id',
                                 'scope.OS-INHERIT:inherited_to', 'user.id')
     def list_role_assignments(self, context, filters):
+        """List role assignments, filtered and paginated by the driver.
 
-        # TODO(henry-nash): This implementation uses the standard filtering
-        # in the V3.wrap_collection. Given the large number of individual
-        # assignments, this is pretty inefficient.  An alternative would be
-        # to pass the filters into the driver call, so that the list size is
-        # kept a minimum.
-
-        refs = self.identity_api.list_role_assignments()
-        formatted_refs = (
-            [self._format_entity(x) for x in refs
-             if self._filter_inherited(x)])
-
-        if ('effective' in context['query_string'] and
-                self._query_filter_is_true(
-                    context['query_string']['effective'])):
+        Effective assignments are expanded from the assignments matching the
+        filters only, and paginated once expanded.
 
-            formatted_refs = self._expand_indirect_assignments(formatted_refs)
+        """
+        query = context['query_string']
+        if ('effective' in query and
+                self._query_filter_is_true(query['effective'])):
+            formatted_refs = self._list_effective_assignments(query)
+        else:
+            kwargs = self._assignment_filters(query)
+            if kwargs is None:
+                refs = []
+            else:
+                page_args = self.page_args(context)
+                if page_args['marker'] is not None:
+                    kwargs['marker'] = page_args['marker'][:5]
+                kwargs['limit'] = page_args['limit']
+                refs = self.identity_api.list_role_assignments(**kwargs)
+            formatted_refs = [self._format_entity(x) for x in refs]
 
         return self.wrap_collection(context, formatted_refs, filters)
 
@@ -88,6 +88,18 @@ class Manager(manager.Manager):
         group.setdefault('description', '')
         return self.driver.create_group(group_id, group)
 
+    def add_user_to_group(self, user_id, group_id):
+        try:
+            return self.driver.add_user_to_group(user_id, group_id)
+        finally:
+            self.assignment.invalidate_role_cache()
+
+    def remove_user_from_group(self, user_id, group_id):
+        try:
+            return self.driver.remove_user_from_group(user_id, group_id)
+        finally:
+            self.assignment.invalidate_role_cache()
+
     def create_project(self, tenant_id, tenant_ref):
         tenant = tenant_ref.copy()
         tenant.setdefault('enabled', True)
@@ -107,14 +119,17 @@ class Manager(manager.Manager):
     def get_project(self, tenant_id):
         return self.assignment.get_project(tenant_id)
 
-    def list_projects(self, domain_id=None):
-        return self.assignment.list_projects(domain_id)
+    def list_projects(self, domain_id=None, marker=None, limit=None,
+                      hints=None):
+        return self.assignment.list_projects(domain_id, marker=marker,
+                                             limit=limit, hints=hints)
 
     def get_role(self, role_id):
         return self.assignment.get_role(role_id)
 
-    def list_roles(self):
-        return self.assignment.list_roles()
+    def list_roles(self, marker=None, limit=None, hints=None):
+        return self.assignment.list_roles(marker=marker, limit=limit,
+                                          hints=hints)
 
     def get_projects_for_user(self, user_id):
         return self.assignment.get_projects_for_user(user_id)
@@ -210,8 +225,8 @@ class Manager(manager.Manager):
     def remove_user_from_project(self, tenant_id, user_id):
         return self.assignment.remove_user_from_project(tenant_id, user_id)
 
-    def list_role_assignments(self):
-        return self.assignment_api.list_role_assignments()
+    def list_role_assignments(self, **kwargs):
+        return self.assignment_api.list_role_assignments(**kwargs)
 
 
 class Driver(object):
@@ -233,9 +248,14 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_users(self):
+    def list_users(self, marker=None, limit=None, hints=None):
         """List all users in the system.
 
+        Users are listed by ID. If a marker ID is given, only the users
+        after it are listed, up to limit users. The filters of hints the
+        driver applies are removed from it, see
+        keystone.common.driver_hints.Hints.
+
         :returns: a list of user_refs or an empty list.
 
         """
@@ -320,9 +340,14 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_groups(self):
+    def list_groups(self, marker=None, limit=None, hints=None):
         """List all groups in the system.
 
+        Groups are listed by ID. If a marker ID is given, only the groups
+        after it are listed, up to limit groups. The filters of hints the
+        driver applies are removed from it, see
+        keystone.common.driver_hints.Hints.
+
         :returns: a list of group_refs or an empty list.
 
         """
@@ -39,6 +39,16 @@ class Token(kvs.Base, token.Driver):
         else:
             raise exception.TokenNotFound(token_id=token_id)
 
+    def get_tokens(self, token_ids):
+        now = timeutils.utcnow()
+        token_refs = {}
+        for token_id in token_ids:
+            ref = self.db.get('token-%s' % token_id, {})
+            expiry = ref.get('expires')
+            if expiry is not None and expiry > now:
+                token_refs[token_id] = copy.deepcopy(ref)
+        return token_refs
+
     def create_token(self, token_id, data):
         data_copy = copy.deepcopy(data)
         data_copy['id'] = token_id
@@ -53,6 +63,8 @@ class Token(kvs.Base, token.Driver):
         try:
             token_ref = self.get_token(token_id)
             self.db.delete('token-%s' % token_id)
+            token_ref['revision'] = self._next_revocation_revision()
+            token_ref['revoked_at'] = timeutils.utcnow()
             self.db.set('revoked-token-%s' % token_id, token_ref)
         except exception.NotFound:
             raise exception.TokenNotFound(token_id=token_id)
@@ -113,8 +125,43 @@ class Token(kvs.Base, token.Driver):
             tokens.append(record)
         return tokens
 
-    def flush_expired_tokens(self):
+    def _next_revocation_revision(self):
+        revision = self.get_revocation_revision() + 1
+        self.db.set('revocation-revision', {'revision': revision})
+        return revision
+
+    def get_revocation_revision(self):
+        return self.db.get('revocation-revision', {}).get('revision', 0)
+
+    def list_revocation_events(self, since, revoked_after=None):
+        def is_listed(token_ref):
+            if token_ref.get('revision', 0) > since:
+                return True
+            return (revoked_after is not None and
+                    token_ref.get('revoked_at') is not None and
+                    token_ref['revoked_at'] >= revoked_after)
+
+        events = []
+        now = timeutils.utcnow()
+        for token, token_ref in self.db.items():
+            if not token.startswith('revoked-token-'):
+                continue
+            if not is_listed(token_ref):
+                continue
+            if self.is_expired(now, token_ref):
+                continue
+            events.append({'id': token_ref['id'],
+                           'expires': token_ref['expires'],
+                           'revision': token_ref['revision']})
+        return sorted(events, key=lambda event: event['revision'])
+
+    def flush_expired_tokens(self, limit=None):
         now = timeutils.utcnow()
+        count = 0
         for token, token_ref in self.db.items():
+            if limit is not None and count >= limit:
+                break
             if self.is_expired(now, token_ref):
                 self.db.delete(token)
+                count += 1
+        return count
@@ -16,10 +16,10 @@
 
 from __future__ import absolute_import
 import copy
-
-import memcache
+import datetime
 
 from keystone.common import logging
+from keystone.common import memcache_pool
 from keystone.common import utils
 from keystone import config
 from keystone import exception
@@ -29,14 +29,16 @@ from keystone import token
 
 
 CONF = config.CONF
-config.register_str('servers', group='memcache', default='localhost:11211')
-config.register_int('max_compare_and_set_retry', group='memcache', default=16)
-
 LOG = logging.getLogger(__name__)
 
 
 class Token(token.Driver):
     revocation_key = 'revocation-list'
+    revision_key = 'revocation-revision'
+    # The token index of each user and the revocation list are split into one
+    # key per hour of expiry, which memcache discards once every token it
+    # lists has expired.
+    shard_interval = 3600
 
     def __init__(self, client=None):
         self._memcache_client = client
@@ -47,13 +49,13 @@ class Token(token.Driver):
 
     def _get_memcache_client(self):
         memcache_servers = CONF.memcache.servers.split(',')
-        # NOTE(morganfainberg): The memcache client library for python is NOT
-        # thread safe and should not be passed between threads. This is highly
-        # specific to the cas() (compare and set) methods and the caching of
-        # the previous value(s). It appears greenthread should ensure there is
-        # a single data structure per spawned greenthread.
-        self._memcache_client = memcache.Client(memcache_servers, debug=0,
-                                                cache_cas=True)
+        # The client pools its connections and can be shared by every
+        # greenthread.
+        self._memcache_client = memcache_pool.ConsistentHashClient(
+            memcache_servers,
+            replicas=CONF.memcache.replicas,
+            dead_retry=CONF.memcache.dead_retry,
+            pool_size=CONF.memcache.pool_size)
         return self._memcache_client
 
     def _prefix_token_id(self, token_id):
@@ -62,6 +64,83 @@ class Token(token.Driver):
     def _prefix_user_id(self, user_id):
         return 'usertokens-%s' % user_id.encode('utf-8')
 
+    def _shard(self, expires):
+        return int(utils.unixtime(expires)) // self.shard_interval
+
+    def _shard_key(self, key, shard):
+        return '%s-%d' % (key, shard)
+
+    def _max_shard_key(self, key):
+        return '%s-maxshard' % key
+
+    def _append_to_shard(self, key, expires, data):
+        """Append data to the list sharded under key for its expiry time.
+
+        Appending does not read the list, so the cost of an addition does not
+        depend on its length. Memcache drops a whole shard once all the tokens
+        it lists have expired.
+
+        :returns: False if the shard could be neither appended to nor created
+
+        """
+        shard = self._shard(expires)
+        shard_key = self._shard_key(key, shard)
+        shard_expires = (shard + 1) * self.shard_interval
+        data_json = jsonutils.dumps(data)
+        if not (self.client.append(shard_key, ',%s' % data_json) or
+                self.client.add(shard_key, data_json, time=shard_expires) or
+                # another process created the shard first
+                self.client.append(shard_key, ',%s' % data_json)):
+            return False
+        self._raise_max_shard(key, shard)
+        return True
+
+    def _raise_max_shard(self, key, shard):
+        """Record shard as the last shard of key, unless a later one is.
+
+        The shards are otherwise only read up to the default expiry of new
+        tokens, which would miss tokens given a later expiry, or issued before
+        [token] expiration was lowered. The counter is raised by increments
+        so that concurrent raises are not lost; a race may only leave it past
+        the last shard, which costs reading a few missing keys.
+
+        """
+        max_key = self._max_shard_key(key)
+        max_shard = self.client.get(max_key)
+        if max_shard is None:
+            if self.client.add(max_key, shard):
+                return
+            # another process created the counter first
+            max_shard = self.client.get(max_key) or 0
+        if shard > int(max_shard):
+            self.client.incr(max_key, shard - int(max_shard))
+
+    def _list_shards(self, key):
+        """Return the entries of the shards which may list live tokens."""
+        now = timeutils.utcnow()
+        last_expires = now + datetime.timedelta(seconds=CONF.token.expiration)
+        last_shard = self._shard(last_expires)
+        max_key = self._max_shard_key(key)
+        # The unsharded key written by earlier releases is read until the
+        # tokens it lists have expired.
+        keys = [key]
+        keys.extend(self._shard_key(key, shard)
+                    for shard in range(self._shard(now), last_shard + 1))
+        records = self.client.get_multi(keys + [max_key])
+
+        max_shard = int(records.get(max_key) or 0)
+        if max_shard > last_shard:
+            later_keys = [self._shard_key(key, shard)
+                          for shard in range(last_shard + 1, max_shard + 1)]
+            records.update(self.client.get_multi(later_keys))
+            keys.extend(later_keys)
+
+        entries = []
+        for key in keys:
+            if records.get(key):
+                entries.extend(jsonutils.loads('[%s]' % records[key]))
+        return entries
+
     def get_token(self, token_id):
         if token_id is None:
             raise exception.TokenNotFound(token_id='')
@@ -72,6 +151,15 @@ class Token(token.Driver):
 
         return token_ref
 
+    def get_tokens(self, token_ids):
+        prefixed_ids = dict((self._prefix_token_id(token_id), token_id)
+                            for token_id in token_ids if token_id)
+        if not prefixed_ids:
+            return {}
+        token_refs = self.client.get_multi(prefixed_ids.keys())
+        return dict((prefixed_ids[ptk], token_ref)
+                    for ptk, token_ref in token_refs.iteritems())
+
     def create_token(self, token_id, data):
         data_copy = copy.deepcopy(data)
         ptk = self._prefix_token_id(token_id)
@@ -85,109 +173,50 @@ class Token(token.Driver):
             kwargs['time'] = expires_ts
         self.client.set(ptk, data_copy, **kwargs)
         if 'id' in data['user']:
-            token_data = jsonutils.dumps(token_id)
-            user_id = data['user']['id']
-            user_key = self._prefix_user_id(user_id)
-            # Append the new token_id to the token-index-list stored in the
-            # user-key within memcache.
-            self._update_user_list_with_cas(user_key, token_data)
+            user_key = self._prefix_user_id(data['user']['id'])
+            if not self._append_to_shard(user_key, data_copy['expires'],
+                                         token_id):
+                msg = _('Unable to add token to user list.')
+                raise exception.UnexpectedError(msg)
         return copy.deepcopy(data_copy)
 
-    def _update_user_list_with_cas(self, user_key, token_id):
-        cas_retry = 0
-        max_cas_retry = CONF.memcache.max_compare_and_set_retry
-        current_time = timeutils.normalize_time(
-            timeutils.parse_isotime(timeutils.isotime()))
-
-        self.client.reset_cas()
-
-        while cas_retry <= max_cas_retry:
-            # NOTE(morganfainberg): cas or "compare and set" is a function of
-            # memcache. It will return false if the value has changed since the
-            # last call to client.gets(). This is the memcache supported method
-            # of avoiding race conditions on set().  Memcache is already atomic
-            # on the back-end and serializes operations.
-            #
-            # cas_retry is for tracking our iterations before we give up (in
-            # case memcache is down or something horrible happens we don't
-            # iterate forever trying to compare and set the new value.
-            cas_retry += 1
-            record = self.client.gets(user_key)
-            filtered_list = []
-
-            if record is not None:
-                token_list = jsonutils.loads('[%s]' % record)
-                for token_i in token_list:
-                    ptk = self._prefix_token_id(token_i)
-                    token_ref = self.client.get(ptk)
-                    if not token_ref:
-                        # skip tokens that do not exist in memcache
-                        continue
-
-                    if 'expires' in token_ref:
-                        expires_at = timeutils.normalize_time(
-                            token_ref['expires'])
-                        if expires_at < current_time:
-                            # skip tokens that are expired.
-                            continue
-
-                    # Add the still valid token_id to the list.
-                    filtered_list.append(jsonutils.dumps(token_i))
-            # Add the new token_id to the list.
-            filtered_list.append(token_id)
-
-            # Use compare-and-set (cas) to set the new value for the
-            # token-index-list for the user-key. Cas is used to prevent race
-            # conditions from causing the loss of valid token ids from this
-            # list.
-            if self.client.cas(user_key, ','.join(filtered_list)):
-                msg = _('Successful set of token-index-list for user-key '
-                        '"%(user_key)s", #%(count)d records')
-                LOG.debug(msg, {'user_key': user_key,
-                                'count': len(filtered_list)})
-                return filtered_list
-
-            # The cas function will return true if it succeeded or false if it
-            # failed for any reason, including memcache server being down, cas
-            # id changed since gets() called (the data changed between when
-            # this loop started and this point, etc.
-            error_msg = _('Failed to set token-index-list for user-key '
-                          '"%(user_key)s". Attempt %(cas_retry)d of '
-                          '%(cas_retry_max)d')
-            LOG.debug(error_msg,
-                      {'user_key': user_key,
-                       'cas_retry': cas_retry,
-                       'cas_retry_max': max_cas_retry})
-
-        # Exceeded the maximum retry attempts.
-        error_msg = _('Unable to add token user list')
-        raise exception.UnexpectedError(error_msg)
-
     def _add_to_revocation_list(self, data):
-        data_json = jsonutils.dumps(data)
-        if not self.client.append(self.revocation_key, ',%s' % data_json):
-            if not self.client.add(self.revocation_key, data_json):
-                if not self.client.append(self.revocation_key,
-                                          ',%s' % data_json):
-                    msg = _('Unable to add token to revocation list.')
-                    raise exception.UnexpectedError(msg)
+        record = {'id': data['id'],
+                  'expires': data['expires'],
+                  'revision': data['revision'],
+                  'revoked_at': timeutils.isotime()}
+        if not self._append_to_shard(self.revocation_key, data['expires'],
+                                     record):
+            msg = _('Unable to add token to revocation list.')
+            raise exception.UnexpectedError(msg)
+
+    def _next_revocation_revision(self):
+        revision = self.client.incr(self.revision_key)
+        if revision is None:
+            if self.client.add(self.revision_key, 1):
+                return 1
+            # another process created the counter first
+            revision = self.client.incr(self.revision_key)
+            if revision is None:
+                msg = _('Unable to increment the revocation list revision.')
+                raise exception.UnexpectedError(msg)
+        return int(revision)
 
     def delete_token(self, token_id):
         # Test for existence
         data = self.get_token(token_id)
         ptk = self._prefix_token_id(token_id)
         result = self.client.delete(ptk)
+        data['revision'] = self._next_revocation_revision()
         self._add_to_revocation_list(data)
         return result
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None):
         tokens = []
-        user_key = self._prefix_user_id(user_id)
-        user_record = self.client.get(user_key) or ""
-        token_list = jsonutils.loads('[%s]' % user_record)
+        token_list = self._list_shards(self._prefix_user_id(user_id))
+        token_refs = self.get_tokens(token_list)
         for token_id in token_list:
-            ptk = self._prefix_token_id(token_id)
-            token_ref = self.client.get(ptk)
+            token_ref = token_refs.get(token_id)
             if token_ref:
                 if tenant_id is not None:
                     tenant = token_ref.get('tenant')
@@ -206,7 +235,27 @@ class Token(token.Driver):
         return tokens
 
     def list_revoked_tokens(self):
-        list_json = self.client.get(self.revocation_key)
-        if list_json:
-            return jsonutils.loads('[%s]' % list_json)
-        return []
+        now = timeutils.utcnow()
+        return [data for data in self._list_shards(self.revocation_key)
+                if data.get('expires') and
+                timeutils.normalize_time(
+                    timeutils.parse_isotime(data['expires'])) > now]
+
+    def get_revocation_revision(self):
+        return int(self.client.get(self.revision_key) or 0)
+
+    def list_revocation_events(self, since, revoked_after=None):
+        def is_listed(data):
+            if data.get('revision', 0) > since:
+                return True
+            if revoked_after is None or not data.get('revoked_at'):
+                return False
+            revoked_at = timeutils.normalize_time(
+                timeutils.parse_isotime(data['revoked_at']))
+            return revoked_at >= revoked_after
+
+        events = [{'id': data['id'],
+                   'expires': data['expires'],
+                   'revision': data['revision']}
+                  for data in self.list_revoked_tokens() if is_listed(data)]
+        return sorted(events, key=lambda event: event['revision'])
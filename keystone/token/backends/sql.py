@@ -17,6 +17,8 @@
 import copy
 import datetime
 
+import sqlalchemy
+
 
 from keystone.common import sql
 from keystone import exception
@@ -33,9 +35,38 @@ class TokenModel(sql.ModelBase, sql.DictBase):
     valid = sql.Column(sql.Boolean(), default=True)
     user_id = sql.Column(sql.String(64))
     trust_id = sql.Column(sql.String(64), nullable=True)
+    # copied from extra['tenant']['id'] so that tokens can be filtered by
+    # project without decoding extra
+    tenant_id = sql.Column(sql.String(64), nullable=True)
+    __table_args__ = (
+        sql.Index('ix_token_expires', 'expires'),
+        sql.Index('ix_token_user_id_valid_expires',
+                  'user_id', 'valid', 'expires'),
+        sql.Index('ix_token_user_id_tenant_id_valid_expires',
+                  'user_id', 'tenant_id', 'valid', 'expires'),
+        sql.Index('ix_token_trust_id_valid_expires',
+                  'trust_id', 'valid', 'expires'),
+        sql.Index('ix_token_valid_expires', 'valid', 'expires'),
+        {})
+
+
+class RevocationEventModel(sql.ModelBase, sql.DictBase):
+    __tablename__ = 'token_revocation_event'
+    # ids double as revocation list revisions, so they must never be reused
+    __table_args__ = (
+        sql.Index('ix_token_revocation_event_revoked_at', 'revoked_at'),
+        {'sqlite_autoincrement': True})
+    attributes = ['id', 'token_id', 'expires', 'revoked_at']
+    id = sql.Column(sql.Integer, primary_key=True, autoincrement=True)
+    token_id = sql.Column(sql.String(64), nullable=False)
+    expires = sql.Column(sql.DateTime(), default=None)
+    revoked_at = sql.Column(sql.DateTime(), default=None)
 
 
 class Token(sql.Base, token.Driver):
+    # maximum number of token ids in the IN clause of a single statement
+    in_clause_size = 500
+
     # Public interface
     def get_token(self, token_id):
         if token_id is None:
@@ -51,6 +82,18 @@ class Token(sql.Base, token.Driver):
             raise exception.TokenNotFound(token_id=token_id)
         return token_ref.to_dict()
 
+    def get_tokens(self, token_ids):
+        token_ids = [token_id for token_id in token_ids if token_id]
+        if not token_ids:
+            return {}
+        session = self.get_session()
+        now = datetime.datetime.utcnow()
+        query = session.query(TokenModel)
+        query = query.filter(TokenModel.id.in_(token_ids))
+        query = query.filter(TokenModel.expires > now)
+        query = query.filter_by(valid=True)
+        return dict((token_ref.id, token_ref.to_dict()) for token_ref in query)
+
     def create_token(self, token_id, data):
         data_copy = copy.deepcopy(data)
         if not data_copy.get('expires'):
@@ -60,6 +103,8 @@ class Token(sql.Base, token.Driver):
 
         token_ref = TokenModel.from_dict(data_copy)
         token_ref.valid = True
+        if data_copy.get('tenant'):
+            token_ref.tenant_id = data_copy['tenant'].get('id')
         session = self.get_session()
         with session.begin():
             session.add(token_ref)
@@ -73,6 +118,7 @@ class Token(sql.Base, token.Driver):
             if not token_ref or not token_ref.valid:
                 raise exception.TokenNotFound(token_id=token_id)
             token_ref.valid = False
+            self._add_revocation_event(session, token_ref)
             session.flush()
 
     def delete_tokens(self, user_id, tenant_id=None, trust_id=None):
@@ -86,57 +132,79 @@ class Token(sql.Base, token.Driver):
         """
         session = self.get_session()
         with session.begin():
-            now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter_by(valid=True)
-            query = query.filter(TokenModel.expires > now)
+            query = self._live_tokens_query(session)
             if trust_id:
                 query = query.filter(TokenModel.trust_id == trust_id)
             else:
                 query = query.filter(TokenModel.user_id == user_id)
+            if tenant_id:
+                query = query.filter(TokenModel.tenant_id == tenant_id)
+            return self._revoke_tokens(session, query)
 
-            for token_ref in query.all():
-                if tenant_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._tenant_matches(tenant_id, token_ref_dict):
-                        continue
-                token_ref.valid = False
+    def delete_tokens_for_trusts(self, trusts):
+        trust_ids = [trust['id'] for trust in trusts]
+        if not trust_ids:
+            return 0
+        session = self.get_session()
+        with session.begin():
+            query = self._live_tokens_query(session)
+            query = query.filter(TokenModel.trust_id.in_(trust_ids))
+            return self._revoke_tokens(session, query)
 
-            session.flush()
+    def _live_tokens_query(self, session):
+        query = session.query(TokenModel)
+        query = query.filter_by(valid=True)
+        return query.filter(TokenModel.expires > timeutils.utcnow())
+
+    def _revoke_tokens(self, session, query):
+        """Invalidate the tokens matched by query.
+
+        Only the tokens recorded as revocation events are invalidated, so
+        that a token committed after the SELECT is not revoked without an
+        event. Returns the number of tokens revoked.
+
+        """
+        now = timeutils.utcnow()
+        events = [{'token_id': token_id, 'expires': expires, 'revoked_at': now}
+                  for token_id, expires in query.values(TokenModel.id,
+                                                        TokenModel.expires)]
+        if not events:
+            return 0
+        session.execute(RevocationEventModel.__table__.insert(), events)
+        token_ids = [event['token_id'] for event in events]
+        count = 0
+        for i in xrange(0, len(token_ids), self.in_clause_size):
+            batch = token_ids[i:i + self.in_clause_size]
+            query = session.query(TokenModel)
+            query = query.filter(TokenModel.id.in_(batch))
+            count += query.update({'valid': False},
+                                  synchronize_session=False)
+        return count
 
-    def _tenant_matches(self, tenant_id, token_ref_dict):
-        return ((tenant_id is None) or
-                (token_ref_dict.get('tenant') and
-                 token_ref_dict['tenant'].get('id') == tenant_id))
+    def _add_revocation_event(self, session, token_ref):
+        session.add(RevocationEventModel(token_id=token_ref.id,
+                                         expires=token_ref.expires,
+                                         revoked_at=timeutils.utcnow()))
 
     def _list_tokens_for_trust(self, trust_id):
         session = self.get_session()
-        tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
+        query = session.query(TokenModel.id)
         query = query.filter(TokenModel.expires > now)
         query = query.filter(TokenModel.trust_id == trust_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            tokens.append(token_ref_dict['id'])
-        return tokens
+        query = query.filter_by(valid=True)
+        return [token_ref.id for token_ref in query]
 
     def _list_tokens_for_user(self, user_id, tenant_id=None):
         session = self.get_session()
-        tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
+        query = session.query(TokenModel.id)
         query = query.filter(TokenModel.expires > now)
         query = query.filter(TokenModel.user_id == user_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if self._tenant_matches(tenant_id, token_ref_dict):
-                tokens.append(token_ref['id'])
-        return tokens
+        if tenant_id:
+            query = query.filter(TokenModel.tenant_id == tenant_id)
+        query = query.filter_by(valid=True)
+        return [token_ref.id for token_ref in query]
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None):
         if trust_id:
@@ -146,24 +214,72 @@ class Token(sql.Base, token.Driver):
 
     def list_revoked_tokens(self):
         session = self.get_session()
-        tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
+        query = session.query(TokenModel.id, TokenModel.expires)
         query = query.filter(TokenModel.expires > now)
-        token_references = query.filter_by(valid=False)
-        for token_ref in token_references:
-            record = {
-                'id': token_ref['id'],
-                'expires': token_ref['expires'],
-            }
-            tokens.append(record)
-        return tokens
-
-    def flush_expired_tokens(self):
+        query = query.filter_by(valid=False)
+        return [{'id': token_ref.id, 'expires': token_ref.expires}
+                for token_ref in query]
+
+    def get_revocation_revision(self):
+        return self._get_revocation_revision(self.get_session())
+
+    def _get_revocation_revision(self, session):
+        query = session.query(RevocationEventModel.id)
+        latest = query.order_by(RevocationEventModel.id.desc()).first()
+        return latest.id if latest else 0
+
+    def list_revocation_events(self, since, revoked_after=None):
+        session = self.get_session()
+        now = timeutils.utcnow()
+        query = session.query(RevocationEventModel)
+        criteria = RevocationEventModel.id > since
+        if revoked_after is not None:
+            criteria = sqlalchemy.or_(
+                criteria, RevocationEventModel.revoked_at >= revoked_after)
+        query = query.filter(criteria)
+        query = query.filter(RevocationEventModel.expires > now)
+        query = query.order_by(RevocationEventModel.id)
+        return [{'id': event_ref.token_id,
+                 'expires': event_ref.expires,
+                 'revision': event_ref.id} for event_ref in query]
+
+    def flush_expired_tokens(self, limit=None):
         session = self.get_session()
+        now = timeutils.utcnow()
 
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires < timeutils.utcnow())
-        query.delete(synchronize_session=False)
+        with session.begin():
+            query = session.query(TokenModel)
+            query = query.filter(TokenModel.expires < now)
+            count = self._delete_up_to(session, query, TokenModel, limit)
+            if limit is not None:
+                limit -= count
+            count += self._flush_revocation_events(session, now, limit)
+        return count
+
+    def _flush_revocation_events(self, session, now, limit):
+        # Keep the latest event, expired or not, so that the revision of the
+        # revocation list does not go backwards (some databases reuse the
+        # highest id once it is deleted).
+        revision = self._get_revocation_revision(session)
+        query = session.query(RevocationEventModel)
+        query = query.filter(RevocationEventModel.expires < now)
+        query = query.filter(RevocationEventModel.id < revision)
+        return self._delete_up_to(session, query, RevocationEventModel, limit)
+
+    def _delete_up_to(self, session, query, model, limit):
+        """Delete up to limit rows matched by query, or all if limit is None.
 
-        session.flush()
+        Deleting a bounded number of rows keeps each transaction, and the
+        locks it holds, short.
+
+        """
+        if limit is None:
+            return query.delete(synchronize_session=False)
+        if limit <= 0:
+            return 0
+        ids = [row.id for row in query.limit(limit).values(model.id)]
+        if not ids:
+            return 0
+        query = session.query(model).filter(model.id.in_(ids))
+        return query.delete(synchronize_session=False)
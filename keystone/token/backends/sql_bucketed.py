@@ -0,0 +1,409 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""SQL token driver storing tokens in time-bucketed tables.
+
+Each token is stored in the table of the bucket its expiry falls into, for
+instance ``token_20130101000000`` for tokens expiring on the 1st of January
+2013 with the default daily buckets (see ``[token] bucket_interval``).
+Lookups only query the buckets which may still hold valid tokens, and
+flushing expired tokens drops the buckets whose span has ended instead of
+deleting rows.
+
+Revocation events are kept in the ``token_revocation_event`` table of the
+SQL token driver.
+
+"""
+
+import calendar
+import copy
+import datetime
+import re
+
+import sqlalchemy
+
+from keystone.common import sql
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import timeutils
+from keystone import token
+from keystone.token.backends import sql as token_sql
+
+
+CONF = config.CONF
+
+_BUCKET_NAME_FORMAT = 'token_%Y%m%d%H%M%S'
+_BUCKET_NAME_RE = re.compile(r'^token_\d{14}$')
+
+
+class Token(token_sql.Token):
+    # minimum number of seconds between two reads of the buckets triggered
+    # by lookups of unknown tokens
+    bucket_refresh_interval = 1
+
+    def __init__(self):
+        super(Token, self).__init__()
+        self._metadata = sqlalchemy.MetaData()
+        # start of the buckets known to exist in the database, None until
+        # they are first read
+        self._buckets = None
+        self._buckets_read_at = None
+
+    # Public interface
+    def get_token(self, token_id):
+        if token_id is None:
+            raise exception.TokenNotFound(token_id=token_id)
+        session = self.get_session()
+        now = timeutils.utcnow()
+
+        def find_token(tables):
+            for table in tables:
+                query = table.select().where(table.c.id == token_id)
+                token_ref = session.execute(query).first()
+                if token_ref is not None:
+                    return token_ref
+
+        token_ref = find_token(self._live_tables())
+        if token_ref is None:
+            # the token may be in a bucket created by another process
+            token_ref = find_token(self._new_live_tables())
+        if token_ref is None:
+            raise exception.TokenNotFound(token_id=token_id)
+        if not token_ref.valid or not token_ref.expires:
+            raise exception.TokenNotFound(token_id=token_id)
+        if now >= token_ref.expires:
+            raise exception.TokenNotFound(token_id=token_id)
+        return self._to_dict(token_ref)
+
+    def get_tokens(self, token_ids):
+        token_ids = [token_id for token_id in token_ids if token_id]
+        if not token_ids:
+            return {}
+        session = self.get_session()
+        now = timeutils.utcnow()
+        tokens = {}
+
+        def find_tokens(tables):
+            for table in tables:
+                query = table.select().where(sqlalchemy.and_(
+                    table.c.id.in_(token_ids),
+                    table.c.expires > now,
+                    table.c.valid))
+                for token_ref in session.execute(query):
+                    tokens[token_ref.id] = self._to_dict(token_ref)
+
+        find_tokens(self._live_tables())
+        if len(tokens) < len(set(token_ids)):
+            # the missing tokens may be in buckets created by other processes
+            find_tokens(self._new_live_tables())
+        return tokens
+
+    def create_token(self, token_id, data):
+        data_copy = copy.deepcopy(data)
+        if not data_copy.get('expires'):
+            data_copy['expires'] = token.default_expire_time()
+        if not data_copy.get('user_id'):
+            data_copy['user_id'] = data_copy['user']['id']
+
+        values = dict((attr, None) for attr in token_sql.TokenModel.attributes)
+        values.update(extra={}, valid=True, tenant_id=None)
+        for key, value in data_copy.iteritems():
+            if key in token_sql.TokenModel.attributes:
+                values[key] = value
+            else:
+                values['extra'][key] = value
+        if data_copy.get('tenant'):
+            values['tenant_id'] = data_copy['tenant'].get('id')
+
+        start = self._bucket_start(values['expires'])
+        table = self._create_bucket(start)
+        try:
+            self._insert(table, values)
+        except sqlalchemy.exc.SQLAlchemyError:
+            # the bucket may have been dropped by another process since the
+            # buckets were read
+            if table.exists(bind=self.get_engine()):
+                raise
+            self._buckets.discard(start)
+            self._insert(self._create_bucket(start), values)
+        return self._to_dict(values)
+
+    def delete_token(self, token_id):
+        session = self.get_session()
+        with session.begin():
+            for table in self._live_tables(refresh=True):
+                query = sqlalchemy.select(
+                    [table.c.id, table.c.expires],
+                    sqlalchemy.and_(table.c.id == token_id, table.c.valid))
+                token_ref = session.execute(query).first()
+                if token_ref is not None:
+                    break
+            else:
+                raise exception.TokenNotFound(token_id=token_id)
+            session.execute(table.update().
+                            where(table.c.id == token_id).
+                            values(valid=False))
+            self._add_revocation_event(session, token_ref)
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None):
+        def criteria(table):
+            if trust_id:
+                clauses = [table.c.trust_id == trust_id]
+            else:
+                clauses = [table.c.user_id == user_id]
+            if tenant_id:
+                clauses.append(table.c.tenant_id == tenant_id)
+            return clauses
+
+        return self._revoke_bucketed_tokens(criteria)
+
+    def delete_tokens_for_trusts(self, trusts):
+        trust_ids = [trust['id'] for trust in trusts]
+        if not trust_ids:
+            return 0
+        return self._revoke_bucketed_tokens(
+            lambda table: [table.c.trust_id.in_(trust_ids)])
+
+    def list_tokens(self, user_id, tenant_id=None, trust_id=None):
+        now = timeutils.utcnow()
+        session = self.get_session()
+        tokens = []
+        for table in self._live_tables(refresh=True):
+            clauses = [table.c.expires > now, table.c.valid]
+            if trust_id:
+                clauses.append(table.c.trust_id == trust_id)
+            else:
+                clauses.append(table.c.user_id == user_id)
+                if tenant_id:
+                    clauses.append(table.c.tenant_id == tenant_id)
+            query = sqlalchemy.select([table.c.id],
+                                      sqlalchemy.and_(*clauses))
+            tokens.extend(token_ref.id for token_ref in session.execute(query))
+        return tokens
+
+    def list_revoked_tokens(self):
+        now = timeutils.utcnow()
+        session = self.get_session()
+        tokens = []
+        for table in self._live_tables(refresh=True):
+            query = sqlalchemy.select(
+                [table.c.id, table.c.expires],
+                sqlalchemy.and_(table.c.expires > now,
+                                sqlalchemy.not_(table.c.valid)))
+            tokens.extend({'id': token_ref.id, 'expires': token_ref.expires}
+                          for token_ref in session.execute(query))
+        return tokens
+
+    def flush_expired_tokens(self, limit=None):
+        """Drop the buckets whose span has ended.
+
+        Expired tokens in the current and future buckets are deleted instead,
+        as tokens may still be created in them. When a limit is given, a
+        bucket holding more expired tokens than are left to remove is emptied
+        by bounded deletes instead of dropped.
+
+        """
+        engine = self.get_engine()
+        session = self.get_session()
+        now = timeutils.utcnow()
+        ended = self._bucket_start(now)
+        count = 0
+
+        for table in self._all_tables(engine):
+            if limit is not None and count >= limit:
+                break
+            query = sqlalchemy.select([sqlalchemy.func.max(table.c.expires),
+                                       sqlalchemy.func.count()])
+            latest, rows = session.execute(query.select_from(table)).first()
+            start = self._bucket_start_from_name(table.name)
+            if start >= ended or (latest is not None and latest >= now):
+                # the bucket may still receive tokens, or holds valid ones
+                # left by a different bucket_interval
+                count += self._delete_expired(session, table, now,
+                                              self._remaining(limit, count))
+            elif limit is None or rows <= limit - count:
+                table.drop(bind=engine)
+                if self._buckets is not None:
+                    self._buckets.discard(start)
+                count += rows
+            else:
+                count += self._delete_expired(session, table, now,
+                                              limit - count)
+
+        with session.begin():
+            count += self._flush_revocation_events(
+                session, now, self._remaining(limit, count))
+        return count
+
+    # Buckets
+    def _bucket_start(self, expires):
+        interval = CONF.token.bucket_interval
+        seconds = calendar.timegm(expires.utctimetuple())
+        return datetime.datetime.utcfromtimestamp(seconds - seconds % interval)
+
+    def _bucket_start_from_name(self, name):
+        return datetime.datetime.strptime(name, _BUCKET_NAME_FORMAT)
+
+    def _bucket_table(self, start):
+        name = start.strftime(_BUCKET_NAME_FORMAT)
+        table = self._metadata.tables.get(name)
+        if table is not None:
+            return table
+        return sqlalchemy.Table(
+            name, self._metadata,
+            sql.Column('id', sql.String(64), primary_key=True),
+            sql.Column('expires', sql.DateTime(), default=None),
+            sql.Column('extra', sql.JsonBlob()),
+            sql.Column('valid', sql.Boolean(), default=True),
+            sql.Column('user_id', sql.String(64)),
+            sql.Column('trust_id', sql.String(64), nullable=True),
+            sql.Column('tenant_id', sql.String(64), nullable=True),
+            sql.Index('ix_%s_user_id_valid_expires' % name,
+                      'user_id', 'valid', 'expires'),
+            sql.Index('ix_%s_user_id_tenant_id_valid_expires' % name,
+                      'user_id', 'tenant_id', 'valid', 'expires'),
+            sql.Index('ix_%s_trust_id_valid_expires' % name,
+                      'trust_id', 'valid', 'expires'),
+            sql.Index('ix_%s_valid_expires' % name, 'valid', 'expires'))
+
+    def _create_bucket(self, start):
+        table = self._bucket_table(start)
+        if self._buckets is None:
+            self._load_buckets()
+        if start not in self._buckets:
+            engine = self.get_engine()
+            try:
+                table.create(bind=engine, checkfirst=True)
+            except sqlalchemy.exc.SQLAlchemyError:
+                # another process may have created it in the meantime
+                if not table.exists(bind=engine):
+                    raise
+            self._buckets.add(start)
+        return table
+
+    def _load_buckets(self):
+        """Read the buckets present in the database with a single query."""
+        engine = self.get_engine()
+        self._buckets = set(self._bucket_start_from_name(name)
+                            for name in engine.table_names()
+                            if _BUCKET_NAME_RE.match(name))
+        self._buckets_read_at = timeutils.utcnow()
+
+    def _live_tables(self, refresh=False):
+        """Return the tables of the buckets which may hold valid tokens.
+
+        The buckets are read from the database the first time, then only
+        when refresh is set, as other processes may have created some since.
+        Lookups refresh them when a token is missing, and revocations and
+        listings always do.
+
+        """
+        if refresh or self._buckets is None:
+            self._load_buckets()
+        first = self._bucket_start(timeutils.utcnow())
+        return [self._bucket_table(start) for start in sorted(self._buckets)
+                if start >= first]
+
+    def _new_live_tables(self):
+        """Return the live tables found by refreshing the known buckets.
+
+        The buckets are read at most once every bucket_refresh_interval
+        seconds, so that looking up unknown tokens does not query the
+        database catalog each time.
+
+        """
+        if (self._buckets_read_at is not None and
+                not timeutils.is_older_than(self._buckets_read_at,
+                                            self.bucket_refresh_interval)):
+            return []
+        known = set(self._buckets or [])
+        return [table for table in self._live_tables(refresh=True)
+                if self._bucket_start_from_name(table.name) not in known]
+
+    def _all_tables(self, engine):
+        """Return the tables of every bucket in the database, oldest first."""
+        names = sorted(name for name in engine.table_names()
+                       if _BUCKET_NAME_RE.match(name))
+        return [self._bucket_table(self._bucket_start_from_name(name))
+                for name in names]
+
+    # Helpers
+    def _to_dict(self, token_ref):
+        token_dict = copy.deepcopy(token_ref['extra']) or {}
+        for attr in token_sql.TokenModel.attributes:
+            token_dict[attr] = token_ref[attr]
+        return token_dict
+
+    def _insert(self, table, values):
+        session = self.get_session()
+        with session.begin():
+            session.execute(table.insert(), values)
+
+    def _remaining(self, limit, count):
+        return None if limit is None else limit - count
+
+    def _delete_expired(self, session, table, now, limit):
+        with session.begin():
+            query = sqlalchemy.select([table.c.id], table.c.expires < now)
+            if limit is None:
+                result = session.execute(
+                    table.delete().where(table.c.expires < now))
+                return result.rowcount
+            if limit <= 0:
+                return 0
+            ids = [token_ref.id
+                   for token_ref in session.execute(query.limit(limit))]
+            if not ids:
+                return 0
+            result = session.execute(table.delete().where(table.c.id.in_(ids)))
+            return result.rowcount
+
+    def _revoke_bucketed_tokens(self, criteria):
+        """Invalidate the live tokens matching criteria in every bucket.
+
+        criteria is called with each bucket table and returns the clauses
+        selecting the tokens to revoke. Only the selected tokens are
+        invalidated, so that none is revoked without a revocation event.
+        Returns the number of tokens revoked.
+
+        """
+        now = timeutils.utcnow()
+        session = self.get_session()
+        count = 0
+        with session.begin():
+            for table in self._live_tables(refresh=True):
+                where = sqlalchemy.and_(table.c.valid,
+                                        table.c.expires > now,
+                                        *criteria(table))
+                query = sqlalchemy.select([table.c.id, table.c.expires],
+                                          where)
+                events = [{'token_id': token_ref.id,
+                           'expires': token_ref.expires,
+                           'revoked_at': now}
+                          for token_ref in session.execute(query)]
+                if not events:
+                    continue
+                session.execute(
+                    token_sql.RevocationEventModel.__table__.insert(), events)
+                token_ids = [event['token_id'] for event in events]
+                for i in xrange(0, len(token_ids), self.in_clause_size):
+                    batch = token_ids[i:i + self.in_clause_size]
+                    result = session.execute(
+                        table.update().
+                        where(table.c.id.in_(batch)).
+                        values(valid=False))
+                    count += result.rowcount
+        return count
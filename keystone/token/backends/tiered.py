@@ -0,0 +1,220 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Token driver caching the tokens of another driver.
+
+Tokens are written through to both a cache and a persistent driver (the SQL
+token driver by default), and read from the cache first. The cache is either
+kept in the memory of each keystone process or shared in memcache, see
+``[token] tier_cache``.
+
+"""
+
+import copy
+
+from keystone.common import cache
+from keystone.common import memcache_pool
+from keystone.common import utils
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import importutils
+from keystone.openstack.common import timeutils
+from keystone import token
+
+
+CONF = config.CONF
+
+
+class MemoryTier(object):
+    """Caches tokens in the memory of the current process.
+
+    Revoking a token only evicts it from the cache of the process handling
+    the revocation, so entries are also dropped after ``[token]
+    tier_cache_time`` seconds.
+
+    """
+
+    def __init__(self):
+        self._cache = cache.LRUCache(CONF.token.tier_cache_size,
+                                     ttl=CONF.token.tier_cache_time)
+
+    def get(self, token_id):
+        return copy.deepcopy(self._cache.get(token_id))
+
+    def get_multi(self, token_ids):
+        token_refs = {}
+        for token_id in token_ids:
+            token_ref = self.get(token_id)
+            if token_ref is not None:
+                token_refs[token_id] = token_ref
+        return token_refs
+
+    def set(self, token_id, token_ref):
+        self._cache.set(token_id, copy.deepcopy(token_ref))
+
+    def delete(self, token_id):
+        self._cache.delete(token_id)
+
+
+class MemcacheTier(object):
+    """Caches tokens in the memcache servers of the ``[memcache]`` section."""
+
+    def __init__(self, client=None):
+        self.client = client or memcache_pool.ConsistentHashClient(
+            CONF.memcache.servers.split(','),
+            replicas=CONF.memcache.replicas,
+            dead_retry=CONF.memcache.dead_retry,
+            pool_size=CONF.memcache.pool_size)
+
+    def _prefix_token_id(self, token_id):
+        return 'tieredtoken-%s' % token_id.encode('utf-8')
+
+    def get(self, token_id):
+        return self.client.get(self._prefix_token_id(token_id))
+
+    def get_multi(self, token_ids):
+        prefixed_ids = dict((self._prefix_token_id(token_id), token_id)
+                            for token_id in token_ids)
+        token_refs = self.client.get_multi(prefixed_ids.keys())
+        return dict((prefixed_ids[ptk], token_ref)
+                    for ptk, token_ref in token_refs.iteritems())
+
+    def set(self, token_id, token_ref):
+        self.client.set(self._prefix_token_id(token_id), token_ref,
+                        time=utils.unixtime(token_ref['expires']))
+
+    def delete(self, token_id):
+        self.client.delete(self._prefix_token_id(token_id))
+
+
+TIERS = {'memory': MemoryTier, 'memcache': MemcacheTier}
+
+
+class Token(token.Driver):
+    def __init__(self, driver=None, tier=None):
+        self.driver = driver or importutils.import_object(
+            CONF.token.persistent_driver)
+        if tier is None:
+            try:
+                tier = TIERS[CONF.token.tier_cache]()
+            except KeyError:
+                raise exception.UnexpectedError(
+                    _('Unknown token tier cache: %s') % CONF.token.tier_cache)
+        self.tier = tier
+
+    def _is_live(self, token_ref):
+        expires = token_ref.get('expires')
+        return expires is not None and (timeutils.normalize_time(expires) >
+                                        timeutils.utcnow())
+
+    # Public interface
+    def get_token(self, token_id):
+        if token_id is None:
+            raise exception.TokenNotFound(token_id=token_id)
+        token_ref = self.tier.get(token_id)
+        if token_ref is None:
+            revision = self.driver.get_revocation_revision()
+            token_ref = self.driver.get_token(token_id)
+            self._fill({token_id: token_ref}, revision)
+        elif not self._is_live(token_ref):
+            raise exception.TokenNotFound(token_id=token_id)
+        return token_ref
+
+    def get_tokens(self, token_ids):
+        token_ids = [token_id for token_id in token_ids if token_id]
+        if not token_ids:
+            return {}
+        token_refs = dict((token_id, token_ref) for token_id, token_ref
+                          in self.tier.get_multi(token_ids).iteritems()
+                          if self._is_live(token_ref))
+        missing = [token_id for token_id in token_ids
+                   if token_id not in token_refs]
+        if missing:
+            revision = self.driver.get_revocation_revision()
+            missing_refs = self.driver.get_tokens(missing)
+            self._fill(missing_refs, revision)
+            token_refs.update(missing_refs)
+        return token_refs
+
+    def create_token(self, token_id, data):
+        token_ref = self.driver.create_token(token_id, data)
+        if self._is_live(token_ref):
+            self.tier.set(token_id, token_ref)
+        return token_ref
+
+    def delete_token(self, token_id):
+        # Evicting first would let a concurrent get_token cache the token
+        # again from the driver before it is revoked there. The token is
+        # evicted even when the driver no longer finds it, as another process
+        # may have revoked it in the meantime.
+        try:
+            return self.driver.delete_token(token_id)
+        finally:
+            self.tier.delete(token_id)
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None):
+        return self._revoke(lambda: self.driver.delete_tokens(
+            user_id, tenant_id=tenant_id, trust_id=trust_id))
+
+    def delete_tokens_for_trusts(self, trusts):
+        return self._revoke(
+            lambda: self.driver.delete_tokens_for_trusts(trusts))
+
+    def _fill(self, token_refs, revision):
+        """Cache token_refs, read from the driver at the given revision.
+
+        A token revoked since then may already have been evicted by the
+        revoking process, so the entries are dropped again if the revision
+        moved. Checking once they are cached leaves no window for a
+        revocation to slip in between.
+
+        """
+        for token_id, token_ref in token_refs.iteritems():
+            self.tier.set(token_id, token_ref)
+        if token_refs and self.driver.get_revocation_revision() != revision:
+            for token_id in token_refs:
+                self.tier.delete(token_id)
+
+    def _revoke(self, revoke):
+        """Call revoke, then evict every token the driver revoked meanwhile.
+
+        The revocation events cover the tokens issued, and cached, after
+        they could have been listed.
+
+        """
+        revision = self.driver.get_revocation_revision()
+        count = revoke()
+        for event in self.driver.list_revocation_events(revision):
+            self.tier.delete(event['id'])
+        return count
+
+    def list_tokens(self, user_id, tenant_id=None, trust_id=None):
+        return self.driver.list_tokens(user_id, tenant_id=tenant_id,
+                                       trust_id=trust_id)
+
+    def list_revoked_tokens(self):
+        return self.driver.list_revoked_tokens()
+
+    def get_revocation_revision(self):
+        return self.driver.get_revocation_revision()
+
+    def list_revocation_events(self, since, revoked_after=None):
+        return self.driver.list_revocation_events(
+            since, revoked_after=revoked_after)
+
+    def flush_expired_tokens(self, limit=None):
+        # expired tokens are never served from the cache
+        return self.driver.flush_expired_tokens(limit=limit)
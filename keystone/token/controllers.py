@@ -1,3 +1,5 @@
+import datetime
+import hashlib
 import json
 
 from keystone.common import cms
@@ -426,6 +428,42 @@ class Auth(controller.V2Controller):
             token_id, belongs_to=belongs_to,
             version=token_provider.V2)
 
+    @controller.protected
+    def validate_tokens(self, context, tokens=None):
+        """Check that each token in a batch is valid.
+
+        Accepts a list of token IDs as ``{"tokens": [$token_id, ...]}``.
+        Optionally, also ensures that each token is owned by a specific
+        tenant.
+
+        Returns, in request order, the same metadata as ``validate_token``
+        for each valid token, and ``"valid": false`` for the others.
+
+        """
+        belongs_to = context['query_string'].get('belongsTo')
+        return self.validate_token_batch(tokens, belongs_to=belongs_to,
+                                         version=token_provider.V2)
+
+    def validate_token_batch(self, tokens, belongs_to=None,
+                             version=token_provider.V3):
+        """Validate a list of token IDs with a single backend lookup."""
+        if (not isinstance(tokens, list) or
+                not all(isinstance(t, basestring) for t in tokens)):
+            raise exception.ValidationError(attribute='a list of token IDs',
+                                            target='tokens')
+        token_data = self.token_provider_api.validate_tokens(
+            tokens, belongs_to=belongs_to, version=version)
+
+        results = []
+        for token_id in tokens:
+            if token_id in token_data:
+                result = token_data[token_id]
+                result.update(id=token_id, valid=True)
+            else:
+                result = {'id': token_id, 'valid': False}
+            results.append(result)
+        return {'tokens': results}
+
     def delete_token(self, context, token_id):
         """Delete a token, effectively invalidating it for authz."""
         # TODO(termie): this stuff should probably be moved to middleware
@@ -434,19 +472,89 @@ class Auth(controller.V2Controller):
 
     @controller.protected
     def revocation_list(self, context, auth=None):
-        tokens = self.token_api.list_revoked_tokens()
+        """Return the signed list of revoked tokens.
+
+        The response carries the ``revision`` of the list. Passing it back as
+        ``since`` returns only the tokens revoked after that revision, along
+        with ``since`` itself, and the ones revoked in the last ``[token]
+        revocation_resend_window`` seconds. The complete list is returned
+        instead if the backend is behind the requested revision, e.g. after
+        it was reset.
+
+        Signed lists are cached by revision, so that only the revision is
+        read while no token is revoked. The complete list is served with an
+        ETag identifying the revoked tokens, so a matching ``If-None-Match``
+        gets a 304.
 
-        for t in tokens:
+        """
+        since = context['query_string'].get('since')
+        if since is not None:
+            try:
+                since = int(since)
+                if since < 0:
+                    raise ValueError(since)
+            except ValueError:
+                raise exception.ValidationError(
+                    attribute='a revocation list revision', target='since')
+        revision = self.token_api.get_revocation_revision()
+
+        if since is not None and revision >= since:
+            key = (since, revision)
+            signed_text = self.token_api.get_signed_revocation_list(key)
+            if signed_text is None:
+                signed_text = self._sign_revocation_list(
+                    self._revocation_list_since(since))
+                self.token_api.set_signed_revocation_list(key, signed_text)
+            return {'signed': signed_text}
+
+        cached = self.token_api.get_signed_revocation_list(revision)
+        if cached is None:
+            # The revision alone does not identify the list, as a revocation
+            # may be stored after a later revision was allocated.
+            revoked = self.token_api.list_revoked_tokens()
+            digest = hashlib.sha1(str(revision))
+            for token_id in sorted(t['id'] for t in revoked):
+                digest.update(' %s' % token_id)
+            etag = '"%s"' % digest.hexdigest()
+            if self._etag_matches(context, etag):
+                return self._not_modified(etag)
+            data = {'revoked': revoked, 'revision': revision}
+            cached = (etag, self._sign_revocation_list(data))
+            self.token_api.set_signed_revocation_list(revision, cached)
+
+        etag, signed_text = cached
+        if self._etag_matches(context, etag):
+            return self._not_modified(etag)
+        return wsgi.render_response(body={'signed': signed_text},
+                                    headers=[('ETag', etag)])
+
+    def _etag_matches(self, context, etag):
+        if_none_match = context['headers'].get('If-None-Match', '')
+        return etag in [tag.strip() for tag in if_none_match.split(',')]
+
+    def _not_modified(self, etag):
+        return wsgi.render_response(status=(304, 'Not Modified'),
+                                    headers=[('ETag', etag)])
+
+    def _sign_revocation_list(self, data):
+        for t in data['revoked']:
             expires = t['expires']
             if not (expires and isinstance(expires, unicode)):
                     t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
         json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
-
-        return {'signed': signed_text}
+        return cms.cms_sign_text(json_data,
+                                 CONF.signing.certfile,
+                                 CONF.signing.keyfile)
+
+    def _revocation_list_since(self, since):
+        revoked_after = timeutils.utcnow() - datetime.timedelta(
+            seconds=CONF.token.revocation_resend_window)
+        events = self.token_api.list_revocation_events(
+            since, revoked_after=revoked_after)
+        revision = max([since] + [event['revision'] for event in events])
+        tokens = [{'id': event['id'], 'expires': event['expires']}
+                  for event in events]
+        return {'revoked': tokens, 'revision': revision, 'since': since}
 
     def endpoints(self, context, token_id):
         """Return a list of endpoints available to the token."""
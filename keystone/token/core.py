@@ -19,6 +19,7 @@
 import copy
 import datetime
 
+from keystone.common import cache
 from keystone.common import cms
 from keystone.common import dependency
 from keystone.common import logging
@@ -26,6 +27,7 @@ from keystone.common import manager
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
+from keystone.token import provider
 
 
 CONF = config.CONF
@@ -98,9 +100,16 @@ class Manager(manager.Manager):
     dynamically calls the backend.
 
     """
+    # number of signed revocation lists kept, complete or since a revision
+    revocation_list_cache_size = 64
 
     def __init__(self):
         super(Manager, self).__init__(CONF.token.driver)
+        self.validation_cache = cache.LRUCache(CONF.token.cache_size,
+                                               ttl=CONF.token.cache_time)
+        # (cached_at, value) of the signed revocation lists by key
+        self._signed_revocation_lists = cache.LRUCache(
+            self.revocation_list_cache_size)
 
     def _unique_id(self, token_id):
         """Return a unique ID for a token.
@@ -117,13 +126,110 @@ class Manager(manager.Manager):
     def get_token(self, token_id):
         return self.driver.get_token(self._unique_id(token_id))
 
+    def get_tokens(self, token_ids):
+        unique_ids = dict((self._unique_id(token_id), token_id)
+                          for token_id in token_ids)
+        token_refs = self.driver.get_tokens(unique_ids.keys())
+        return dict((unique_ids[unique_id], token_ref)
+                    for unique_id, token_ref in token_refs.iteritems())
+
     def create_token(self, token_id, data):
         data_copy = copy.deepcopy(data)
         data_copy['id'] = self._unique_id(token_id)
         return self.driver.create_token(self._unique_id(token_id), data_copy)
 
     def delete_token(self, token_id):
-        return self.driver.delete_token(self._unique_id(token_id))
+        unique_id = self._unique_id(token_id)
+        try:
+            return self.driver.delete_token(unique_id)
+        finally:
+            self._invalidate_validated_token(unique_id)
+            self._signed_revocation_lists.clear()
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None):
+        try:
+            return self.driver.delete_tokens(user_id,
+                                             tenant_id=tenant_id,
+                                             trust_id=trust_id)
+        finally:
+            # The validation cache is not indexed by user, tenant or trust,
+            # so there is no cheap way to find only the affected entries.
+            self.validation_cache.clear()
+            self._signed_revocation_lists.clear()
+
+    def delete_tokens_for_trusts(self, trusts):
+        try:
+            return self.driver.delete_tokens_for_trusts(trusts)
+        finally:
+            self.validation_cache.clear()
+            self._signed_revocation_lists.clear()
+
+    def flush_expired_tokens(self, limit=None):
+        try:
+            return self.driver.flush_expired_tokens(limit=limit)
+        finally:
+            self._signed_revocation_lists.clear()
+
+    def get_validated_token(self, token_id, version):
+        """Return cached validation results for a token, if any.
+
+        Results are cached by the token provider (see ``[token] cache_size``
+        and ``[token] cache_time``) and evicted when the token is deleted.
+
+        :returns: a (tenant_id, token_data) tuple, or None if the token has
+                  not been validated recently or has since expired. The
+                  token data is shared with the cache and must be copied
+                  before it is modified.
+
+        """
+        key = (self._unique_id(token_id), version)
+        entry = self.validation_cache.get(key)
+        if entry is None:
+            return None
+        expires, tenant_id, token_data = entry
+        if expires is None or timeutils.utcnow() >= expires:
+            self.validation_cache.delete(key)
+            return None
+        return tenant_id, token_data
+
+    def set_validated_token(self, token_id, version, token_ref, token_data):
+        """Cache the validation results of a token for ``version``."""
+        if self.validation_cache.max_size <= 0:
+            return
+        tenant_id = None
+        if token_ref.get('tenant'):
+            tenant_id = token_ref['tenant'].get('id')
+        entry = (token_ref.get('expires'), tenant_id,
+                 copy.deepcopy(token_data))
+        self.validation_cache.set((self._unique_id(token_id), version), entry)
+
+    def get_signed_revocation_list(self, key):
+        """Return the signed revocation list cached under ``key``, if any.
+
+        Lists are cached until a token is revoked or flushed through this
+        manager. Revocations made by other processes are noticed through the
+        key, which includes the revocation revision. As a revocation may be
+        stored after a later revision was allocated, lists are also dropped
+        after ``[token] revocation_resend_window`` seconds.
+
+        """
+        entry = self._signed_revocation_lists.get(key)
+        if entry is None:
+            return None
+        cached_at, value = entry
+        if timeutils.is_older_than(cached_at,
+                                   CONF.token.revocation_resend_window):
+            self._signed_revocation_lists.delete(key)
+            return None
+        return value
+
+    def set_signed_revocation_list(self, key, value):
+        """Cache the signed revocation list under ``key``."""
+        self._signed_revocation_lists.set(key, (timeutils.utcnow(), value))
+
+    def _invalidate_validated_token(self, unique_id):
+        for version in (provider.V2, provider.V3):
+            self.validation_cache.delete((unique_id, version))
 
 
 class Driver(object):
@@ -140,6 +246,19 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_tokens(self, token_ids):
+        """Get several tokens by id in a single lookup.
+
+        Tokens which do not exist, have been revoked or have expired are
+        omitted from the result.
+
+        :param token_ids: identities of the tokens
+        :type token_ids: list
+        :returns: dict of token_ref keyed by token_id
+
+        """
+        raise exception.NotImplemented()
+
     def create_token(self, token_id, data):
         """Create a token by id and data.
 
@@ -187,18 +306,35 @@ class Driver(object):
         :type tenant_id: string
         :param trust_id: identified of the trust
         :type trust_id: string
-        :returns: None.
+        :returns: number of tokens deleted
         :raises: keystone.exception.TokenNotFound
 
         """
         token_list = self.list_tokens(user_id,
                                       tenant_id=tenant_id,
                                       trust_id=trust_id)
+        count = 0
         for token in token_list:
             try:
                 self.delete_token(token)
             except exception.NotFound:
-                pass
+                continue
+            count += 1
+        return count
+
+    def delete_tokens_for_trusts(self, trusts):
+        """Deletes the tokens issued from any of the given trusts.
+
+        The default implementation calls delete_tokens for each trust.
+
+        :param trusts: trust references, with their id and trustee_user_id
+        :type trusts: list of dict
+        :returns: number of tokens deleted
+
+        """
+        return sum(self.delete_tokens(trust['trustee_user_id'],
+                                      trust_id=trust['id'])
+                   for trust in trusts)
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None):
         """Returns a list of current token_id's for a user
@@ -222,7 +358,42 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def flush_expired_tokens(self):
+    def get_revocation_revision(self):
+        """Returns the current revision of the revocation list.
+
+        The revision increases every time a token is revoked.
+
+        :returns: integer revision, 0 if no token was ever revoked
+
+        """
+        raise exception.NotImplemented()
+
+    def list_revocation_events(self, since, revoked_after=None):
+        """Returns the tokens revoked after a given revision.
+
+        Revisions are allocated before a revocation is stored, so a
+        revocation may only show up after a later revision was returned;
+        ``revoked_after`` also lists the recent revocations, whatever their
+        revision. Revocations of tokens which have since expired are omitted.
+
+        :param since: revision returned by a previous call
+        :type since: int
+        :param revoked_after: time from which revocations are listed even
+                              if their revision is not after ``since``
+        :type revoked_after: datetime
+        :returns: list of dicts with the id and expires of each token and
+                  the revision at which it was revoked, in revision order
+
+        """
+        raise exception.NotImplemented()
+
+    def flush_expired_tokens(self, limit=None):
         """Archive or delete tokens that have expired.
+
+        :param limit: maximum number of expired records to remove, or None
+                      to remove all of them at once
+        :type limit: int
+        :returns: number of records removed
+
         """
         raise exception.NotImplemented()
@@ -34,6 +34,7 @@ V3 = 'v3.0'
 
 # default token providers
 PKI_PROVIDER = 'keystone.token.providers.pki.Provider'
+PKIZ_PROVIDER = 'keystone.token.providers.pkiz.Provider'
 UUID_PROVIDER = 'keystone.token.providers.uuid.Provider'
 
 
@@ -70,6 +71,8 @@ class Manager(manager.Manager):
             # CONF.signing.token_format.
             if ((CONF.signing.token_format == 'PKI' and
                     CONF.token.provider != PKI_PROVIDER or
+                    (CONF.signing.token_format == 'PKIZ' and
+                        CONF.token.provider != PKIZ_PROVIDER) or
                     (CONF.signing.token_format == 'UUID' and
                         CONF.token.provider != UUID_PROVIDER))):
                 raise exception.UnexpectedError(
@@ -82,13 +85,16 @@ class Manager(manager.Manager):
             if CONF.signing.token_format == 'PKI':
                 LOG.warning(msg)
                 return PKI_PROVIDER
+            elif CONF.signing.token_format == 'PKIZ':
+                LOG.warning(msg)
+                return PKIZ_PROVIDER
             elif CONF.signing.token_format == 'UUID':
                 LOG.warning(msg)
                 return UUID_PROVIDER
             else:
                 raise exception.UnexpectedError(
                     _('Unrecognized keystone.conf [signing] token_format: '
-                      'expected either \'UUID\' or \'PKI\''))
+                      'expected \'UUID\', \'PKI\' or \'PKIZ\''))
 
     def __init__(self):
         super(Manager, self).__init__(self.get_token_provider())
@@ -156,6 +162,23 @@ class Provider(object):
         """
         raise exception.NotImplemented()
 
+    def validate_tokens(self, token_ids, belongs_to=None, version='v3.0'):
+        """Validate a batch of tokens and return the data of the valid ones.
+
+        Tokens which are unknown, revoked, expired or otherwise fail
+        validation are left out of the result rather than raising.
+
+        :param token_ids: identities of the tokens
+        :type token_ids: list
+        :param belongs_to: identity of the scoped project to validate
+        :type belongs_to: string
+        :param version: version of the tokens to be validated
+        :type version: string
+        :returns: dict of token data keyed by token_id
+
+        """
+        raise exception.NotImplemented()
+
     def check_token(self, token_id, belongs_to=None, version='v3.0'):
         """Check the validity of the given V3 token.
 
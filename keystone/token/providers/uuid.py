@@ -18,6 +18,7 @@
 
 from __future__ import absolute_import
 
+import copy
 import sys
 import uuid
 
@@ -436,6 +437,16 @@ class Provider(token.provider.Provider):
             return self._issue_v2_token(**kwargs)
         raise token.provider.UnsupportedTokenVersionException
 
+    def _get_cached_token_data(self, token_id, version, belongs_to=None):
+        """Return previously validated token data, or None on a miss."""
+        cached = self.token_api.get_validated_token(token_id, version)
+        if cached is None:
+            return None
+        tenant_id, token_data = cached
+        if belongs_to:
+            assert tenant_id == belongs_to
+        return token_data
+
     def _verify_token(self, token_id, belongs_to=None):
         """Verify the given token and return the token_ref."""
         token_ref = self.token_api.get_token(token_id=token_id)
@@ -489,47 +500,45 @@ class Provider(token.provider.Provider):
                 if project_ref['domain_id'] != DEFAULT_DOMAIN_ID:
                     raise exception.Unauthorized(msg)
 
-    def _validate_v2_token(self, token_id, belongs_to=None, **kwargs):
-        try:
-            token_ref = self._verify_token(token_id, belongs_to=belongs_to)
-            self._assert_default_domain(token_ref)
-            # FIXME(gyee): performance or correctness? Should we return the
-            # cached token or reconstruct it? Obviously if we are going with
-            # the cached token, any role, project, or domain name changes
-            # will not be reflected. One may argue that with PKI tokens,
-            # we are essentially doing cached token validation anyway.
-            # Lets go with the cached token strategy. Since token
-            # management layer is now pluggable, one can always provide
-            # their own implementation to suit their needs.
-            token_data = token_ref.get('token_data')
-            if (not token_data or
-                    self.get_token_version(token_data) !=
-                    token.provider.V2):
-                # token is created by old v2 logic
-                metadata_ref = token_ref['metadata']
-                role_refs = []
-                for role_id in metadata_ref.get('roles', []):
-                    role_refs.append(self.identity_api.get_role(role_id))
-
-                # Get a service catalog if possible
-                # This is needed for on-behalf-of requests
-                catalog_ref = None
-                if token_ref.get('tenant'):
-                    catalog_ref = self.catalog_api.get_catalog(
-                        token_ref['user']['id'],
-                        token_ref['tenant']['id'],
-                        metadata=metadata_ref)
-                token_data = self.v2_token_data_helper.get_token_data(
-                    token_ref=token_ref,
-                    roles_ref=role_refs,
-                    catalog_ref=catalog_ref)
-            return token_data
-        except AssertionError as e:
-            LOG.exception(_('Failed to validate token'))
-            raise exception.Unauthorized(e)
+    def _render_v2_token_data(self, token_id, token_ref):
+        """Build (and cache) V2 token data for a verified token_ref."""
+        self._assert_default_domain(token_ref)
+        # FIXME(gyee): performance or correctness? Should we return the
+        # cached token or reconstruct it? Obviously if we are going with
+        # the cached token, any role, project, or domain name changes
+        # will not be reflected. One may argue that with PKI tokens,
+        # we are essentially doing cached token validation anyway.
+        # Lets go with the cached token strategy. Since token
+        # management layer is now pluggable, one can always provide
+        # their own implementation to suit their needs.
+        token_data = token_ref.get('token_data')
+        if (not token_data or
+                self.get_token_version(token_data) !=
+                token.provider.V2):
+            # token is created by old v2 logic
+            metadata_ref = token_ref['metadata']
+            role_refs = []
+            for role_id in metadata_ref.get('roles', []):
+                role_refs.append(self.identity_api.get_role(role_id))
+
+            # Get a service catalog if possible
+            # This is needed for on-behalf-of requests
+            catalog_ref = None
+            if token_ref.get('tenant'):
+                catalog_ref = self.catalog_api.get_catalog(
+                    token_ref['user']['id'],
+                    token_ref['tenant']['id'],
+                    metadata=metadata_ref)
+            token_data = self.v2_token_data_helper.get_token_data(
+                token_ref=token_ref,
+                roles_ref=role_refs,
+                catalog_ref=catalog_ref)
+        self.token_api.set_validated_token(
+            token_id, token.provider.V2, token_ref, token_data)
+        return token_data
 
-    def _validate_v3_token(self, token_id):
-        token_ref = self._verify_token(token_id)
+    def _render_v3_token_data(self, token_id, token_ref):
+        """Build (and cache) V3 token data for a verified token_ref."""
         # FIXME(gyee): performance or correctness? Should we return the
         # cached token or reconstruct it? Obviously if we are going with
         # the cached token, any role, project, or domain name changes
@@ -552,8 +561,31 @@ class Provider(token.provider.Provider):
                 project_id=project_id,
                 bind=token_ref.get('bind'),
                 expires=token_ref['expires'])
+        self.token_api.set_validated_token(
+            token_id, token.provider.V3, token_ref, token_data)
         return token_data
 
+    def _validate_v2_token(self, token_id, belongs_to=None, **kwargs):
+        try:
+            token_data = self._get_cached_token_data(
+                token_id, token.provider.V2, belongs_to=belongs_to)
+            if token_data is not None:
+                return copy.deepcopy(token_data)
+
+            token_ref = self._verify_token(token_id, belongs_to=belongs_to)
+            return self._render_v2_token_data(token_id, token_ref)
+        except AssertionError as e:
+            LOG.exception(_('Failed to validate token'))
+            raise exception.Unauthorized(e)
+
+    def _validate_v3_token(self, token_id):
+        token_data = self._get_cached_token_data(token_id, token.provider.V3)
+        if token_data is not None:
+            return copy.deepcopy(token_data)
+
+        token_ref = self._verify_token(token_id)
+        return self._render_v3_token_data(token_id, token_ref)
+
     def validate_token(self, token_id, belongs_to=None, version='v3.0'):
         try:
             if version == token.provider.V3:
@@ -566,9 +598,45 @@ class Provider(token.provider.Provider):
             LOG.exception(_('Failed to verify token'))
             raise exception.Unauthorized(e)
 
+    def validate_tokens(self, token_ids, belongs_to=None, version='v3.0'):
+        if version == token.provider.V3:
+            render = self._render_v3_token_data
+        elif version == token.provider.V2:
+            render = self._render_v2_token_data
+        else:
+            raise token.provider.UnsupportedTokenVersionException()
+
+        results = {}
+        uncached = []
+        for token_id in token_ids:
+            try:
+                token_data = self._get_cached_token_data(
+                    token_id, version, belongs_to=belongs_to)
+            except AssertionError:
+                continue
+            if token_data is None:
+                uncached.append(token_id)
+            else:
+                results[token_id] = copy.deepcopy(token_data)
+
+        # fetch every token which was not already cached in a single lookup
+        token_refs = self.token_api.get_tokens(uncached) if uncached else {}
+        for token_id, token_ref in token_refs.iteritems():
+            if belongs_to and not (token_ref.get('tenant') and
+                                   token_ref['tenant']['id'] == belongs_to):
+                continue
+            try:
+                results[token_id] = render(token_id, token_ref)
+            except exception.Error as e:
+                LOG.debug(_('Failed to validate token: %s'), e)
+        return results
+
     def check_token(self, token_id, belongs_to=None,
                     version='v3.0', **kwargs):
         try:
+            if self._get_cached_token_data(
+                    token_id, version, belongs_to=belongs_to) is not None:
+                return
             token_ref = self._verify_token(token_id, belongs_to=belongs_to)
             if version == token.provider.V2:
                 self._assert_default_domain(token_ref)
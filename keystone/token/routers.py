@@ -28,6 +28,10 @@ class Router(wsgi.ComposableRouter):
                        controller=token_controller,
                        action='revocation_list',
                        conditions=dict(method=['GET']))
+        mapper.connect('/tokens/validate',
+                       controller=token_controller,
+                       action='validate_tokens',
+                       conditions=dict(method=['POST']))
         mapper.connect('/tokens/{token_id}',
                        controller=token_controller,
                        action='validate_token',
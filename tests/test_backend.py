@@ -20,6 +20,8 @@ import uuid
 from keystone import test
 
 from keystone.catalog import core
+from keystone.common import controller
+from keystone.common import driver_hints
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
@@ -494,6 +496,64 @@ class IdentityTests(object):
              'role_id': 'admin'},
             assignment_list)
 
+    def test_list_role_assignments_filtered_and_paginated(self):
+        new_domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.identity_api.create_domain(new_domain['id'], new_domain)
+        new_user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                    'password': uuid.uuid4().hex, 'enabled': True,
+                    'domain_id': new_domain['id']}
+        self.identity_api.create_user(new_user['id'], new_user)
+        new_project = {'id': uuid.uuid4().hex,
+                       'name': uuid.uuid4().hex,
+                       'domain_id': new_domain['id']}
+        self.identity_api.create_project(new_project['id'], new_project)
+
+        self.identity_api.create_grant(user_id=new_user['id'],
+                                       domain_id=new_domain['id'],
+                                       role_id='member')
+        self.identity_api.create_grant(user_id=new_user['id'],
+                                       domain_id=new_domain['id'],
+                                       role_id='admin',
+                                       inherited_to_projects=True)
+        for role_id in ['admin', 'member', 'other']:
+            self.identity_api.create_grant(user_id=new_user['id'],
+                                           project_id=new_project['id'],
+                                           role_id=role_id)
+
+        assignment_list = self.identity_api.list_role_assignments(
+            user_id=new_user['id'])
+        self.assertEquals(len(assignment_list), 5)
+
+        assignment_list = self.identity_api.list_role_assignments(
+            user_id=new_user['id'], project_id=new_project['id'],
+            role_id='member')
+        self.assertEquals(
+            assignment_list,
+            [{'user_id': new_user['id'], 'project_id': new_project['id'],
+              'role_id': 'member'}])
+
+        assignment_list = self.identity_api.list_role_assignments(
+            domain_id=new_domain['id'], inherited_to_projects=True)
+        self.assertEquals(
+            assignment_list,
+            [{'user_id': new_user['id'], 'domain_id': new_domain['id'],
+              'role_id': 'admin', 'inherited_to_projects': True}])
+
+        # page through the project assignments, sorted by role
+        marker = None
+        role_ids = []
+        while True:
+            page = self.identity_api.list_role_assignments(
+                project_id=new_project['id'], marker=marker, limit=2)
+            if not page:
+                break
+            self.assertTrue(len(page) <= 2)
+            role_ids.extend(x['role_id'] for x in page)
+            last = page[-1]
+            marker = ('UserProject', last['user_id'], last['project_id'],
+                      last['role_id'], False)
+        self.assertEquals(role_ids, ['admin', 'member', 'other'])
+
     def test_add_duplicate_role_grant(self):
         roles_ref = self.identity_api.get_roles_for_user_and_project(
             self.user_foo['id'], self.tenant_bar['id'])
@@ -1800,6 +1860,62 @@ class IdentityTests(object):
         for test_role in default_fixtures.ROLES:
             self.assertTrue(x for x in roles if x['id'] == test_role['id'])
 
+    def _assert_paginated(self, list_entities):
+        """Page through a listing two entities at a time."""
+        entity_ids = sorted(x['id'] for x in list_entities())
+        paged_ids = []
+        marker = None
+        while True:
+            page = list_entities(marker=marker, limit=2)
+            if not page:
+                break
+            self.assertTrue(len(page) <= 2)
+            paged_ids.extend(x['id'] for x in page)
+            marker = page[-1]['id']
+        self.assertEquals(paged_ids, entity_ids)
+        self.assertEquals(list_entities(limit=0), [])
+
+    def test_list_paginated(self):
+        for i in range(3):
+            group = {'id': uuid.uuid4().hex,
+                     'domain_id': CONF.identity.default_domain_id,
+                     'name': uuid.uuid4().hex}
+            self.identity_api.create_group(group['id'], group)
+        self._assert_paginated(self.identity_api.list_users)
+        self._assert_paginated(self.identity_api.list_groups)
+        self._assert_paginated(self.identity_api.list_projects)
+        self._assert_paginated(self.identity_api.list_roles)
+
+    def test_list_users_with_hints(self):
+        domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.identity_api.create_domain(domain['id'], domain)
+        user_ids = []
+        for i in range(3):
+            user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                    'domain_id': domain['id'], 'enabled': i != 0,
+                    'email': 'user%s@example.com' % i}
+            self.identity_api.create_user(user['id'], user)
+            user_ids.append(user['id'])
+
+        def list_users(**filters):
+            hints = driver_hints.Hints()
+            for name, value in filters.iteritems():
+                hints.add_filter(name, value)
+            users = self.identity_api.list_users(hints=hints)
+            # the filters left by the driver are applied by the caller
+            context = {'query_string': filters}
+            for name in hints.filter_names():
+                users = controller.V3Controller.filter_by_attribute(
+                    context, users, name)
+            return sorted(x['id'] for x in users)
+
+        self.assertEquals(list_users(domain_id=domain['id']),
+                          sorted(user_ids))
+        self.assertEquals(list_users(domain_id=domain['id'], enabled='0'),
+                          [user_ids[0]])
+        self.assertEquals(list_users(email='user2@example.com'),
+                          [user_ids[2]])
+
     def test_delete_project_with_role_assignments(self):
         tenant = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
                   'domain_id': DEFAULT_DOMAIN_ID}
@@ -2259,8 +2375,9 @@ class TokenTests(object):
         self.assertEquals(len(tokens), 2)
         self.assertIn(token_id2, tokens)
         self.assertIn(token_id1, tokens)
-        self.token_api.delete_tokens(user_id='testuserid',
-                                     tenant_id='testtenantid')
+        count = self.token_api.delete_tokens(user_id='testuserid',
+                                             tenant_id='testtenantid')
+        self.assertEqual(count, 2)
         tokens = self.token_api.list_tokens('testuserid')
         self.assertEquals(len(tokens), 0)
         self.assertRaises(exception.TokenNotFound,
@@ -2288,6 +2405,23 @@ class TokenTests(object):
                           self.token_api.get_token, token_id1)
         self.token_api.get_token(token_id2)
 
+    def test_delete_tokens_for_trusts(self):
+        token_id1 = self.create_token_sample_data(trust_id='testtrustid')
+        token_id2 = self.create_token_sample_data(user_id='testuserid1',
+                                                  trust_id='testtrustid1')
+        token_id3 = self.create_token_sample_data(trust_id='testtrustid2')
+        token_id4 = self.create_token_sample_data()
+        trusts = [{'id': 'testtrustid', 'trustee_user_id': 'testuserid'},
+                  {'id': 'testtrustid1', 'trustee_user_id': 'testuserid1'}]
+        self.assertEqual(self.token_api.delete_tokens_for_trusts(trusts), 2)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id1)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id2)
+        self.token_api.get_token(token_id3)
+        self.token_api.get_token(token_id4)
+        self.assertEqual(self.token_api.delete_tokens_for_trusts(trusts), 0)
+
     def test_token_list(self):
         tokens = self.token_api.list_tokens('testuserid')
         self.assertEquals(len(tokens), 0)
@@ -2337,6 +2471,20 @@ class TokenTests(object):
         self.assertEquals(len(tokens), 1)
         self.assertIn(token_id5, tokens)
 
+    def test_get_tokens(self):
+        token_id1 = self.create_token_sample_data()
+        token_id2 = self.create_token_sample_data()
+        token_id3 = self.create_token_sample_data()
+        self.token_api.delete_token(token_id3)
+        missing_token_id = uuid.uuid4().hex
+
+        token_refs = self.token_api.get_tokens(
+            [token_id1, token_id2, token_id3, missing_token_id])
+        self.assertEqual(set(token_refs.keys()), set([token_id1, token_id2]))
+        self.assertEqual(token_refs[token_id1],
+                         self.token_api.get_token(token_id1))
+        self.assertEqual(self.token_api.get_tokens([]), {})
+
     def test_get_token_404(self):
         self.assertRaises(exception.TokenNotFound,
                           self.token_api.get_token,
@@ -2410,6 +2558,42 @@ class TokenTests(object):
         self.check_list_revoked_tokens([self.delete_token()
                                         for x in xrange(2)])
 
+    def test_revocation_revision_increases(self):
+        self.assertEqual(self.token_api.get_revocation_revision(), 0)
+        self.delete_token()
+        first_revision = self.token_api.get_revocation_revision()
+        self.delete_token()
+        self.assertTrue(
+            self.token_api.get_revocation_revision() > first_revision)
+
+    def test_list_revocation_events_since(self):
+        first_token_id = self.delete_token()
+        events = self.token_api.list_revocation_events(0)
+        self.assertEqual([x['id'] for x in events], [first_token_id])
+        revision = events[0]['revision']
+        self.assertEqual(revision, self.token_api.get_revocation_revision())
+        self.assertEqual(self.token_api.list_revocation_events(revision), [])
+
+        token_ids = [self.delete_token() for x in xrange(2)]
+        events = self.token_api.list_revocation_events(revision)
+        self.assertEqual([x['id'] for x in events], token_ids)
+        self.assertTrue(events[0]['revision'] > revision)
+        self.assertTrue(events[1]['revision'] > events[0]['revision'])
+
+    def test_list_revocation_events_revoked_after(self):
+        token_id = self.delete_token()
+        revision = self.token_api.get_revocation_revision()
+        self.assertEqual(self.token_api.list_revocation_events(revision), [])
+
+        revoked_after = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        events = self.token_api.list_revocation_events(
+            revision, revoked_after=revoked_after)
+        self.assertEqual([x['id'] for x in events], [token_id])
+
+        revoked_after = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.assertEqual(self.token_api.list_revocation_events(
+            revision, revoked_after=revoked_after), [])
+
     def test_flush_expired_token(self):
         token_id = uuid.uuid4().hex
         expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
@@ -2436,6 +2620,22 @@ class TokenTests(object):
         self.assertEqual(len(tokens), 1)
         self.assertIn(token_id, tokens)
 
+    def test_flush_expired_tokens_in_batches(self):
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        for i in range(3):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id, {
+                'id': token_id, 'expires': expire_time,
+                'user': {'id': 'testuserid'}})
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(token_id, {
+            'id': token_id, 'user': {'id': 'testuserid'}})
+
+        self.assertEqual(self.token_api.flush_expired_tokens(limit=2), 2)
+        self.assertEqual(self.token_api.flush_expired_tokens(limit=2), 1)
+        self.assertEqual(self.token_api.flush_expired_tokens(limit=2), 0)
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [token_id])
+
 
 class TrustTests(object):
     def create_sample_trust(self, new_id):
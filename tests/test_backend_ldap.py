@@ -15,11 +15,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import time
 import uuid
 
+import ldap
 import nose.exc
 
 from keystone import assignment
+from keystone.common import driver_hints
+from keystone.common.ldap import core as ldap_core
 from keystone.common.ldap import fakeldap
 from keystone.common import sql
 from keystone import config
@@ -108,6 +112,18 @@ class BaseLDAPIdentity(test_backend.IdentityTests):
                           self.identity_api.get_user,
                           self.user_foo['id'])
 
+    def test_list_users_with_hints(self):
+        raise nose.exc.SkipTest('N/A: LDAP does not support multiple domains')
+
+    def test_list_users_applies_attribute_hints(self):
+        hints = driver_hints.Hints()
+        hints.add_filter('name', self.user_foo['name'])
+        hints.add_filter('domain_id', CONF.identity.default_domain_id)
+        users = self.identity_api.list_users(hints=hints)
+        self.assertEqual([x['id'] for x in users], [self.user_foo['id']])
+        # the domain is not an attribute of the LDAP entries
+        self.assertEqual(hints.filter_names(), ['domain_id'])
+
     def test_get_role_grant_by_user_and_project(self):
         raise nose.exc.SkipTest('Blocked by bug 1101287')
 
@@ -194,6 +210,9 @@ class BaseLDAPIdentity(test_backend.IdentityTests):
     def test_list_role_assignments_unfiltered(self):
         raise nose.exc.SkipTest('Blocked by bug 1195019')
 
+    def test_list_role_assignments_filtered_and_paginated(self):
+        raise nose.exc.SkipTest('Blocked by bug 1195019')
+
     def test_multi_group_grants_on_project_domain(self):
         raise nose.exc.SkipTest('Blocked by bug 1101287')
 
@@ -491,6 +510,124 @@ class LDAPIdentity(test.TestCase, BaseLDAPIdentity):
 
         user_api.get_connection(user=None, password=None)
 
+    def test_pooled_connections_are_reused(self):
+        self.stubs.Set(ldap_core, '_POOLS', {})
+        CONF.ldap.use_pool = True
+        user_api = identity.backends.ldap.UserApi(CONF)
+        binds = []
+        connect = user_api._connect
+
+        def counting_connect(user, password):
+            binds.append(user)
+            return connect(user, password)
+
+        self.stubs.Set(user_api, '_connect', counting_connect)
+        for i in range(3):
+            user_ref = user_api.get(self.user_foo['id'])
+            self.assertEqual(user_ref['id'], self.user_foo['id'])
+        self.assertEqual(binds, [CONF.ldap.user])
+
+    def test_connection_pool_retries_when_server_down(self):
+        class Connection(object):
+            def __init__(self, down):
+                self.down = down
+                self.unbound = False
+
+            def search_s(self, dn):
+                if self.down:
+                    raise ldap.SERVER_DOWN
+                return [(dn, {})]
+
+            def unbind_s(self):
+                self.unbound = True
+
+        dead = [Connection(True), Connection(True)]
+        new = [Connection(False)]
+        pool = ldap_core.ConnectionPool(lambda: new.pop(), 2, retry_max=1)
+        for conn in dead:
+            pool._checkin(conn)
+        self.assertEqual(pool.run('search_s', 'cn=foo'), [('cn=foo', {})])
+        # the other dead connection was dropped without being tried
+        self.assertTrue(all(conn.unbound for conn in dead))
+        self.assertEqual(len(pool._idle), 1)
+
+        pool.connect = lambda: Connection(True)
+        pool.clear()
+        self.assertRaises(ldap.SERVER_DOWN, pool.run, 'search_s', 'cn=foo')
+
+    def test_connection_pool_does_not_retry_writes(self):
+        class Connection(object):
+            def __init__(self):
+                self.deletes = []
+
+            def delete_s(self, dn):
+                self.deletes.append(dn)
+                raise ldap.SERVER_DOWN
+
+            def unbind_s(self):
+                pass
+
+        connections = []
+
+        def connect():
+            connections.append(Connection())
+            return connections[-1]
+
+        pool = ldap_core.ConnectionPool(connect, 1, retry_max=3)
+        self.assertRaises(ldap.SERVER_DOWN, pool.run, 'delete_s', 'cn=foo')
+        self.assertEqual([conn.deletes for conn in connections], [['cn=foo']])
+
+        # a write is retried when it could not be sent
+        del connections[:]
+
+        def failing_connect():
+            if not connections:
+                connections.append(None)
+                raise ldap.SERVER_DOWN
+            return connect()
+
+        pool.connect = failing_connect
+        self.assertRaises(ldap.SERVER_DOWN, pool.run, 'delete_s', 'cn=foo')
+        self.assertEqual(connections[1].deletes, ['cn=foo'])
+        self.assertEqual(len(connections), 2)
+
+    def test_connection_pool_closes_idle_connections(self):
+        connections = []
+
+        def connect():
+            connections.append(fakeldap.FakeLdap(CONF.ldap.url))
+            return connections[-1]
+
+        pool = ldap_core.ConnectionPool(connect, 1, lifetime=60)
+        pool.run('simple_bind_s', CONF.ldap.user, CONF.ldap.password)
+        pool.run('simple_bind_s', CONF.ldap.user, CONF.ldap.password)
+        self.assertEqual(len(connections), 1)
+
+        now = time.time()
+        self.stubs.Set(time, 'time', lambda: now + 61)
+        pool.run('simple_bind_s', CONF.ldap.user, CONF.ldap.password)
+        self.assertEqual(len(connections), 2)
+
+    def test_authenticate_does_not_use_the_lookup_pool(self):
+        self.stubs.Set(ldap_core, '_POOLS', {})
+        CONF.ldap.use_pool = True
+        CONF.ldap.use_auth_pool = True
+        self.load_backends()
+        self.identity_api.get_user(self.user_foo['id'])
+        lookup_pool = ldap_core._POOLS[(CONF.ldap.url, CONF.ldap.user)]
+        self.assertEqual(len(lookup_pool._idle), 1)
+
+        self.assertRaises(AssertionError,
+                          self.identity_api.authenticate,
+                          user_id=self.user_foo['id'],
+                          password=uuid.uuid4().hex)
+        self.identity_api.authenticate(user_id=self.user_foo['id'],
+                                       password=self.user_foo['password'])
+        auth_pool = ldap_core._POOLS[(CONF.ldap.url, 'auth')]
+        # the failed bind left its connection usable
+        self.assertEqual(len(auth_pool._idle), 1)
+        self.assertEqual(len(lookup_pool._idle), 1)
+
     def test_wrong_ldap_scope(self):
         CONF.ldap.query_scope = uuid.uuid4().hex
         self.assertRaisesRegexp(
@@ -23,6 +23,7 @@ import memcache
 from keystone import test
 
 from keystone.common import utils
+from keystone import config
 from keystone import exception
 from keystone.openstack.common import jsonutils
 from keystone.openstack.common import timeutils
@@ -32,6 +33,9 @@ from keystone.token.backends import memcache as token_memcache
 import test_backend
 
 
+CONF = config.CONF
+
+
 class MemcacheClient(object):
     """Replicates a tiny subset of memcached client interface."""
 
@@ -40,15 +44,15 @@ class MemcacheClient(object):
         self.cache = {}
         self.reject_cas = False
 
-    def add(self, key, value):
+    def add(self, key, value, time=0):
         if self.get(key):
             return False
-        return self.set(key, value)
+        return self.set(key, value, time=time)
 
     def append(self, key, value):
         existing_value = self.get(key)
         if existing_value:
-            self.set(key, existing_value + value)
+            self.set(key, existing_value + value, time=self.cache[key][1])
             return True
         return False
 
@@ -76,6 +80,15 @@ class MemcacheClient(object):
             data_copy = copy.deepcopy(obj[0])
             return data_copy
 
+    def get_multi(self, keys):
+        """Retrieves the values for several keys, skipping missing ones."""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
     def set(self, key, value, time=0):
         """Sets the value for a key."""
         self.check_key(key)
@@ -90,6 +103,14 @@ class MemcacheClient(object):
         self.cache[key] = (data_copy, time)
         return True
 
+    def incr(self, key, delta=1):
+        value = self.get(key)
+        if value is None:
+            return None
+        value = int(value) + delta
+        self.set(key, value)
+        return value
+
     def cas(self, key, value, time=0, min_compress_len=0):
         # Call self.set() since we don't really do 'cas' here.
         if self.reject_cas:
@@ -140,47 +161,135 @@ class MemcacheToken(test.TestCase, test_backend.TokenTests):
         with self.assertRaises(exception.NotImplemented):
             self.token_api.flush_expired_tokens()
 
-    def test_cleanup_user_index_on_create(self):
-        valid_token_id = uuid.uuid4().hex
-        second_valid_token_id = uuid.uuid4().hex
-        expired_token_id = uuid.uuid4().hex
+    def test_flush_expired_tokens_in_batches(self):
+        with self.assertRaises(exception.NotImplemented):
+            self.token_api.flush_expired_tokens(limit=2)
+
+    def test_user_index_expires_with_its_tokens(self):
+        token_id = uuid.uuid4().hex
         user_id = unicode(uuid.uuid4().hex)
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'expires': expires,
+                                               'user': {'id': user_id}})
 
-        expire_delta = datetime.timedelta(seconds=86400)
-
-        valid_data = {'id': valid_token_id, 'a': 'b',
-                      'user': {'id': user_id}}
-        second_valid_data = {'id': second_valid_token_id, 'a': 'b',
-                             'user': {'id': user_id}}
-        expired_data = {'id': expired_token_id, 'a': 'b',
-                        'user': {'id': user_id}}
-        self.token_api.create_token(valid_token_id, valid_data)
-        self.token_api.create_token(expired_token_id, expired_data)
-        # NOTE(morganfainberg): Directly access the data cache since we need to
-        # get expired tokens as well as valid tokens. token_api.list_tokens()
-        # will not return any expired tokens in the list.
-        user_key = self.token_api.driver._prefix_user_id(user_id)
-        user_record = self.token_api.driver.client.get(user_key)
-        user_token_list = jsonutils.loads('[%s]' % user_record)
-        self.assertEquals(len(user_token_list), 2)
-        expired_token_ptk = self.token_api.driver._prefix_token_id(
-            expired_token_id)
-        expired_token = self.token_api.driver.client.get(expired_token_ptk)
-        expired_token['expires'] = (timeutils.utcnow() - expire_delta)
-        self.token_api.driver.client.set(expired_token_ptk, expired_token)
-
-        self.token_api.create_token(second_valid_token_id, second_valid_data)
-        user_record = self.token_api.driver.client.get(user_key)
-        user_token_list = jsonutils.loads('[%s]' % user_record)
-        self.assertEquals(len(user_token_list), 2)
-
-    def test_cas_failure(self):
-        self.token_api.driver.client.reject_cas = True
+        driver = self.token_api.driver
+        shard = driver._shard(expires)
+        user_key = driver._shard_key(driver._prefix_user_id(user_id), shard)
+        self.assertEqual(jsonutils.loads('[%s]' % driver.client.get(user_key)),
+                         [token_id])
+        self.assertEqual(driver.client.cache[user_key][1],
+                         (shard + 1) * driver.shard_interval)
+
+    def test_create_token_does_not_read_user_index(self):
+        user_id = unicode(uuid.uuid4().hex)
+        client = self.token_api.driver.client
+
+        def failing_get(*args, **kwargs):
+            raise AssertionError('the user index was read')
+
+        self.stubs.Set(client, 'gets', failing_get)
+        self.stubs.Set(client, 'get_multi', failing_get)
+        for i in range(3):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id, {'id': token_id,
+                                                   'user': {'id': user_id}})
+        self.stubs.UnsetAll()
+        self.assertEqual(len(self.token_api.list_tokens(user_id)), 3)
+
+    def test_list_tokens_reads_unsharded_user_index(self):
         token_id = uuid.uuid4().hex
         user_id = unicode(uuid.uuid4().hex)
-        user_key = self.token_api.driver._prefix_user_id(user_id)
-        token_data = jsonutils.dumps(token_id)
-        self.assertRaises(
-            exception.UnexpectedError,
-            self.token_api.driver._update_user_list_with_cas,
-            user_key, token_data)
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'user': {'id': 'otheruserid'}})
+        client = self.token_api.driver.client
+        client.set(self.token_api.driver._prefix_user_id(user_id),
+                   jsonutils.dumps(token_id))
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+
+    def test_list_tokens_fetches_tokens_in_one_call(self):
+        user_id = unicode(uuid.uuid4().hex)
+        token_ids = []
+        for i in range(3):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id, {'id': token_id,
+                                                   'user': {'id': user_id}})
+            token_ids.append(token_id)
+
+        client = self.token_api.driver.client
+        get_multi = client.get_multi
+        calls = []
+
+        def counting_get_multi(keys):
+            calls.append(keys)
+            return get_multi(keys)
+
+        self.stubs.Set(client, 'get_multi', counting_get_multi)
+        self.assertEqual(self.token_api.list_tokens(user_id), token_ids)
+        # one call for the user index and one for the tokens
+        self.assertEqual(len(calls), 2)
+
+    def test_list_tokens_after_lowering_the_expiration(self):
+        token_id = uuid.uuid4().hex
+        user_id = unicode(uuid.uuid4().hex)
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'user': {'id': user_id}})
+        self.opt_in_group('token', expiration=60)
+        self.assertEqual(self.token_api.list_tokens(user_id), [token_id])
+        self.token_api.delete_tokens(user_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id)
+
+    def test_revocation_list_expires_with_its_tokens(self):
+        token_id = uuid.uuid4().hex
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=5)
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'expires': expires,
+                                               'extra': 'x' * 1024,
+                                               'user': {'id': 'testuserid'}})
+        self.token_api.delete_token(token_id)
+
+        driver = self.token_api.driver
+        shard = driver._shard(expires)
+        shard_key = driver._shard_key(driver.revocation_key, shard)
+        revoked = jsonutils.loads('[%s]' % driver.client.get(shard_key))
+        self.assertEqual([x['id'] for x in revoked], [token_id])
+        # only what the revocation list serves is stored
+        self.assertEqual(set(revoked[0]), set(['id', 'expires', 'revision',
+                                              'revoked_at']))
+        self.assertEqual(driver.client.cache[shard_key][1],
+                         (shard + 1) * driver.shard_interval)
+
+    def test_list_revoked_tokens_skips_expired_entries(self):
+        driver = self.token_api.driver
+        now = timeutils.utcnow()
+        expired = {'id': uuid.uuid4().hex, 'revision': 1,
+                   'expires': timeutils.isotime(
+                       now - datetime.timedelta(minutes=1))}
+        revoked = {'id': uuid.uuid4().hex, 'revision': 2,
+                   'expires': timeutils.isotime(
+                       now + datetime.timedelta(minutes=1))}
+        # entries written in the unsharded list by earlier releases
+        driver.client.set(driver.revocation_key, '%s,%s' % (
+            jsonutils.dumps(expired), jsonutils.dumps(revoked)))
+        self.assertEqual(self.token_api.list_revoked_tokens(), [revoked])
+
+    def test_list_revoked_tokens_expiring_after_the_expiration(self):
+        token_id = uuid.uuid4().hex
+        expires = timeutils.utcnow() + datetime.timedelta(
+            seconds=CONF.token.expiration * 2)
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'expires': expires,
+                                               'user': {'id': 'testuserid'}})
+        self.token_api.delete_token(token_id)
+        revoked = self.token_api.list_revoked_tokens()
+        self.assertEqual([x['id'] for x in revoked], [token_id])
+
+    def test_user_index_failure(self):
+        client = self.token_api.driver.client
+        self.stubs.Set(client, 'append', lambda *args, **kwargs: False)
+        self.stubs.Set(client, 'add', lambda *args, **kwargs: False)
+        token_id = uuid.uuid4().hex
+        self.assertRaises(exception.UnexpectedError,
+                          self.token_api.create_token, token_id,
+                          {'id': token_id, 'user': {'id': 'testuserid'}})
@@ -14,18 +14,26 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import uuid
 
 import sqlalchemy
 
 from keystone import test
 
+from keystone.common import driver_hints
 from keystone.common import sql
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import timeutils
+from keystone import token
+from keystone.token.backends import sql as token_sql
+from keystone.token.backends import sql_bucketed
+from keystone.token.backends import tiered
 
 import default_fixtures
 import test_backend
+import test_backend_memcache
 
 
 CONF = config.CONF
@@ -117,29 +125,13 @@ class SqlModels(SqlTests):
                 ('name', sql.String, 64))
         self.assertExpectedSchema('role', cols)
 
-    def test_user_project_metadata_model(self):
-        cols = (('user_id', sql.String, 64),
-                ('project_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('user_project_metadata', cols)
-
-    def test_user_domain_metadata_model(self):
-        cols = (('user_id', sql.String, 64),
-                ('domain_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('user_domain_metadata', cols)
-
-    def test_group_project_metadata_model(self):
-        cols = (('group_id', sql.String, 64),
-                ('project_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('group_project_metadata', cols)
-
-    def test_group_domain_metadata_model(self):
-        cols = (('group_id', sql.String, 64),
-                ('domain_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('group_domain_metadata', cols)
+    def test_assignment_model(self):
+        cols = (('type', sqlalchemy.Enum, None),
+                ('actor_id', sql.String, 64),
+                ('target_id', sql.String, 64),
+                ('role_id', sql.String, 64),
+                ('inherited', sql.Boolean, None))
+        self.assertExpectedSchema('assignment', cols)
 
     def test_user_group_membership(self):
         cols = (('group_id', sql.String, 64),
@@ -153,6 +145,103 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
         user_ref = self.identity_api._get_user(session, self.user_foo['id'])
         self.assertNotEqual(user_ref['password'], self.user_foo['password'])
 
+    def test_effective_roles_are_resolved_in_one_query(self):
+        self.opt_in_group('os_inherit', enabled=True)
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        self.identity_api.add_user_to_group(self.user_foo['id'], group['id'])
+        roles = [{'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+                 for i in range(4)]
+        for role in roles:
+            self.identity_api.create_role(role['id'], role)
+        self.identity_api.create_grant(user_id=self.user_foo['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=roles[0]['id'])
+        self.identity_api.create_grant(group_id=group['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=roles[1]['id'])
+        self.identity_api.create_grant(user_id=self.user_foo['id'],
+                                       domain_id=DEFAULT_DOMAIN_ID,
+                                       role_id=roles[2]['id'],
+                                       inherited_to_projects=True)
+        self.identity_api.create_grant(group_id=group['id'],
+                                       domain_id=DEFAULT_DOMAIN_ID,
+                                       role_id=roles[3]['id'],
+                                       inherited_to_projects=True)
+
+        def failing_get_metadata(*args, **kwargs):
+            raise AssertionError('the grants were read one by one')
+
+        assignment_driver = self.identity_api.assignment.driver
+        self.stubs.Set(assignment_driver, '_get_metadata',
+                       failing_get_metadata)
+        role_ids = self.identity_api.get_roles_for_user_and_project(
+            self.user_foo['id'], self.tenant_bar['id'])
+        for role in roles:
+            self.assertIn(role['id'], role_ids)
+
+        self.opt_in_group('os_inherit', enabled=False)
+        self.identity_api.assignment.invalidate_role_cache()
+        role_ids = self.identity_api.get_roles_for_user_and_project(
+            self.user_foo['id'], self.tenant_bar['id'])
+        self.assertIn(roles[1]['id'], role_ids)
+        self.assertNotIn(roles[3]['id'], role_ids)
+
+    def test_group_membership_is_resolved_with_joins(self):
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        empty_group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                       'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(empty_group['id'], empty_group)
+        self.identity_api.add_user_to_group(self.user_foo['id'], group['id'])
+        self.identity_api.add_user_to_group(self.user_two['id'], group['id'])
+
+        def failing_get(*args, **kwargs):
+            raise AssertionError('the members were read one by one')
+
+        identity_driver = self.identity_api.driver
+        self.stubs.Set(identity_driver, 'get_user', failing_get)
+        self.stubs.Set(identity_driver, 'get_group', failing_get)
+
+        groups = self.identity_api.list_groups_for_user(self.user_foo['id'])
+        self.assertEqual([x['id'] for x in groups], [group['id']])
+        self.assertEqual(
+            self.identity_api.list_groups_for_user(self.user_badguy['id']),
+            [])
+        users = self.identity_api.list_users_in_group(group['id'])
+        self.assertEqual(sorted(x['id'] for x in users),
+                         sorted([self.user_foo['id'], self.user_two['id']]))
+        for user in users:
+            self.assertNotIn('password', user)
+        self.assertEqual(
+            self.identity_api.list_users_in_group(empty_group['id']), [])
+        self.identity_api.check_user_in_group(self.user_two['id'],
+                                              group['id'])
+
+        self.assertRaises(exception.UserNotFound,
+                          self.identity_api.list_groups_for_user,
+                          uuid.uuid4().hex)
+        self.assertRaises(exception.GroupNotFound,
+                          self.identity_api.list_users_in_group,
+                          uuid.uuid4().hex)
+
+    def test_list_users_applies_column_hints(self):
+        hints = driver_hints.Hints()
+        hints.add_filter('name', self.user_foo['name'])
+        hints.add_filter('enabled', '1')
+        users = self.identity_api.list_users(limit=1, hints=hints)
+        self.assertEqual([x['id'] for x in users], [self.user_foo['id']])
+        self.assertEqual(hints.filters, [])
+
+        # email is not a column, so the whole listing is left to filter
+        hints = driver_hints.Hints()
+        hints.add_filter('email', 'foo@example.com')
+        users = self.identity_api.list_users(limit=1, hints=hints)
+        self.assertEqual(hints.filter_names(), ['email'])
+        self.assertEqual(len(users), len(default_fixtures.USERS))
+
     def test_delete_user_with_project_association(self):
         user = {'id': uuid.uuid4().hex,
                 'name': uuid.uuid4().hex,
@@ -330,12 +419,295 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
         self.assertEqual(arbitrary_value, ref['extra'][arbitrary_key])
 
 
+class SqlCachedRolesIdentity(SqlIdentity):
+    def setUp(self):
+        self.opt_in_group('assignment', cache_size=1000)
+        super(SqlCachedRolesIdentity, self).setUp()
+
+    def test_roles_are_resolved_from_the_cache(self):
+        roles = self.identity_api.get_roles_for_user_and_project(
+            self.user_foo['id'], self.tenant_bar['id'])
+
+        def failing_get_user(user_id):
+            raise AssertionError('the roles were resolved again')
+
+        self.stubs.Set(self.identity_api, 'get_user', failing_get_user)
+        self.assertEqual(
+            sorted(self.identity_api.get_roles_for_user_and_project(
+                self.user_foo['id'], self.tenant_bar['id'])),
+            sorted(roles))
+
+    def test_group_membership_invalidates_roles(self):
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_group(group['id'], group)
+        self.identity_api.create_grant(group_id=group['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=self.role_admin['id'])
+        self.assertNotIn(self.role_admin['id'],
+                         self.identity_api.get_roles_for_user_and_project(
+                             self.user_foo['id'], self.tenant_bar['id']))
+
+        self.identity_api.add_user_to_group(self.user_foo['id'], group['id'])
+        self.assertIn(self.role_admin['id'],
+                      self.identity_api.get_roles_for_user_and_project(
+                          self.user_foo['id'], self.tenant_bar['id']))
+
+        self.identity_api.remove_user_from_group(self.user_foo['id'],
+                                                 group['id'])
+        self.assertNotIn(self.role_admin['id'],
+                         self.identity_api.get_roles_for_user_and_project(
+                             self.user_foo['id'], self.tenant_bar['id']))
+
+
 class SqlTrust(SqlTests, test_backend.TrustTests):
     pass
 
 
 class SqlToken(SqlTests, test_backend.TokenTests):
-    pass
+    def test_delete_tokens_in_batches(self):
+        self.token_api.driver.in_clause_size = 2
+        token_ids = [self.create_token_sample_data() for i in range(3)]
+        self.assertEqual(self.token_api.delete_tokens('testuserid'), 3)
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [])
+        events = self.token_api.list_revocation_events(0)
+        self.assertEqual(sorted(x['id'] for x in events), sorted(token_ids))
+
+    def test_delete_tokens_only_revokes_the_listed_tokens(self):
+        token_id = self.create_token_sample_data()
+        late_token_id = uuid.uuid4().hex
+        driver = self.token_api.driver
+        live_tokens_query = driver._live_tokens_query
+
+        def racing_live_tokens_query(session):
+            query = live_tokens_query(session)
+            values = query.values
+
+            def values_then_create_token(*columns):
+                token_refs = list(values(*columns))
+                # a token stored between the SELECT and the UPDATE
+                late_token_ref = token_sql.TokenModel.from_dict({
+                    'id': late_token_id,
+                    'expires': timeutils.utcnow() + datetime.timedelta(
+                        minutes=5),
+                    'user_id': 'testuserid'})
+                late_token_ref.valid = True
+                session.add(late_token_ref)
+                session.flush()
+                return token_refs
+
+            query.values = values_then_create_token
+            return query
+
+        self.stubs.Set(driver, '_live_tokens_query', racing_live_tokens_query)
+        self.assertEqual(self.token_api.delete_tokens('testuserid'), 1)
+        self.assertEqual(self.token_api.list_tokens('testuserid'),
+                         [late_token_id])
+        events = self.token_api.list_revocation_events(0)
+        self.assertEqual([x['id'] for x in events], [token_id])
+
+
+class SqlBucketedToken(SqlTests, test_backend.TokenTests):
+    def setUp(self):
+        super(SqlBucketedToken, self).setUp()
+        self.opt_in_group('token',
+                          driver='keystone.token.backends.sql_bucketed.Token',
+                          bucket_interval=3600)
+        self.token_api = token.Manager()
+
+    def create_bucketed_token(self, expires):
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(token_id, {
+            'id': token_id, 'expires': expires,
+            'user': {'id': 'testuserid'}})
+        return token_id
+
+    def test_tokens_are_stored_by_expiry(self):
+        now = timeutils.utcnow()
+        self.create_bucketed_token(now + datetime.timedelta(minutes=1))
+        self.create_bucketed_token(now + datetime.timedelta(hours=2))
+        buckets = [name for name in self.engine.table_names()
+                   if name.startswith('token_') and name[6:].isdigit()]
+        self.assertEqual(len(buckets), 2)
+
+    def test_token_lookups_do_not_read_the_buckets(self):
+        now = timeutils.utcnow()
+        token_id = self.create_bucketed_token(
+            now + datetime.timedelta(minutes=1))
+        self.token_api.get_token(token_id)
+
+        def failing_load_buckets():
+            raise AssertionError('the buckets were read again')
+
+        driver = self.token_api.driver
+        self.stubs.Set(driver, '_load_buckets', failing_load_buckets)
+        for i in range(3):
+            self.assertEqual(driver.get_token(token_id)['id'], token_id)
+            self.assertEqual(driver.get_tokens([token_id]).keys(),
+                             [token_id])
+
+    def test_buckets_created_by_another_process_are_found(self):
+        timeutils.set_time_override(timeutils.utcnow())
+        driver = self.token_api.driver
+        self.assertRaises(exception.TokenNotFound,
+                          driver.get_token, uuid.uuid4().hex)
+
+        # a bucket past the token expiration, created by another process
+        other_driver = sql_bucketed.Token()
+        token_id = uuid.uuid4().hex
+        other_driver.create_token(token_id, {
+            'id': token_id, 'user': {'id': 'testuserid'},
+            'expires': timeutils.utcnow() + datetime.timedelta(
+                seconds=CONF.token.expiration * 2)})
+
+        timeutils.advance_time_seconds(driver.bucket_refresh_interval + 1)
+        self.assertEqual(driver.get_token(token_id)['id'], token_id)
+        self.assertEqual(driver.get_tokens([token_id]).keys(), [token_id])
+        self.assertEqual(driver.list_tokens('testuserid'), [token_id])
+        self.assertEqual(driver.delete_tokens('testuserid'), 1)
+        self.assertRaises(exception.TokenNotFound,
+                          other_driver.get_token, token_id)
+
+    def test_unknown_tokens_do_not_read_the_buckets_each_time(self):
+        timeutils.set_time_override(timeutils.utcnow())
+        driver = self.token_api.driver
+        self.assertRaises(exception.TokenNotFound,
+                          driver.get_token, uuid.uuid4().hex)
+
+        def failing_load_buckets():
+            raise AssertionError('the buckets were read again')
+
+        self.stubs.Set(driver, '_load_buckets', failing_load_buckets)
+        for i in range(3):
+            self.assertRaises(exception.TokenNotFound,
+                              driver.get_token, uuid.uuid4().hex)
+            self.assertEqual(driver.get_tokens([uuid.uuid4().hex]), {})
+
+    def test_create_token_in_a_bucket_dropped_by_another_process(self):
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.create_bucketed_token(expires)
+        driver = self.token_api.driver
+        driver._bucket_table(driver._bucket_start(expires)).drop(
+            bind=self.engine)
+
+        token_id = self.create_bucketed_token(expires)
+        self.assertEqual(self.token_api.get_token(token_id)['id'], token_id)
+
+    def test_delete_tokens_in_batches(self):
+        self.token_api.driver.in_clause_size = 2
+        now = timeutils.utcnow()
+        for i in range(3):
+            self.create_bucketed_token(now + datetime.timedelta(minutes=1))
+        self.create_bucketed_token(now + datetime.timedelta(hours=2))
+        self.assertEqual(self.token_api.delete_tokens('testuserid'), 4)
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [])
+        self.assertEqual(len(self.token_api.list_revocation_events(0)), 4)
+
+    def test_flush_drops_expired_buckets(self):
+        now = timeutils.utcnow()
+        self.create_bucketed_token(now - datetime.timedelta(hours=3))
+        self.create_bucketed_token(now - datetime.timedelta(hours=3))
+        token_id = self.create_bucketed_token(
+            now + datetime.timedelta(hours=2))
+        tables = set(self.engine.table_names())
+
+        self.assertEqual(self.token_api.flush_expired_tokens(), 2)
+        dropped = tables - set(self.engine.table_names())
+        self.assertEqual(len(dropped), 1)
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [token_id])
+
+    def test_flush_keeps_the_current_bucket(self):
+        now = datetime.datetime(2013, 1, 1, 12, 30)
+        timeutils.set_time_override(now)
+        self.create_bucketed_token(now - datetime.timedelta(minutes=10))
+        tables = set(self.engine.table_names())
+
+        # the token expired, but its bucket may still receive tokens
+        self.assertEqual(self.token_api.flush_expired_tokens(), 1)
+        self.assertEqual(set(self.engine.table_names()), tables)
+        token_id = self.create_bucketed_token(
+            now + datetime.timedelta(minutes=10))
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [token_id])
+
+
+class SqlTieredToken(SqlTests, test_backend.TokenTests):
+    def setUp(self):
+        super(SqlTieredToken, self).setUp()
+        self.opt_in_group('token',
+                          driver='keystone.token.backends.tiered.Token')
+        self.token_api = token.Manager()
+
+    def create_token_sample_data(self, *args, **kwargs):
+        token_id = super(SqlTieredToken, self).create_token_sample_data(
+            *args, **kwargs)
+        self.token_api.get_token(token_id)
+        return token_id
+
+    def test_token_is_validated_from_the_cache(self):
+        token_id = self.create_token_sample_data()
+
+        def failing_get_token(token_id):
+            raise AssertionError('the token was read from SQL')
+
+        self.stubs.Set(self.token_api.driver.driver, 'get_token',
+                       failing_get_token)
+        self.assertEqual(self.token_api.get_token(token_id)['id'], token_id)
+
+    def test_token_is_cached_when_read(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.driver.tier.delete(token_id)
+        self.token_api.get_token(token_id)
+        self.assertIsNotNone(self.token_api.driver.tier.get(token_id))
+
+    def test_token_revoked_while_read_is_not_cached(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.driver.tier.delete(token_id)
+        persistent_driver = self.token_api.driver.driver
+        get_token = persistent_driver.get_token
+
+        def racing_get_token(token_id):
+            # another process revokes the token once it was read
+            token_ref = get_token(token_id)
+            self.token_api.delete_token(token_id)
+            return token_ref
+
+        self.stubs.Set(persistent_driver, 'get_token', racing_get_token)
+        self.token_api.get_token(token_id)
+        self.stubs.UnsetAll()
+        self.assertIsNone(self.token_api.driver.tier.get(token_id))
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, token_id)
+
+    def test_delete_token_revoked_elsewhere_evicts_it(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.driver.driver.delete_token(token_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.delete_token, token_id)
+        self.assertIsNone(self.token_api.driver.tier.get(token_id))
+
+    def test_delete_tokens_evicts_the_tokens_issued_meanwhile(self):
+        self.create_token_sample_data()
+        persistent_driver = self.token_api.driver.driver
+        delete_tokens = persistent_driver.delete_tokens
+        late_token_ids = []
+
+        def racing_delete_tokens(*args, **kwargs):
+            # a token issued and cached just before the revocation
+            late_token_ids.append(self.create_token_sample_data())
+            return delete_tokens(*args, **kwargs)
+
+        self.stubs.Set(persistent_driver, 'delete_tokens',
+                       racing_delete_tokens)
+        self.assertEqual(self.token_api.delete_tokens('testuserid'), 2)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, late_token_ids[0])
+
+
+class SqlTieredMemcacheToken(SqlTieredToken):
+    def setUp(self):
+        super(SqlTieredMemcacheToken, self).setUp()
+        self.token_api.driver.tier = tiered.MemcacheTier(
+            client=test_backend_memcache.MemcacheClient())
 
 
 class SqlCatalog(SqlTests, test_backend.CatalogTests):
@@ -0,0 +1,68 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+
+from keystone import test
+
+from keystone.common import cache
+
+
+class LRUCacheTestCase(test.TestCase):
+    def test_get_and_set(self):
+        lru = cache.LRUCache(2)
+        self.assertIsNone(lru.get('a'))
+        lru.set('a', 1)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.stats(),
+                         {'size': 1, 'max_size': 2, 'hits': 1, 'misses': 1})
+
+    def test_least_recently_used_is_evicted(self):
+        lru = cache.LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(len(lru), 2)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_entries_expire(self):
+        lru = cache.LRUCache(2, ttl=10)
+        lru.set('a', 1)
+        now = time.time()
+        self.stubs.Set(time, 'time', lambda: now + 11)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+    def test_delete_and_clear(self):
+        lru = cache.LRUCache(3)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.delete('a')
+        lru.delete('missing')
+        self.assertIsNone(lru.get('a'))
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+        lru.set('c', 3)
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_disabled(self):
+        lru = cache.LRUCache(0)
+        lru.set('a', 1)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
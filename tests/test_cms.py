@@ -0,0 +1,162 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import nose.exc
+
+from keystone import test
+
+from keystone.common import cms
+from keystone.common import environment
+
+
+SIGNING_CERT = test.rootdir('examples', 'pki', 'certs', 'signing_cert.pem')
+SIGNING_KEY = test.rootdir('examples', 'pki', 'private', 'signing_key.pem')
+CA_CERT = test.rootdir('examples', 'pki', 'certs', 'cacert.pem')
+TEXT = open(test.rootdir('examples', 'pki', 'cms',
+                         'auth_token_scoped.json')).read().strip()
+
+
+class CmsSigningTests(test.TestCase):
+    def setUp(self):
+        super(CmsSigningTests, self).setUp()
+        self.stubs.Set(cms, '_signers', {})
+
+    def test_in_process_signing_matches_openssl(self):
+        if cms._get_libcrypto() is None:
+            raise nose.exc.SkipTest('libcrypto is not available')
+        self.assertIsNotNone(cms._get_signer(SIGNING_CERT, SIGNING_KEY))
+        for text in [TEXT, 'line\nwith\r\nline endings\r', u'unicode']:
+            self.assertEqual(
+                cms.cms_sign_text(text, SIGNING_CERT, SIGNING_KEY),
+                cms._openssl_sign_text(text, SIGNING_CERT, SIGNING_KEY))
+
+    def test_signer_is_reused(self):
+        if cms._get_libcrypto() is None:
+            raise nose.exc.SkipTest('libcrypto is not available')
+        signer = cms._get_signer(SIGNING_CERT, SIGNING_KEY)
+        self.assertIs(cms._get_signer(SIGNING_CERT, SIGNING_KEY), signer)
+
+    def test_signer_is_probed_without_the_lock(self):
+        if cms._get_libcrypto() is None:
+            raise nose.exc.SkipTest('libcrypto is not available')
+        openssl_sign_text = cms._openssl_sign_text
+
+        def probe(*args):
+            self.assertFalse(cms._signers_lock.locked())
+            return openssl_sign_text(*args)
+
+        self.stubs.Set(cms, '_openssl_sign_text', probe)
+        self.assertIsNotNone(cms._get_signer(SIGNING_CERT, SIGNING_KEY))
+
+    def test_signing_without_libcrypto(self):
+        self.stubs.Set(cms, '_get_libcrypto', lambda: None)
+        self.assertIsNone(cms._get_signer(SIGNING_CERT, SIGNING_KEY))
+        signed_text = cms.cms_sign_text(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(cms.cms_verify(signed_text, SIGNING_CERT, CA_CERT),
+                         TEXT)
+
+    def test_no_signer_for_missing_files(self):
+        self.assertIsNone(cms._get_signer(SIGNING_CERT,
+                                          test.tmpdir('missing.pem')))
+
+
+class CompressedTokenTests(test.TestCase):
+    def test_pkiz_round_trip(self):
+        token = cms.pkiz_sign(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertTrue(cms.is_pkiz(token))
+        self.assertFalse(cms.is_ans1_token(token))
+        self.assertEqual(cms.verify_token(token, SIGNING_CERT, CA_CERT), TEXT)
+        self.assertEqual(cms.verify_token(unicode(token), SIGNING_CERT,
+                                          CA_CERT), TEXT)
+
+    def test_pkiz_is_smaller(self):
+        token = cms.pkiz_sign(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertTrue(
+            len(token) <
+            len(cms.cms_sign_token(TEXT, SIGNING_CERT, SIGNING_KEY)))
+
+    def test_pkiz_uncompress_invalid_token(self):
+        self.assertRaises(ValueError, cms.pkiz_uncompress,
+                          cms.PKIZ_PREFIX + 'invalid')
+
+    def test_pkiz_token_is_hashed(self):
+        token = cms.pkiz_sign(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertNotEqual(cms.cms_hash_token(token), token)
+        self.assertEqual(len(cms.cms_hash_token(token)), 32)
+
+
+class SigningPoolTests(test.TestCase):
+    def test_pool_signing_matches_openssl(self):
+        pool = cms.SigningPool(1)
+        self.addCleanup(pool.close)
+        expected = cms._openssl_sign_text(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(pool.sign_text(TEXT, SIGNING_CERT, SIGNING_KEY),
+                         expected)
+        worker = pool._idle[0]
+        self.assertEqual(pool.sign_text(TEXT, SIGNING_CERT, SIGNING_KEY),
+                         expected)
+        self.assertEqual(pool._idle, [worker])
+
+    def test_pool_waits_on_green_semaphores(self):
+        pool = cms.SigningPool(1)
+        self.assertIsInstance(pool._workers, environment.Semaphore)
+        self.opt_in_group('signing', max_concurrent_signatures=1)
+        self.assertIsInstance(cms._get_signing_slots(), environment.Semaphore)
+
+    def test_worker_survives_signing_errors(self):
+        pool = cms.SigningPool(1)
+        self.addCleanup(pool.close)
+        self.assertRaises(cms.SigningWorkerError, pool.sign_text, TEXT,
+                          SIGNING_CERT, test.tmpdir('missing.pem'))
+        self.assertEqual(len(pool._idle), 1)
+        self.assertTrue(pool._idle[0].is_alive())
+
+    def test_worker_busy_while_the_pool_closes_is_stopped(self):
+        pool = cms.SigningPool(1)
+        workers = []
+        sign_text = cms.SigningWorker.sign_text
+
+        def closing_sign_text(worker, *args):
+            # the pool is replaced while the worker signs
+            workers.append(worker)
+            pool.close()
+            return sign_text(worker, *args)
+
+        self.stubs.Set(cms.SigningWorker, 'sign_text', closing_sign_text)
+        pool.sign_text(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(pool._idle, [])
+        self.assertFalse(workers[0].is_alive())
+
+    def test_cms_sign_text_uses_pool(self):
+        self.opt_in_group('signing', worker_pool_size=1,
+                          max_concurrent_signatures=1)
+        pool = cms._get_signing_pool()
+        self.addCleanup(pool.close)
+        signed_text = cms.cms_sign_text(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(len(pool._idle), 1)
+        self.assertEqual(cms.cms_verify(signed_text, SIGNING_CERT, CA_CERT),
+                         TEXT)
+
+    def test_cms_sign_text_without_workers(self):
+        self.opt_in_group('signing', worker_pool_size=1)
+
+        def failing_sign_text(*args):
+            raise cms.SigningWorkerError()
+
+        self.stubs.Set(cms.SigningPool, 'sign_text', failing_sign_text)
+        signed_text = cms.cms_sign_text(TEXT, SIGNING_CERT, SIGNING_KEY)
+        self.assertEqual(cms.cms_verify(signed_text, SIGNING_CERT, CA_CERT),
+                         TEXT)
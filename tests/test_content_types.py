@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import io
 import uuid
 
@@ -23,13 +24,19 @@ import webtest
 
 from keystone import test
 
+from keystone.common import cms
 from keystone.common import extension
 from keystone.common import serializer
+from keystone import config
 from keystone.openstack.common import jsonutils
+from keystone.openstack.common import timeutils
 
 import default_fixtures
 
 
+CONF = config.CONF
+
+
 class RestfulTestCase(test.TestCase):
     """Performs restful tests against the WSGI app over HTTP.
 
@@ -799,6 +806,184 @@ class JsonTestCase(RestfulTestCase, CoreApiTests):
     def assertValidRevocationListResponse(self, response):
         self.assertIsNotNone(response.result['signed'])
 
+    def fetch_revocation_list(self, token, since=None):
+        path = '/v2.0/tokens/revoked'
+        if since is not None:
+            path += '?since=%s' % since
+        r = self.admin_request(path=path, token=token, expected_status=200)
+        self.assertValidRevocationListResponse(r)
+        return jsonutils.loads(cms.cms_verify(r.result['signed'],
+                                              CONF.signing.certfile,
+                                              CONF.signing.ca_certs))
+
+    def test_fetch_revocation_list_since(self):
+        token = self.get_scoped_token()
+        data = self.fetch_revocation_list(token)
+        self.assertNotIn('since', data)
+        revision = data['revision']
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % self.get_scoped_token(),
+            token=token,
+            expected_status=204)
+        data = self.fetch_revocation_list(token, since=revision)
+        self.assertEqual(data['since'], revision)
+        self.assertEqual(len(data['revoked']), 1)
+        self.assertTrue(data['revision'] > revision)
+        revoked = data['revoked']
+        revision = data['revision']
+
+        # recent revocations are sent again, whatever their revision
+        data = self.fetch_revocation_list(token, since=revision)
+        self.assertEqual(data['revoked'], revoked)
+        self.assertEqual(data['revision'], revision)
+
+        self.opt_in_group('token', revocation_resend_window=0)
+        self.stubs.Set(timeutils, 'utcnow',
+                       lambda: datetime.datetime.utcnow() +
+                       datetime.timedelta(seconds=1))
+        data = self.fetch_revocation_list(token, since=revision)
+        self.assertEqual(data['revoked'], [])
+
+    def test_fetch_revocation_list_since_ahead_of_backend(self):
+        token = self.get_scoped_token()
+        data = self.fetch_revocation_list(token, since=1000)
+        self.assertNotIn('since', data)
+        self.assertTrue(data['revision'] < 1000)
+
+    def test_fetch_revocation_list_etag(self):
+        token = self.get_scoped_token()
+        r = self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        etag = r.headers['ETag']
+        self.admin_request(
+            path='/v2.0/tokens/revoked',
+            headers={'If-None-Match': etag},
+            token=token,
+            expected_status=304)
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % self.get_scoped_token(),
+            token=token,
+            expected_status=204)
+        r = self.admin_request(
+            path='/v2.0/tokens/revoked',
+            headers={'If-None-Match': etag},
+            token=token,
+            expected_status=200)
+        self.assertNotEqual(r.headers['ETag'], etag)
+
+    def test_fetch_revocation_list_signed_once_per_revision(self):
+        token = self.get_scoped_token()
+        revoked_token = self.get_scoped_token()
+        sign_text = cms.cms_sign_text
+        calls = []
+
+        def counting_sign_text(*args):
+            calls.append(args)
+            return sign_text(*args)
+
+        self.stubs.Set(cms, 'cms_sign_text', counting_sign_text)
+        first = self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        second = self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        self.assertEqual(first.result, second.result)
+        self.assertEqual(len(calls), 1)
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % revoked_token,
+            token=token,
+            expected_status=204)
+        self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        self.assertEqual(len(calls), 2)
+
+    def test_fetch_revocation_list_does_not_list_tokens_when_cached(self):
+        token = self.get_scoped_token()
+        r = self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        etag = r.headers['ETag']
+
+        def failing_list_revoked_tokens():
+            raise AssertionError('the revoked tokens were listed')
+
+        self.stubs.Set(self.token_api, 'list_revoked_tokens',
+                       failing_list_revoked_tokens)
+        self.admin_request(path='/v2.0/tokens/revoked', token=token)
+        self.admin_request(
+            path='/v2.0/tokens/revoked',
+            headers={'If-None-Match': etag},
+            token=token,
+            expected_status=304)
+
+    def test_fetch_revocation_list_since_signed_once_per_revision(self):
+        token = self.get_scoped_token()
+        revoked_token = self.get_scoped_token()
+        revision = self.fetch_revocation_list(token)['revision']
+        sign_text = cms.cms_sign_text
+        calls = []
+
+        def counting_sign_text(*args):
+            calls.append(args)
+            return sign_text(*args)
+
+        self.stubs.Set(cms, 'cms_sign_text', counting_sign_text)
+        path = '/v2.0/tokens/revoked?since=%s' % revision
+        first = self.admin_request(path=path, token=token)
+        second = self.admin_request(path=path, token=token)
+        self.assertEqual(first.result, second.result)
+        self.assertEqual(len(calls), 1)
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % revoked_token,
+            token=token,
+            expected_status=204)
+        self.admin_request(path=path, token=token)
+        self.assertEqual(len(calls), 2)
+
+    def test_fetch_revocation_list_invalid_since(self):
+        token = self.get_scoped_token()
+        self.admin_request(
+            path='/v2.0/tokens/revoked?since=-1',
+            token=token,
+            expected_status=400)
+
+    def test_validate_tokens(self):
+        token = self.get_scoped_token()
+        invalid_token = uuid.uuid4().hex
+        r = self.admin_request(
+            method='POST',
+            path='/v2.0/tokens/validate',
+            body={'tokens': [token, invalid_token]},
+            token=token,
+            expected_status=200)
+        self.assertEqual(len(r.result['tokens']), 2)
+        valid, invalid = r.result['tokens']
+        self.assertEqual(valid['id'], token)
+        self.assertTrue(valid['valid'])
+        self.assertEqual(valid['access']['token']['id'], token)
+        self.assertEqual(invalid, {'id': invalid_token, 'valid': False})
+
+    def test_validate_tokens_belongs_to(self):
+        token = self.get_scoped_token()
+        r = self.admin_request(
+            method='POST',
+            path='/v2.0/tokens/validate?belongsTo=%s' % uuid.uuid4().hex,
+            body={'tokens': [token]},
+            token=token,
+            expected_status=200)
+        self.assertFalse(r.result['tokens'][0]['valid'])
+
+    def test_validate_tokens_requires_list(self):
+        token = self.get_scoped_token()
+        r = self.admin_request(
+            method='POST',
+            path='/v2.0/tokens/validate',
+            body={'tokens': token},
+            token=token,
+            expected_status=400)
+        self.assertValidErrorResponse(r)
+
     def test_create_update_user_json_invalid_enabled_type(self):
         # Enforce usage of boolean for 'enabled' field in JSON
         token = self.get_scoped_token()
@@ -17,24 +17,25 @@ class TestDrivers(unittest.TestCase):
 
     """
 
-    def assertMethodNotImplemented(self, f):
+    def assertMethodNotImplemented(self, f, arguments=None):
         """Asserts that a given method raises 501 Not Implemented.
 
-        Provides each argument with a value of None, ignoring optional
-        arguments.
+        Provides each argument with a value of None, unless it is given in
+        arguments, ignoring optional arguments.
         """
         args = inspect.getargspec(f).args
         args.remove('self')
-        kwargs = dict(zip(args, [None] * len(args)))
+        arguments = arguments or {}
+        kwargs = dict((arg, arguments.get(arg)) for arg in args)
         with self.assertRaises(exception.NotImplemented):
             f(**kwargs)
 
-    def assertInterfaceNotImplemented(self, interface):
+    def assertInterfaceNotImplemented(self, interface, arguments=None):
         """Public methods on an interface class should not be implemented."""
         for name in dir(interface):
             method = getattr(interface, name)
             if name[0] != '_' and callable(method):
-                self.assertMethodNotImplemented(method)
+                self.assertMethodNotImplemented(method, arguments)
 
     def test_assignment_driver_unimplemented(self):
         interface = assignment.Driver()
@@ -54,4 +55,6 @@ class TestDrivers(unittest.TestCase):
 
     def test_token_driver_unimplemented(self):
         interface = token.Driver()
-        self.assertInterfaceNotImplemented(interface)
+        # delete_tokens_for_trusts is built on the other methods
+        trusts = [{'id': 'trust', 'trustee_user_id': 'user'}]
+        self.assertInterfaceNotImplemented(interface, {'trusts': trusts})
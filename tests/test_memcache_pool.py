@@ -0,0 +1,212 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import time
+import uuid
+
+from keystone import test
+
+from keystone.common import memcache_pool
+
+
+SERVERS = ['10.0.0.1:11211', '10.0.0.2:11211', '10.0.0.3:11211']
+
+
+class FakeHost(object):
+    def __init__(self):
+        self.deaduntil = 0
+
+
+class FakeServerClient(object):
+    """Replicates the single server memcache.Client used by the pool."""
+
+    def __init__(self, server):
+        self.server = server
+        self.servers = [FakeHost()]
+
+    def _reachable(self):
+        if self.server.down:
+            self.servers[0].deaduntil = time.time() + 30
+        return not self.server.down
+
+    def get(self, key):
+        if self._reachable():
+            return self.server.data.get(key)
+
+    def get_multi(self, keys):
+        if not self._reachable():
+            return {}
+        return dict((key, self.server.data[key])
+                    for key in keys if key in self.server.data)
+
+    def set(self, key, val, time=0):
+        if self._reachable():
+            self.server.data[key] = val
+            return True
+        return 0
+
+    def add(self, key, val, time=0):
+        if self._reachable() and key not in self.server.data:
+            self.server.data[key] = val
+            return True
+        return 0
+
+    def append(self, key, val, time=0):
+        if self._reachable() and key in self.server.data:
+            self.server.data[key] += val
+            return True
+        return 0
+
+    def incr(self, key, delta=1):
+        if self._reachable() and key in self.server.data:
+            self.server.data[key] = int(self.server.data[key]) + delta
+            return self.server.data[key]
+
+    def delete(self, key, time=0):
+        if self._reachable():
+            self.server.data.pop(key, None)
+            return 1
+        return 0
+
+    def disconnect_all(self):
+        self.server.disconnects += 1
+
+
+class FakeServer(object):
+    def __init__(self):
+        self.data = {}
+        self.down = False
+        self.clients = 0
+        self.disconnects = 0
+
+
+class HashRingTests(test.TestCase):
+    def test_every_server_is_returned_once(self):
+        ring = memcache_pool.HashRing(SERVERS)
+        for i in range(10):
+            self.assertEqual(sorted(ring.get_servers(uuid.uuid4().hex)),
+                             SERVERS)
+
+    def test_adding_a_server_moves_few_keys(self):
+        keys = [uuid.uuid4().hex for i in range(1000)]
+        ring = memcache_pool.HashRing(SERVERS)
+        new_ring = memcache_pool.HashRing(SERVERS + ['10.0.0.4:11211'])
+        moved = [key for key in keys
+                 if ring.get_servers(key)[0] != new_ring.get_servers(key)[0]]
+        # about a quarter of the keys move to the new server, and only those
+        self.assertTrue(len(moved) < 400)
+        for key in moved:
+            self.assertEqual(new_ring.get_servers(key)[0], '10.0.0.4:11211')
+
+
+class ConsistentHashClientTests(test.TestCase):
+    def setUp(self):
+        super(ConsistentHashClientTests, self).setUp()
+        self.servers = dict((server, FakeServer()) for server in SERVERS)
+
+    def new_client(self, **kwargs):
+        client = memcache_pool.ConsistentHashClient(SERVERS, **kwargs)
+
+        def new_server_client(server):
+            self.servers[server].clients += 1
+            return FakeServerClient(self.servers[server])
+
+        self.stubs.Set(client, '_new_client', new_server_client)
+        return client
+
+    def holders(self, key):
+        return sorted(server for server, fake in self.servers.iteritems()
+                      if key in fake.data)
+
+    def test_key_is_stored_on_its_server(self):
+        client = self.new_client()
+        self.assertTrue(client.set('key', 'value'))
+        self.assertEqual(self.holders('key'),
+                         [client.ring.get_servers('key')[0]])
+        self.assertEqual(client.get('key'), 'value')
+        self.assertIsNone(client.get('missing'))
+
+    def test_connections_are_reused(self):
+        client = self.new_client()
+        for i in range(10):
+            client.set('key', i)
+            client.get('key')
+        server = client.ring.get_servers('key')[0]
+        self.assertEqual(self.servers[server].clients, 1)
+
+    def test_idle_connections_are_bounded(self):
+        client = self.new_client(pool_size=0)
+        client.set('key', 'value')
+        server = client.ring.get_servers('key')[0]
+        self.assertEqual(self.servers[server].disconnects, 1)
+
+    def test_writes_are_replicated(self):
+        client = self.new_client(replicas=2)
+        self.assertTrue(client.add('key', 'a'))
+        self.assertFalse(client.add('key', 'b'))
+        self.assertTrue(client.append('key', 'c'))
+        servers = client.ring.get_servers('key')
+        self.assertEqual(self.holders('key'), sorted(servers[:2]))
+
+        self.servers[servers[0]].down = True
+        self.assertEqual(client.get('key'), 'ac')
+        self.assertEqual(client.get_multi(['key', 'missing']), {'key': 'ac'})
+
+        # once the failed server is retried, writes reach it again
+        self.servers[servers[0]].down = False
+        client._failures.clear()
+        client.delete('key')
+        self.assertEqual(self.holders('key'), [])
+
+    def test_failed_server_is_skipped(self):
+        client = self.new_client(dead_retry=30)
+        servers = client.ring.get_servers('key')
+        self.servers[servers[0]].down = True
+        self.assertIsNone(client.get('key'))
+
+        # the key moves to the next server until the failed one is retried
+        client.set('key', 'value')
+        self.assertEqual(self.holders('key'), [servers[1]])
+        self.assertEqual(client.get('key'), 'value')
+        self.assertEqual(client._failures[servers[0]][0], 1)
+
+    def test_failed_server_retry_backs_off(self):
+        client = self.new_client(dead_retry=30, max_dead_retry=100)
+        server = client.ring.get_servers('key')[0]
+        self.servers[server].down = True
+        delays = []
+        for i in range(4):
+            # pretend the previous retry delay has elapsed
+            if server in client._failures:
+                count, until = client._failures[server]
+                client._failures[server] = (count, 0)
+            start = time.time()
+            client.get('key')
+            delays.append(int(round(client._failures[server][1] - start)))
+        self.assertEqual(delays, [30, 60, 100, 100])
+
+        self.servers[server].down = False
+        client._failures[server] = (4, 0)
+        client.set('key', 'value')
+        self.assertNotIn(server, client._failures)
+        self.assertEqual(self.holders('key'), [server])
+
+    def test_incr(self):
+        client = self.new_client(replicas=2)
+        self.assertIsNone(client.incr('counter'))
+        client.add('counter', 1)
+        self.assertEqual(client.incr('counter'), 2)
+        self.assertEqual(client.get('counter'), 2)
@@ -26,11 +26,13 @@ To run these tests against a live database:
     all data will be lost.
 """
 import copy
+import datetime
 import json
 import uuid
 
 from migrate.versioning import api as versioning_api
 import sqlalchemy
+from sqlalchemy.engine import reflection
 
 from keystone import test
 
@@ -1122,6 +1124,137 @@ class SqlUpgradeTests(test.TestCase):
         self.assertEqual(len(data['roles']), 1)
         self.assertIn(role_list[5]['id'], data['roles'])
 
+    def test_upgrade_token_revocation_events(self):
+        self.upgrade(30)
+        session = self.Session()
+        expires = datetime.datetime(2031, 2, 18, 18, 10)
+        valid_token = {'id': uuid.uuid4().hex, 'valid': True,
+                       'expires': expires}
+        revoked_token = {'id': uuid.uuid4().hex, 'valid': False,
+                         'expires': expires}
+        self.insert_dict(session, 'token', valid_token)
+        self.insert_dict(session, 'token', revoked_token)
+
+        self.upgrade(31)
+        self.assertTableColumns('token_revocation_event',
+                                ['id', 'token_id', 'expires', 'revoked_at'])
+        event_table = sqlalchemy.Table('token_revocation_event',
+                                       self.metadata, autoload=True)
+        events = session.execute(sqlalchemy.select([event_table])).fetchall()
+        self.assertEqual([e.token_id for e in events], [revoked_token['id']])
+        session.close()
+
+        self.downgrade(30)
+        self.assertTableDoesNotExist('token_revocation_event')
+
+    def test_upgrade_token_composite_indexes(self):
+        self.upgrade(32)
+        self.assertEqual(self.select_index_names('token'),
+                         ['ix_token_expires',
+                          'ix_token_trust_id_valid_expires',
+                          'ix_token_user_id_valid_expires',
+                          'ix_token_valid_expires'])
+
+        self.downgrade(31)
+        self.assertEqual(self.select_index_names('token'),
+                         ['ix_token_expires', 'ix_token_valid'])
+
+    def test_upgrade_token_tenant_id(self):
+        self.upgrade(32)
+        session = self.Session()
+        expires = datetime.datetime(2031, 2, 18, 18, 10)
+        scoped_token = {'id': uuid.uuid4().hex, 'valid': True,
+                        'expires': expires,
+                        'extra': json.dumps({'tenant': {'id': 'bar'}})}
+        unscoped_token = {'id': uuid.uuid4().hex, 'valid': True,
+                          'expires': expires,
+                          'extra': json.dumps({'tenant': None})}
+        self.insert_dict(session, 'token', scoped_token)
+        self.insert_dict(session, 'token', unscoped_token)
+
+        self.upgrade(33)
+        self.assertTableColumns('token',
+                                ['id', 'expires', 'extra', 'valid',
+                                 'trust_id', 'user_id', 'tenant_id'])
+        token_table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        tenant_ids = dict(session.execute(sqlalchemy.select(
+            [token_table.c.id, token_table.c.tenant_id])).fetchall())
+        self.assertEqual(tenant_ids, {scoped_token['id']: 'bar',
+                                      unscoped_token['id']: None})
+        session.close()
+
+        self.downgrade(32)
+        self.assertTableColumns('token',
+                                ['id', 'expires', 'extra', 'valid',
+                                 'trust_id', 'user_id'])
+
+    def test_upgrade_assignment_table(self):
+        self.upgrade(33)
+        session = self.Session()
+        role_ids = [uuid.uuid4().hex for i in range(3)]
+        for role_id in role_ids:
+            self.insert_dict(session, 'role', {'id': role_id,
+                                               'name': role_id,
+                                               'extra': '{}'})
+        self.insert_dict(session, 'domain', {'id': 'domain',
+                                             'name': 'domain',
+                                             'enabled': True,
+                                             'extra': '{}'})
+        self.insert_dict(session, 'project', {'id': 'project',
+                                              'name': 'project',
+                                              'domain_id': 'domain',
+                                              'enabled': True,
+                                              'extra': '{}'})
+        project_roles = {'roles': [{'id': role_ids[0]}, {'id': role_ids[1]},
+                                   {'id': uuid.uuid4().hex}]}
+        domain_roles = {'roles': [{'id': role_ids[2]},
+                                  {'id': role_ids[2],
+                                   'inherited_to': 'projects'}]}
+        self.insert_dict(session, 'user_project_metadata',
+                         {'user_id': 'user', 'project_id': 'project',
+                          'data': json.dumps(project_roles)})
+        self.insert_dict(session, 'group_domain_metadata',
+                         {'group_id': 'group', 'domain_id': 'domain',
+                          'data': json.dumps(domain_roles)})
+        session.commit()
+
+        self.upgrade(34)
+        for table_name in ['user_project_metadata', 'user_domain_metadata',
+                           'group_project_metadata', 'group_domain_metadata']:
+            self.assertTableDoesNotExist(table_name)
+        self.assertTableColumns('assignment',
+                                ['type', 'actor_id', 'target_id', 'role_id',
+                                 'inherited'])
+        assignment_table = sqlalchemy.Table('assignment', self.metadata,
+                                            autoload=True)
+        assignments = session.execute(sqlalchemy.select(
+            [assignment_table.c.type, assignment_table.c.actor_id,
+             assignment_table.c.target_id, assignment_table.c.role_id,
+             assignment_table.c.inherited])).fetchall()
+        # the grant of a missing role is dropped
+        self.assertEqual(
+            sorted(tuple(assignment) for assignment in assignments),
+            sorted([('UserProject', 'user', 'project', role_ids[0], False),
+                    ('UserProject', 'user', 'project', role_ids[1], False),
+                    ('GroupDomain', 'group', 'domain', role_ids[2], False),
+                    ('GroupDomain', 'group', 'domain', role_ids[2], True)]))
+        session.close()
+
+        self.downgrade(33)
+        self.assertTableDoesNotExist('assignment')
+        session = self.Session()
+        self.metadata.clear()
+        table = sqlalchemy.Table('group_domain_metadata', self.metadata,
+                                 autoload=True)
+        data = json.loads(session.execute(table.select()).first().data)
+        self.assertEqual(sorted(data['roles']), sorted(domain_roles['roles']))
+        table = sqlalchemy.Table('user_project_metadata', self.metadata,
+                                 autoload=True)
+        data = json.loads(session.execute(table.select()).first().data)
+        self.assertEqual(sorted(data['roles']),
+                         sorted(project_roles['roles'][:2]))
+        session.close()
+
     def populate_user_table(self, with_pass_enab=False,
                             with_pass_enab_domain=False):
         # Populate the appropriate fields in the user
@@ -1227,6 +1360,11 @@ class SqlUpgradeTests(test.TestCase):
         s = sqlalchemy.select([table])
         return s
 
+    def select_index_names(self, table_name):
+        inspector = reflection.Inspector.from_engine(self.engine)
+        return sorted(index['name']
+                      for index in inspector.get_indexes(table_name))
+
     def assertTableExists(self, table_name):
         try:
             self.select_table(table_name)
@@ -20,6 +20,8 @@ from keystone import exception
 from keystone import test
 from keystone import token
 
+import default_fixtures
+
 
 SAMPLE_V2_TOKEN = {
     "access": {
@@ -405,6 +407,17 @@ class TestTokenProvider(test.TestCase):
         self.assertEqual(token.provider.Manager.get_token_provider(),
                          token.provider.UUID_PROVIDER)
 
+    def test_pkiz_token_format_and_no_provider(self):
+        self.opt_in_group('signing', token_format='PKIZ')
+        self.assertEqual(token.provider.Manager.get_token_provider(),
+                         token.provider.PKIZ_PROVIDER)
+
+    def test_pkiz_token_format_provider_mismatch(self):
+        self.opt_in_group('signing', token_format='PKIZ')
+        self.opt_in_group('token', provider=token.provider.PKI_PROVIDER)
+        self.assertRaises(exception.UnexpectedError,
+                          token.provider.Manager.get_token_provider)
+
     def test_unsupported_token_format(self):
         self.opt_in_group('signing', token_format='CUSTOM')
         self.assertRaises(exception.UnexpectedError,
@@ -433,3 +446,66 @@ class TestTokenProvider(test.TestCase):
                           provider='my.package.MyProvider')
         self.assertEqual(token.provider.Manager.get_token_provider(),
                          'my.package.MyProvider')
+
+
+class TestTokenValidationCache(test.TestCase):
+    def setUp(self):
+        super(TestTokenValidationCache, self).setUp()
+        self.opt_in_group('signing', token_format='UUID')
+        self.opt_in_group('token', cache_size=10)
+        self.load_backends()
+        self.load_fixtures(default_fixtures)
+        self.token_provider_api = token.provider.Manager()
+
+    def _issue_token(self):
+        token_id, token_data = self.token_provider_api.issue_token(
+            user_id=self.user_foo['id'],
+            method_names=['password'],
+            project_id=self.tenant_bar['id'])
+        return token_id
+
+    def test_validate_token_is_cached(self):
+        token_id = self._issue_token()
+        cache = self.token_api.validation_cache
+        first = self.token_provider_api.validate_token(token_id)
+        self.assertEqual(cache.hits, 0)
+        second = self.token_provider_api.validate_token(token_id)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(first, second)
+
+        # modifying the returned data must not poison the cache
+        second['token']['user']['id'] = uuid.uuid4().hex
+        self.assertEqual(first,
+                         self.token_provider_api.validate_token(token_id))
+
+    def test_check_token_uses_cache(self):
+        token_id = self._issue_token()
+        self.token_provider_api.validate_token(token_id)
+        self.token_provider_api.check_token(token_id)
+        self.assertEqual(self.token_api.validation_cache.hits, 1)
+
+    def test_revoke_token_evicts_cached_token(self):
+        token_id = self._issue_token()
+        self.token_provider_api.validate_token(token_id)
+        self.token_provider_api.revoke_token(token_id)
+        self.assertRaises(exception.Unauthorized,
+                          self.token_provider_api.validate_token,
+                          token_id)
+
+    def test_delete_tokens_evicts_cached_tokens(self):
+        token_id = self._issue_token()
+        self.token_provider_api.validate_token(token_id)
+        self.token_api.delete_tokens(self.user_foo['id'])
+        self.assertRaises(exception.Unauthorized,
+                          self.token_provider_api.validate_token,
+                          token_id)
+
+    def test_cache_disabled(self):
+        self.opt_in_group('token', cache_size=0)
+        self.token_api = token.Manager()
+        self.token_provider_api = token.provider.Manager()
+        token_id = self._issue_token()
+        self.token_provider_api.validate_token(token_id)
+        self.token_provider_api.validate_token(token_id)
+        self.assertEqual(len(self.token_api.validation_cache), 0)
+        self.assertEqual(self.token_api.validation_cache.hits, 0)
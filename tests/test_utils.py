@@ -64,3 +64,12 @@ class UtilsTestCase(test.TestCase):
         self.assertFalse(utils.auth_str_equal('a', 'aaaaa'))
         self.assertFalse(utils.auth_str_equal('aaaaa', 'a'))
         self.assertFalse(utils.auth_str_equal('ABC123', 'abc123'))
+
+    def test_paginate(self):
+        refs = [{'id': 'c'}, {'id': 'a'}, {'id': 'b'}]
+        self.assertEqual(utils.paginate(refs), [{'id': 'a'}, {'id': 'b'},
+                                                {'id': 'c'}])
+        self.assertEqual(utils.paginate(refs, limit=1), [{'id': 'a'}])
+        self.assertEqual(utils.paginate(refs, marker='a', limit=1),
+                         [{'id': 'b'}])
+        self.assertEqual(utils.paginate(refs, marker='c'), [])
@@ -323,6 +323,28 @@ class TestPKITokenAPIs(test_v3.RestfulTestCase):
         r = self.get('/auth/tokens', headers=self.headers)
         self.assertValidUnscopedTokenResponse(r)
 
+    def test_validate_tokens(self):
+        scoped_token = self.get_scoped_token()
+        invalid_token = uuid.uuid4().hex
+        r = self.post('/auth/tokens/validate',
+                      body={'tokens': [self.token, scoped_token,
+                                       invalid_token]},
+                      expected_status=200)
+        results = r.result['tokens']
+        self.assertEqual([t['id'] for t in results],
+                         [self.token, scoped_token, invalid_token])
+        self.assertEqual([t['valid'] for t in results], [True, True, False])
+        self.assertEqual(results[0]['token']['user']['id'], self.user['id'])
+        self.assertIn('project', results[1]['token'])
+        self.assertNotIn('token', results[2])
+
+        self.delete('/auth/tokens', headers={'X-Subject-Token': scoped_token},
+                    expected_status=204)
+        r = self.post('/auth/tokens/validate',
+                      body={'tokens': [scoped_token]},
+                      expected_status=200)
+        self.assertFalse(r.result['tokens'][0]['valid'])
+
     def test_revoke_token(self):
         headers = {'X-Subject-Token': self.get_scoped_token()}
         self.delete('/auth/tokens', headers=headers, expected_status=204)
@@ -332,6 +354,12 @@ class TestPKITokenAPIs(test_v3.RestfulTestCase):
         r = self.get('/auth/tokens/OS-PKI/revoked')
         self.assertIn('signed', r.result)
 
+    def test_revocation_list_not_modified(self):
+        r = self.get('/auth/tokens/OS-PKI/revoked')
+        self.get('/auth/tokens/OS-PKI/revoked',
+                 headers={'If-None-Match': r.headers['ETag']},
+                 expected_status=304)
+
 
 class TestUUIDTokenAPIs(TestPKITokenAPIs):
     def config_files(self):
@@ -355,6 +383,30 @@ class TestUUIDTokenAPIs(TestPKITokenAPIs):
         pass
 
 
+class TestPKIZTokenAPIs(TestPKITokenAPIs):
+    def config_files(self):
+        conf_files = super(TestPKIZTokenAPIs, self).config_files()
+        conf_files.append(test.testsdir('test_pkiz_token_provider.conf'))
+        return conf_files
+
+    def test_v3_token_id(self):
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'])
+        resp = self.post('/auth/tokens', body=auth_data)
+        token_data = resp.result
+        token_id = resp.headers.get('X-Subject-Token')
+        self.assertTrue(cms.is_pkiz(token_id))
+
+        verified = cms.verify_token(token_id, CONF.signing.certfile,
+                                    CONF.signing.ca_certs)
+        self.assertEqual(json.loads(verified), token_data)
+        # should be able to validate hash PKI token as well
+        headers = {'X-Subject-Token': cms.cms_hash_token(token_id)}
+        resp = self.get('/auth/tokens', headers=headers)
+        self.assertDictEqual(resp.result, token_data)
+
+
 class TestTokenRevoking(test_v3.RestfulTestCase):
     """Test token revocation on the v3 Identity API."""
 
@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import urllib
 import uuid
 
 from keystone import config
@@ -386,6 +387,56 @@ class IdentityTestCase(test_v3.RestfulTestCase):
         r = self.get('/users', content_type='xml')
         self.assertValidUserListResponse(r, ref=self.user)
 
+    def test_list_users_paginated(self):
+        """Call ``GET /users?limit&marker``."""
+        for i in range(3):
+            user = self.new_user_ref(domain_id=self.domain_id)
+            self.identity_api.create_user(user['id'], user)
+        user_ids = sorted(
+            x['id'] for x in self.get('/users').result['users'])
+
+        paged_ids = []
+        url = '/users?limit=2'
+        while url:
+            r = self.get(url)
+            self.assertValidUserListResponse(r)
+            self.assertTrue(len(r.result['users']) <= 2)
+            paged_ids.extend(x['id'] for x in r.result['users'])
+            if paged_ids != user_ids[:2]:
+                self.assertIn('/users?limit=2', r.result['links']['previous'])
+            url = r.result['links']['next']
+            if url:
+                self.assertIn('marker=', url)
+                url = url.split('/v3', 1)[1]
+        self.assertEqual(paged_ids, user_ids)
+
+        # filtered collections are paginated once filtered
+        r = self.get('/users?limit=1&domain_id=%s' % self.domain_id)
+        self.assertEqual(len(r.result['users']), 1)
+        self.assertEqual(r.result['users'][0]['domain_id'], self.domain_id)
+
+        # email is filtered by the controller rather than the SQL driver
+        r = self.get('/users?limit=1&email=%s' % self.user['email'])
+        self.assertEqual([x['id'] for x in r.result['users']],
+                         [self.user['id']])
+        self.assertIsNone(r.result['links']['next'])
+
+        self.get('/users?limit=invalid', expected_status=400)
+
+    def test_list_users_page_size(self):
+        """Call ``GET /users`` with configured page sizes."""
+        for i in range(3):
+            user = self.new_user_ref(domain_id=self.domain_id)
+            self.identity_api.create_user(user['id'], user)
+        self.opt(default_page_size=2, max_page_size=3)
+
+        r = self.get('/users')
+        self.assertEqual(len(r.result['users']), 2)
+        self.assertIsNotNone(r.result['links']['next'])
+
+        r = self.get('/users?limit=10')
+        self.assertEqual(len(r.result['users']), 3)
+
     def test_get_user(self):
         """Call ``GET /users/{user_id}``."""
         r = self.get('/users/%(user_id)s' % {
@@ -1086,6 +1137,61 @@ class IdentityTestCase(test_v3.RestfulTestCase):
         self.assertRoleAssignmentInListResponse(r, up1_entity,
                                                 link_url=gp1_url)
 
+    def test_paginated_role_assignments(self):
+        """Call ``GET /role_assignments?limit&marker``.
+
+        Test Plan:
+        - Give a new user three roles on a new project
+        - List them two at a time, following the next links
+        - Check that every assignment is listed once and that the last
+          page has no next link
+
+        """
+        self.user1 = self.new_user_ref(
+            domain_id=self.domain['id'])
+        self.user1['password'] = uuid.uuid4().hex
+        self.identity_api.create_user(self.user1['id'], self.user1)
+        self.project1 = self.new_project_ref(
+            domain_id=self.domain['id'])
+        self.identity_api.create_project(self.project1['id'], self.project1)
+
+        entities = []
+        for i in range(3):
+            role = self.new_role_ref()
+            self.identity_api.create_role(role['id'], role)
+            url, entity = _build_role_assignment_url_and_entity(
+                project_id=self.project1['id'], user_id=self.user1['id'],
+                role_id=role['id'])
+            self.put(url)
+            entities.append((url, entity))
+
+        collection_url = ('/role_assignments?scope.project.id=%s&limit=2' %
+                          self.project1['id'])
+        r = self.get(collection_url)
+        self.assertValidRoleAssignmentListResponse(r)
+        listed = r.result['role_assignments']
+        self.assertEqual(len(listed), 2)
+
+        next_url = r.result['links']['next']
+        self.assertIn('marker=', next_url)
+        r = self.get(next_url.split('/v3', 1)[1])
+        self.assertValidRoleAssignmentListResponse(r)
+        self.assertEqual(len(r.result['role_assignments']), 1)
+        self.assertIsNone(r.result['links']['next'])
+        listed.extend(r.result['role_assignments'])
+
+        self.assertEqual(len(listed), 3)
+        r.result['role_assignments'] = listed
+        for url, entity in entities:
+            self.assertRoleAssignmentInListResponse(r, entity, link_url=url)
+
+        self.get('/role_assignments?limit=-1', expected_status=400)
+        self.get('/role_assignments?marker=invalid', expected_status=400)
+        for marker in ('[{}, 1, 2, 3, 4, 5, 6]',
+                       '["UserProject", "a", "b", "c", "d", "e", "f"]'):
+            self.get('/role_assignments?marker=%s' % urllib.quote(marker),
+                     expected_status=400)
+
 
 class IdentityIneritanceTestCase(test_v3.RestfulTestCase):
     """Test inheritance crud and its effects."""
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare PKI token signing latency in-process and with openssl.
+
+Signs a token body with keystone.common.cms both through libcrypto and by
+running the openssl command, and prints the latency of each. By default the
+example certificates and token shipped in examples/pki are used.
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir,
+                                                os.pardir))
+sys.path.insert(0, possible_topdir)
+
+from keystone.common import cms
+from keystone.common import environment
+from keystone.openstack.common import gettextutils
+
+
+PKI_DIR = os.path.join(possible_topdir, 'examples', 'pki')
+
+
+def measure(sign_text, text, certfile, keyfile, count):
+    latencies = []
+    for i in xrange(count):
+        start = time.time()
+        sign_text(text, certfile, keyfile)
+        latencies.append(time.time() - start)
+    latencies.sort()
+    return {'mean': sum(latencies) / count * 1000,
+            'p50': latencies[count // 2] * 1000,
+            'p99': latencies[min(count - 1, count * 99 // 100)] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=200,
+                        help='signatures per method (default: %(default)s)')
+    parser.add_argument('--certfile',
+                        default=os.path.join(PKI_DIR, 'certs',
+                                             'signing_cert.pem'))
+    parser.add_argument('--keyfile',
+                        default=os.path.join(PKI_DIR, 'private',
+                                             'signing_key.pem'))
+    parser.add_argument('--token',
+                        default=os.path.join(PKI_DIR, 'cms',
+                                             'auth_token_scoped.json'),
+                        help='file holding the token body to sign')
+    args = parser.parse_args()
+
+    with open(args.token) as token_file:
+        text = token_file.read()
+
+    if cms._get_signer(args.certfile, args.keyfile) is None:
+        sys.exit('In-process signing is not available with these files.')
+
+    print('%-12s %10s %10s %10s' % ('method', 'mean ms', 'p50 ms', 'p99 ms'))
+    for name, sign_text in [('openssl', cms._openssl_sign_text),
+                            ('in-process', cms.cms_sign_text)]:
+        result = measure(sign_text, text, args.certfile, args.keyfile,
+                         args.count)
+        print('%-12s %10.3f %10.3f %10.3f' % (name, result['mean'],
+                                              result['p50'], result['p99']))
+
+
+if __name__ == '__main__':
+    gettextutils.install('keystone')
+    environment.use_stdlib()
+    main()